@@ -1,6 +1,15 @@
 import os
+import re
+import json
+import time
+import threading
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 from models import TradeSignal
 import google.generativeai as genai
 import config
@@ -69,7 +78,177 @@ Extraído (JSON):
 Responda em 2-5 linhas, objetivo, seguindo as regras acima.
     """.strip()
     try:
-        r = _model.generate_content(prompt)
+        r = _model.generate_content(prompt, request_options={"timeout": config.GEMINI_TIMEOUT_S})
         return (r.text or "").strip()
     except Exception as e:
         return f"[Gemini OFF] Erro ao validar: {e}"
+
+# =============================================================================
+# Cache das notas do Gemini
+#   - chave: forma canônica do TradeSignal + hash do texto normalizado
+#   - LRU + TTL, persistência opcional em disco (JSON), gravada em lote numa thread
+#   - single-flight: pedidos idênticos simultâneos compartilham 1 chamada
+# =============================================================================
+log = logging.getLogger("ai")
+
+_NORM_RE = re.compile(r"[^0-9a-z.,#]+")
+
+def signal_cache_key(signal: TradeSignal, original_text: str) -> str:
+    """Chave estável: campos do sinal (arredondados) + sha1 do texto sem emojis/pontuação/caixa."""
+    canon = (
+        signal.side.upper(), signal.symbol.upper(),
+        round(signal.entry_low, 8), round(signal.entry_high, 8), round(signal.entry_pm, 8),
+        round(signal.sl, 8), signal.lev_min, signal.lev_max,
+        tuple(round(tp, 8) for tp in signal.tps),
+        tuple(sorted(t.lower() for t in signal.tags)),
+    )
+    norm_text = _NORM_RE.sub(" ", (original_text or "").lower()).strip()
+    text_hash = hashlib.sha1(norm_text.encode("utf-8")).hexdigest()[:16]
+    return f"{canon!r}|{text_hash}"
+
+
+class NoteCache:
+    def __init__(self, max_items: int = 512, ttl_s: float = 3600.0, path: Optional[str] = None,
+                 flush_s: float = 5.0):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.path = path
+        self.flush_s = flush_s
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()  # key -> (expira_em, nota, latência_s)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, float] = {"hits": 0, "misses": 0, "coalesced": 0, "saved_s": 0.0}
+        self._load()
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, note, latency = item
+        if expires_at < time.time():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        self.stats["hits"] += 1
+        self.stats["saved_s"] += latency
+        return note
+
+    def put(self, key: str, note: str, latency: float) -> None:
+        self._items[key] = (time.time() + self.ttl_s, note, latency)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        self._mark_dirty()
+
+    async def get_or_compute(self, key: str, compute) -> Optional[str]:
+        """compute: coroutine function -> Optional[str]. Notas de erro ([Gemini OFF]) não são cacheadas."""
+        note = self.get(key)
+        if note is not None:
+            return note
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        self.stats["misses"] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        t0 = time.perf_counter()
+        try:
+            note = await compute()
+            if note and not note.startswith("[Gemini OFF]"):
+                self.put(key, note, time.perf_counter() - t0)
+            fut.set_result(note)
+            return note
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # evita "exception was never retrieved" se ninguém estiver esperando
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            now = time.time()
+            for key, (expires_at, note, latency) in raw.items():
+                if expires_at >= now:
+                    self._items[key] = (expires_at, note, latency)
+        except Exception as e:
+            log.error(f"[gemini-cache] falha ao carregar {self.path}: {e}")
+
+    def _mark_dirty(self) -> None:
+        """Só marca: o arquivo é regravado no máximo 1x a cada flush_s, fora do event loop."""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.flush_s)
+            self._dirty = False
+            snapshot = dict(self._items)       # cópia no loop; JSON + disco na thread
+            await asyncio.to_thread(self._write, snapshot)
+        finally:
+            self._flush_task = None
+        if self._dirty:                        # put() durante a gravação
+            self._mark_dirty()
+
+    def _write(self, items: dict) -> None:
+        tmp = self.path + ".tmp"
+        try:
+            with self._write_lock:             # flush() do shutdown x thread ainda gravando
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(items, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+        except Exception as e:
+            log.error(f"[gemini-cache] falha ao salvar {self.path}: {e}")
+
+    def flush(self) -> None:
+        """Shutdown: grava o que ainda estiver pendente (síncrono)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self.path and self._dirty:
+            self._dirty = False
+            self._write(dict(self._items))
+
+
+note_cache = NoteCache(
+    max_items=config.GEMINI_CACHE_SIZE,
+    ttl_s=config.GEMINI_CACHE_TTL_S,
+    path=config.GEMINI_CACHE_FILE,
+    flush_s=config.GEMINI_CACHE_FLUSH_S,
+)
+
+# Pool dedicado: limita quantas chamadas ao Gemini rodam ao mesmo tempo,
+# fora do event loop do Telethon.
+_executor = ThreadPoolExecutor(max_workers=config.GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+
+async def _gemini_call(signal: TradeSignal, original_text: str) -> Optional[str]:
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(_executor, gemini_validate, signal, original_text)
+    try:
+        return await asyncio.wait_for(fut, timeout=config.GEMINI_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        return f"[Gemini OFF] Timeout após {config.GEMINI_TIMEOUT_S:g}s."
+
+async def gemini_validate_async(signal: TradeSignal, original_text: str) -> Optional[str]:
+    """
+    Versão não-bloqueante do gemini_validate, com timeout rígido (GEMINI_TIMEOUT_S)
+    e cache das notas (note_cache; contadores em note_cache.stats).
+    """
+    if not _model:
+        return None
+    key = signal_cache_key(signal, original_text)
+    return await note_cache.get_or_compute(key, lambda: _gemini_call(signal, original_text))
@@ -0,0 +1,386 @@
+# backtest.py
+"""
+Backtest/replay offline sobre um arquivo de mensagens exportadas.
+
+Passa cada mensagem pelo mesmo caminho do main (is_potential_signal -> parse estrito/flexível ->
+local_validate -> choose_tp_profile -> build_order_plan), num pool de processos, e simula o
+resultado de cada sinal num arquivo OHLC local.
+
+Entrada:
+  - arquivo de mensagens: JSONL (ou .jsonl.gz), uma por linha:
+      {"chat_id": -100123, "topic_id": 4, "id": 991, "date": 1717000000 | "2024-05-29T16:26:40+00:00", "text": "..."}
+    ou o diretório do store gerado pelo exporter.py (lido direto, sem converter);
+  - OHLC: CSV com cabeçalho symbol,ts,open,high,low,close (ts em s ou ms; candles em ordem por símbolo).
+
+Saída:
+  - cobertura do parse por source (chat/tópico) e formato (strict/flexible/failed/not_signal, + invalid);
+  - um resultado simulado por sinal (--out CSV): no_entry / sl / tpK_sl / tpN / open ..., PnL e R.
+
+Memória constante: o arquivo é dividido em faixas de bytes (cada worker lê a sua), no máximo
+2 faixas por worker em voo, e os resultados por sinal vão direto para o CSV.
+
+Uso (a partir da raiz do projeto):
+    python src/backtest.py --archive msgs.jsonl|export/ --ohlc candles.csv --out resultados.csv --workers 8 \
+        [--instruments instruments_cache.json]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import config as config
+from models import PlanConfig, TradeSignal
+
+FORMATS = ("not_signal", "strict", "flexible", "failed")
+OUTCOME_FIELDS = ("source", "msg_id", "ts", "symbol", "side", "entry_pm", "sl", "tps", "format", "invalid",
+                  "profile", "qty", "outcome", "tps_hit", "entry_ts", "exit_ts", "exit_price", "pnl_usdt", "r")
+
+
+# =============================================================================
+# OHLC
+# =============================================================================
+def load_ohlc(path: str) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """symbol -> (ts[s], high, low, close) em arrays NumPy."""
+    cols: Dict[str, Tuple[list, list, list, list]] = defaultdict(lambda: ([], [], [], []))
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            ts, hi, lo, cl = cols[row["symbol"].upper()]
+            t = float(row["ts"])
+            ts.append(t / 1000.0 if t > 1e12 else t)
+            hi.append(float(row["high"]))
+            lo.append(float(row["low"]))
+            cl.append(float(row["close"]))
+    out = {}
+    for sym, (ts, hi, lo, cl) in cols.items():
+        order = np.argsort(ts, kind="stable")
+        out[sym] = tuple(np.asarray(a, dtype=np.float64)[order] for a in (ts, hi, lo, cl))
+    return out
+
+
+def simulate(ohlc, signal: TradeSignal, orders: list, ts: float, max_bars: int) -> dict:
+    """
+    Resultado de UM sinal nos candles a partir do horário da mensagem:
+      - entrada limit no PM (LONG: low <= PM; SHORT: high >= PM) dentro de max_bars;
+      - depois da entrada, TPs em ordem; o SL vale desde o candle da entrada e, no mesmo candle
+        que um TP, ganha (conservador: sem ordem intra-candle). Sobra sai no SL ou fica "open".
+    outcome: no_data / no_qty / no_entry / sl / tpK_sl (K TPs e depois stop) / tpN (todos) / open.
+    """
+    entry, sl_order = orders[0], orders[-1]
+    tp_orders = orders[1:-1]
+    data = ohlc.get(entry.symbol)
+    if data is None or not entry.qty:
+        return {"outcome": "no_data" if data is None else "no_qty"}
+    t, hi, lo, cl = data
+    i0 = int(np.searchsorted(t, ts, side="left"))
+    if i0 >= len(t):
+        return {"outcome": "no_data"}
+    hi, lo, cl, t = hi[i0:i0 + max_bars], lo[i0:i0 + max_bars], cl[i0:i0 + max_bars], t[i0:i0 + max_bars]
+
+    long = entry.side == "Buy"
+    pm, sl = entry.price, sl_order.price
+    touched = lo <= pm if long else hi >= pm
+    if not touched.any():
+        return {"outcome": "no_entry"}
+    e = int(touched.argmax())
+
+    sl_hits = (lo[e:] <= sl) if long else (hi[e:] >= sl)
+    sl_idx = e + int(sl_hits.argmax()) if sl_hits.any() else None
+    d = 1.0 if long else -1.0
+
+    pnl, remaining, last, hit = 0.0, entry.qty, e, 0
+    exit_idx = e
+    for o in tp_orders:
+        reach = (hi[last + 1:] >= o.price) if long else (lo[last + 1:] <= o.price)
+        if not reach.any():
+            break
+        idx = last + 1 + int(reach.argmax())
+        if sl_idx is not None and sl_idx <= idx:
+            break
+        pnl += o.qty * (o.price - pm) * d
+        remaining -= o.qty
+        last = exit_idx = idx
+        hit += 1
+
+    if tp_orders and hit == len(tp_orders):
+        # todos os TPs: resíduo de arredondamento das pernas sai junto com o último
+        exit_price = tp_orders[-1].price
+        pnl += remaining * (exit_price - pm) * d
+        outcome = f"tp{hit}"
+    elif sl_idx is not None:
+        # SL depois do último TP executado (ou sem TP): a sobra sai no stop
+        pnl += remaining * (sl - pm) * d
+        outcome, exit_idx, exit_price = ("sl" if hit == 0 else f"tp{hit}_sl"), sl_idx, sl
+    else:
+        pnl += remaining * (cl[-1] - pm) * d
+        outcome, exit_idx, exit_price = "open", len(cl) - 1, float(cl[-1])
+
+    risk = entry.qty * abs(pm - sl)
+    return {"outcome": outcome, "tps_hit": hit, "entry_ts": int(t[e]), "exit_ts": int(t[exit_idx]),
+            "exit_price": exit_price, "pnl_usdt": round(pnl, 6), "r": round(pnl / risk, 4) if risk else 0.0}
+
+
+# =============================================================================
+# Worker
+# =============================================================================
+_W: dict = {}
+
+
+def _init_worker(opts: dict, ohlc) -> None:
+    """Roda 1x por processo: compila o prefiltro e guarda o OHLC."""
+    from parser_signal import SignalPrefilter
+    _W.update(opts)
+    _W["prefilter"] = SignalPrefilter(opts["langs"], opts["min_score"])
+    _W["ohlc"] = ohlc
+
+
+def _ts(v) -> float:
+    if isinstance(v, (int, float)):
+        return float(v)
+    return datetime.fromisoformat(str(v).replace("Z", "+00:00")).timestamp()
+
+
+def _json_messages(lines) -> Iterator[Optional[dict]]:
+    """Linhas JSONL -> dicts (None = linha inválida)."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def _process_messages(messages) -> Tuple[Dict[str, Counter], List[tuple]]:
+    from ai_api import local_validate
+    from helpers import alloc_for_signal, build_order_plan, choose_tp_profile
+    from parser_signal import parse_signal, parse_signal_flexible
+
+    prefilter, ohlc = _W["prefilter"], _W["ohlc"]
+    coverage: Dict[str, Counter] = defaultdict(Counter)
+    rows: List[tuple] = []
+    for m in messages:
+        if m is None:
+            coverage["?"]["bad_json"] += 1
+            continue
+        source = f"{m.get('chat_id')}/{m.get('topic_id') or '-'}"
+        text = m.get("text") or ""
+        cov = coverage[source]
+        if not prefilter.is_signal(text):
+            cov["not_signal"] += 1
+            continue
+
+        # mesmo encadeamento do parse_signal_any, sabendo qual caminho casou
+        signal, fmt = parse_signal(text), "strict"
+        if signal is None:
+            try:
+                signal, fmt = parse_signal_flexible(text), "flexible"
+            except ValueError:
+                cov["failed"] += 1
+                continue
+        cov[fmt] += 1
+        issues = local_validate(signal)
+        if issues:
+            cov["invalid"] += 1
+
+        profile = choose_tp_profile(signal, _W["tp_profile"], _W["tp_auto_threshold_pct"],
+                                    _W["kw_scalp"], _W["kw_swing"], text)
+        try:
+            orders = build_order_plan(signal, PlanConfig(
+                tp_alloc=alloc_for_signal(signal, profile), risk_pct=_W["risk_pct"],
+                balance_usdt=_W["balance_usdt"], price_precision=_W["price_precision"],
+                qty_precision=_W["qty_precision"]), symbol_suffix=_W["symbol_suffix"],
+                instruments=_W["instruments"])
+        except ValueError:
+            cov["no_plan"] += 1
+            continue
+
+        ts = _ts(m.get("date") or 0)
+        res = simulate(ohlc, signal, orders, ts, _W["max_bars"]) if not issues or _W["simulate_invalid"] \
+            else {"outcome": "skipped_invalid"}
+        rows.append((source, m.get("id"), int(ts), orders[0].symbol, signal.side.upper(), signal.entry_pm,
+                     signal.sl, " ".join(f"{tp:g}" for tp in signal.tps), fmt, len(issues), profile,
+                     orders[0].qty, res["outcome"], res.get("tps_hit", ""), res.get("entry_ts", ""),
+                     res.get("exit_ts", ""), res.get("exit_price", ""), res.get("pnl_usdt", ""), res.get("r", "")))
+    return coverage, rows
+
+
+def _work_range(path: str, start: int, end: int):
+    """Lê as linhas que COMEÇAM em [start, end) (a faixa anterior termina a linha cortada)."""
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()          # pula o resto da linha que começou na faixa anterior
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line)
+    return _process_messages(_json_messages(lines))
+
+
+def _work_lines(lines: List[bytes]):
+    return _process_messages(_json_messages(lines))
+
+
+def _work_blocks(path: str, refs: List[tuple]):
+    """Blocos do store do exporter (message_store.py), lidos direto do messages.dat."""
+    from message_store import BlockRef, read_blocks
+    return _process_messages(vars(m) for m in read_blocks(path, [BlockRef(r) for r in refs]))
+
+
+# =============================================================================
+# Driver
+# =============================================================================
+def _tasks(path: str, chunk_bytes: int, chunk_lines: int) -> Iterator[tuple]:
+    """
+    (função, args) por pedaço: faixas de bytes no arquivo puro; blocos de linhas no .gz;
+    grupos de blocos (~chunk_bytes comprimidos) num diretório do store do exporter.
+    """
+    if os.path.isdir(path):
+        from message_store import MessageStore
+        with MessageStore(path, readonly=True) as store:
+            refs = store.refs_in_file_order()
+        group, size = [], 0
+        for ref in refs:
+            group.append(tuple(ref))
+            size += ref.length
+            if size >= chunk_bytes // 4:      # ~4x de compressão: mesmo volume de texto por pedaço
+                yield _work_blocks, (path, group)
+                group, size = [], 0
+        if group:
+            yield _work_blocks, (path, group)
+        return
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            block = []
+            for line in f:
+                block.append(line)
+                if len(block) >= chunk_lines:
+                    yield _work_lines, (block,)
+                    block = []
+            if block:
+                yield _work_lines, (block,)
+        return
+    size = os.path.getsize(path)
+    for start in range(0, size, chunk_bytes):
+        yield _work_range, (path, start, min(size, start + chunk_bytes))
+
+
+def _load_instruments(path: Optional[str]) -> dict:
+    """Cache do InstrumentCache (instruments_cache.json do bot) -> symbol -> InstrumentInfo."""
+    if not path:
+        return {}
+    from bybit_client import BybitClient
+    from instruments import InstrumentCache
+    cache = InstrumentCache(BybitClient(), path)
+    cache.load()
+    return cache.by_symbol
+
+
+def run_backtest(archive: str, ohlc_path: Optional[str] = None, out_path: Optional[str] = None,
+                 workers: int = 0, chunk_bytes: int = 4 << 20, max_bars: int = 7 * 24 * 60,
+                 simulate_invalid: bool = False, progress: bool = True,
+                 instruments_path: Optional[str] = None) -> dict:
+    t0 = time.perf_counter()
+    ohlc = load_ohlc(ohlc_path) if ohlc_path else {}
+    t_ohlc = time.perf_counter() - t0
+    opts = {
+        "langs": config.SIGNAL_LANGS, "min_score": config.SIGNAL_MIN_SCORE,
+        "tp_profile": config.TP_PROFILE, "tp_auto_threshold_pct": config.TP_AUTO_THRESHOLD_PCT,
+        "kw_scalp": config.TP_KEYWORD_SCALP, "kw_swing": config.TP_KEYWORD_SWING,
+        "risk_pct": config.DEFAULT_RISK_PCT, "balance_usdt": config.DEFAULT_BALANCE_USDT,
+        "price_precision": config.PRICE_PRECISION, "qty_precision": config.QTY_PRECISION,
+        "symbol_suffix": config.SYMBOL_SUFFIX, "max_bars": max_bars, "simulate_invalid": simulate_invalid,
+        "instruments": _load_instruments(instruments_path),
+    }
+    workers = workers or os.cpu_count() or 1
+
+    coverage: Dict[str, Counter] = defaultdict(Counter)
+    outcomes: Counter = Counter()
+    pnl, r_sum, n_signals = 0.0, 0.0, 0
+    out_f = open(out_path, "w", encoding="utf-8", newline="") if out_path else None
+    writer = csv.writer(out_f) if out_f else None
+    if writer:
+        writer.writerow(OUTCOME_FIELDS)
+
+    def merge(result):
+        nonlocal pnl, r_sum, n_signals
+        cov, rows = result
+        for source, c in cov.items():
+            coverage[source].update(c)
+        for row in rows:
+            outcomes[row[12]] += 1
+            if row[17] != "":
+                pnl += row[17]
+                r_sum += row[18]
+            n_signals += 1
+        if writer:
+            writer.writerows(rows)
+
+    tasks = _tasks(archive, chunk_bytes, 20000)
+    inflight = set()
+    done_chunks, next_report = 0, 50
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(opts, ohlc)) as pool:
+        for fn, args in tasks:
+            inflight.add(pool.submit(fn, *args))
+            if len(inflight) >= 2 * workers:
+                finished, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    merge(fut.result())
+                    done_chunks += 1
+                if progress and done_chunks >= next_report:
+                    next_report += 50
+                    print(f"[backtest] {done_chunks} pedaços, {n_signals} sinais...", file=sys.stderr)
+        for fut in wait(inflight).done:
+            merge(fut.result())
+    if out_f:
+        out_f.close()
+
+    messages = sum(sum(v for k, v in c.items() if k in FORMATS) for c in coverage.values())
+    return {"messages": messages, "signals": n_signals, "coverage": coverage, "outcomes": outcomes,
+            "pnl_usdt": pnl, "r_total": r_sum, "seconds": time.perf_counter() - t0, "ohlc_seconds": t_ohlc}
+
+
+def format_report(res: dict) -> str:
+    out = [f"{res['messages']:,} mensagens, {res['signals']:,} sinais em {res['seconds']:.1f}s "
+           f"({res['messages'] / max(res['seconds'], 1e-9):,.0f} msgs/s; OHLC {res['ohlc_seconds']:.1f}s)", "",
+           f"{'source':<28}{'msgs':>10}{'not_sig':>10}{'strict':>9}{'flex':>9}{'failed':>9}{'invalid':>9}{'cobertura':>11}"]
+    for source, c in sorted(res["coverage"].items(), key=lambda kv: -sum(kv[1].values())):
+        total = sum(v for k, v in c.items() if k in FORMATS)
+        potential = total - c["not_signal"]
+        cov = (c["strict"] + c["flexible"]) / potential * 100 if potential else 0.0
+        out.append(f"{source:<28}{total:>10}{c['not_signal']:>10}{c['strict']:>9}{c['flexible']:>9}"
+                   f"{c['failed']:>9}{c['invalid']:>9}{cov:>10.1f}%")
+    out += ["", "resultados: " + ", ".join(f"{k}={v}" for k, v in sorted(res["outcomes"].items())),
+            f"PnL simulado: {res['pnl_usdt']:.2f} USDT | soma de R: {res['r_total']:.2f}"]
+    return "\n".join(out)
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Backtest offline: parse + plano + fills simulados em OHLC local.")
+    ap.add_argument("--archive", required=True, help="JSONL (ou .jsonl.gz) de mensagens, ou diretório do exporter.py")
+    ap.add_argument("--ohlc", help="CSV symbol,ts,open,high,low,close")
+    ap.add_argument("--out", help="CSV com um resultado por sinal")
+    ap.add_argument("--workers", type=int, default=0, help="processos (0 = nº de CPUs)")
+    ap.add_argument("--chunk-mb", type=float, default=4.0)
+    ap.add_argument("--max-bars", type=int, default=7 * 24 * 60, help="candles após a mensagem (padrão: 7 dias de 1m)")
+    ap.add_argument("--simulate-invalid", action="store_true", help="simula também sinais reprovados no local_validate")
+    ap.add_argument("--instruments", help="instruments_cache.json do bot (tick/step por símbolo); sem ele, precisão global")
+    args = ap.parse_args()
+    res = run_backtest(args.archive, args.ohlc, args.out, args.workers, int(args.chunk_mb * (1 << 20)),
+                       args.max_bars, args.simulate_invalid, instruments_path=args.instruments)
+    print(format_report(res))
+
+
+if __name__ == "__main__":
+    main_cli()
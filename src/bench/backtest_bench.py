@@ -0,0 +1,108 @@
+# src/bench/backtest_bench.py
+"""
+Benchmark do backtest offline (backtest.py): gera um arquivo sintético de mensagens
+(sinais no formato canônico, no flexível, quebrados e conversa comum, de vários sources)
+e candles de 1m para os símbolos usados, roda o backtest e mede msgs/s e memória de pico.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/backtest_bench.py --messages 1000000 --workers 4 [--dir /tmp/bt]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backtest import format_report, run_backtest  # noqa: E402
+
+SYMBOLS = {"BTC": 60000.0, "ETH": 3000.0, "SOL": 150.0, "XRP": 0.5, "DOGE": 0.12}
+T0 = 1_700_000_000
+CHATTER = ["bom dia pessoal", "alguém viu o BTC hoje?", "vamos que vamos 🚀", "resultado do mês no canal #vip",
+           "live hoje às 20h", "segura a mão", "fechei no lucro", "mercado lateral, paciência"]
+
+
+def _price(base: float, minute: int) -> float:
+    return base * (1 + 0.08 * math.sin(minute / 900.0) + 0.03 * math.sin(minute / 97.0))
+
+
+def write_ohlc(path: str, minutes: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("symbol,ts,open,high,low,close\n")
+        for sym, base in SYMBOLS.items():
+            for m in range(minutes):
+                o, c = _price(base, m), _price(base, m + 1)
+                hi, lo = max(o, c) * 1.0008, min(o, c) * 0.9992
+                f.write(f"{sym}USDT,{T0 + 60 * m},{o:.6g},{hi:.6g},{lo:.6g},{c:.6g}\n")
+
+
+def _signal_text(rnd: random.Random, sym: str, pm: float, kind: str) -> str:
+    long = rnd.random() < 0.5
+    d = 1 if long else -1
+    step = pm * rnd.uniform(0.005, 0.02)
+    tps = [pm + d * step * k for k in (1, 2, 3)]
+    sl = pm - d * step * 1.5
+    side = "LONG" if long else "SHORT"
+    if kind == "strict":
+        return (f"🟢 {side} {sym}\nEntrada: {pm * 0.998:.6g} - {pm * 1.002:.6g} (pm: {pm:.6g})\n"
+                f"TPs: {', '.join(f'{tp:.6g}' for tp in tps)}\nSL: {sl:.6g}\nAlavancagem: 5x a 10x\n#swing")
+    if kind == "flexible":
+        return (f"{side} ${sym}/USDT\nEntradas Escalonadas: {pm:.6g}-{pm * 1.001:.6g}\n"
+                + "\n".join(f"TP{i}: {tp:.6g}" for i, tp in enumerate(tps, 1)) + f"\nStop Loss: {sl:.6g}\n#scalp")
+    return f"{side} {sym} entrada em breve, TP a definir, SL curto"   # parece sinal, não parseia
+
+
+def write_archive(path: str, n: int, minutes: int, seed: int = 1) -> None:
+    rnd = random.Random(seed)
+    sources = [(-1000000000000 - i, (4, 14, 31)[i % 3] if i % 2 else None) for i in range(20)]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            chat_id, topic = sources[i % len(sources)]
+            minute = int(i / n * (minutes - 60 * 24 * 7))
+            r = rnd.random()
+            if r < 0.70:
+                text = rnd.choice(CHATTER)
+            else:
+                sym = rnd.choice(list(SYMBOLS))
+                kind = "strict" if r < 0.85 else "flexible" if r < 0.97 else "broken"
+                text = _signal_text(rnd, sym, _price(SYMBOLS[sym], minute), kind)
+            f.write(json.dumps({"chat_id": chat_id, "topic_id": topic, "id": i + 1,
+                                "date": T0 + 60 * minute, "text": text}, ensure_ascii=False) + "\n")
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Benchmark do backtest offline com dados sintéticos.")
+    ap.add_argument("--messages", type=int, default=1_000_000)
+    ap.add_argument("--days", type=int, default=90, help="candles de 1m por símbolo")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--dir", default=None, help="reaproveita arquivos gerados aqui")
+    args = ap.parse_args()
+
+    d = args.dir or tempfile.mkdtemp(prefix="backtest-")
+    os.makedirs(d, exist_ok=True)
+    archive, ohlc, out = (os.path.join(d, x) for x in (f"msgs_{args.messages}.jsonl", f"ohlc_{args.days}d.csv",
+                                                         "resultados.csv"))
+    minutes = args.days * 24 * 60
+    t0 = time.perf_counter()
+    if not os.path.exists(ohlc):
+        write_ohlc(ohlc, minutes)
+    if not os.path.exists(archive):
+        write_archive(archive, args.messages, minutes)
+    print(f"[dados] {archive} ({os.path.getsize(archive) / 1e6:.0f}MB), {ohlc} "
+          f"({os.path.getsize(ohlc) / 1e6:.0f}MB) em {time.perf_counter() - t0:.1f}s")
+
+    res = run_backtest(archive, ohlc, out, workers=args.workers, progress=False)
+    print(format_report(res))
+    me = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"[memória] pico do processo principal={me:.0f}MB, maior worker={kids:.0f}MB")
+
+
+if __name__ == "__main__":
+    main_cli()
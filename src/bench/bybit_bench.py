@@ -0,0 +1,98 @@
+# src/bench/bybit_bench.py
+"""
+Benchmark do BybitClient contra o stand-in local (bench/bybit_standin.py).
+
+Gera N sinais (entrada + TPs + SL via build_order_plan; no envio, TPs/SL vão presos às pernas
+de entrada) e coloca as ordens com concorrência configurável, comparando:
+  - batch:  create-batch (1 round trip por sinal), como o BybitClient faz;
+  - single: 1 POST /v5/order/create por ordem, em sequência (referência).
+
+Uso (a partir da raiz do projeto):
+    python src/bench/bybit_bench.py --signals 500 --concurrency 20 --latency-ms 20
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bybit_client import BybitClient  # noqa: E402
+from bybit_standin import BybitStandIn, API_KEY, API_SECRET  # noqa: E402
+from helpers import build_order_plan  # noqa: E402
+from models import PlanConfig, TradeSignal  # noqa: E402
+
+
+def _signal(i: int) -> TradeSignal:
+    pm = 100 + i * 0.01
+    return TradeSignal(side="LONG" if i % 2 else "SHORT", symbol="BTC", entry_low=pm - 1, entry_high=pm + 1,
+                       entry_pm=pm, sl=pm - 3 if i % 2 else pm + 3, lev_min=5, lev_max=10,
+                       tps=[pm + 2, pm + 3, pm + 4] if i % 2 else [pm - 2, pm - 3, pm - 4], tags=[])
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else 0.0
+
+
+async def _place_single(client: BybitClient, orders, signal_id: str):
+    """Referência: uma request por ordem, em sequência."""
+    for item in client._plan_params(orders, signal_id):
+        await client._request("POST", "/v5/order/create", dict(item, category="linear"))
+
+
+async def _run_mode(mode: str, args) -> None:
+    standin = BybitStandIn(args.latency_ms / 1000.0, limit_per_s=args.limit_per_s, fail_ratio=args.fail_ratio)
+    url = await standin.start()
+    client = BybitClient(API_KEY, API_SECRET, base_url=url, pool_size=args.concurrency)
+    cfg = PlanConfig(tp_alloc=[0.5, 0.25, 0.25], risk_pct=0.01, balance_usdt=1000)
+    plans = [(f"s{mode[0]}{i:08d}", build_order_plan(_signal(i), cfg)) for i in range(args.signals)]
+
+    sem = asyncio.Semaphore(args.concurrency)
+    lat = []
+
+    async def one(signal_id, orders):
+        async with sem:
+            t0 = time.perf_counter()
+            if mode == "batch":
+                await client.place_orders(orders, signal_id=signal_id)
+            else:
+                await _place_single(client, orders, signal_id)
+            lat.append(time.perf_counter() - t0)
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(one(sid, orders) for sid, orders in plans))
+    total = time.perf_counter() - t_start
+    await client.close()
+    await standin.stop()
+
+    n_orders = sum(len(client._plan_params(o, sid)) for sid, o in plans)
+    ms = lambda x: f"{x * 1000:.1f}ms"
+    print(f"[{mode:<6}] sinais={args.signals} ordens={n_orders} criadas={standin.stats['orders']} "
+          f"requests={standin.stats['requests']} limitadas={standin.stats['rate_limited']} "
+          f"reduce-only recusadas={standin.stats['reduce_only_rejected']}")
+    print(f"         {n_orders / total:,.0f} ordens/s | por sinal p50={ms(_pct(lat, 50))} "
+          f"p95={ms(_pct(lat, 95))} p99={ms(_pct(lat, 99))} | total={total:.2f}s")
+    if mode == "batch":
+        print(f"         cliente: {client.stats}")
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Benchmark do BybitClient contra o stand-in local.")
+    ap.add_argument("--signals", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="latência simulada por request no stand-in")
+    ap.add_argument("--limit-per-s", type=int, default=100000, help="limite por endpoint no stand-in (req/s)")
+    ap.add_argument("--fail-ratio", type=float, default=0.0, help="fração de pernas com erro transitório (10016)")
+    ap.add_argument("--mode", choices=("batch", "single", "both"), default="both")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+    for mode in (("batch", "single") if args.mode == "both" else (args.mode,)):
+        asyncio.run(_run_mode(mode, args))
+
+
+if __name__ == "__main__":
+    main_cli()
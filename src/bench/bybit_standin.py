@@ -0,0 +1,404 @@
+# src/bench/bybit_standin.py
+"""
+Stand-in local da API v5 da Bybit (aiohttp.web) para testar/medir o BybitClient offline.
+
+Imita o que o cliente usa:
+  - POST /v5/order/create-batch e /v5/order/create (assinatura HMAC conferida);
+  - GET /v5/order/realtime, /v5/order/history, /v5/position/list (paginados por cursor);
+  - respostas no formato v5 (retCode/retMsg/result/retExtInfo/time);
+  - orderLinkId repetido -> 110072 (idempotência);
+  - ordem reduce-only sem posição aberta na conta -> 110017 (como a Bybit);
+  - TP/SL presos à ordem (takeProfit/stopLoss, tpslMode=Partial): quando ela executa por completo
+    viram ordens condicionais reduce-only sem orderLinkId (chave = orderId; `children[link]`);
+  - headers X-Bapi-Limit / X-Bapi-Limit-Status / X-Bapi-Limit-Reset-Timestamp,
+    com janela de 1s por endpoint; estourou -> retCode 10006;
+  - latência e falhas transitórias (10016 por perna) configuráveis;
+  - WebSocket privado em /v5/private (auth/subscribe/ping): ordens criadas e fill()/cancel()
+    viram frames order/execution/position; `frames` (gravados, ex.: .jsonl) são reproduzidos
+    após o subscribe. Todo frame emitido fica em `recorded`;
+  - GET /v5/market/instruments-info (público, paginado) com `n_instruments` símbolos sintéticos;
+  - subcontas (`accounts` = {api_key: api_secret}): cada key tem suas ordens e sua janela de
+    rate limit (como o limite por UID da Bybit) e latência própria opcional (`latency_by_key`).
+    Frames do WebSocket e posições só para a conta principal.
+
+Uso avulso (a partir da raiz do projeto):
+    python src/bench/bybit_standin.py --port 8765 --latency-ms 20 [--frames gravados.jsonl]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+API_KEY = "standin-key"
+API_SECRET = "standin-secret"
+
+
+class BybitStandIn:
+    def __init__(self, latency_s: float = 0.0, limit_per_s: int = 10, fail_ratio: float = 0.0,
+                 api_key: str = API_KEY, api_secret: str = API_SECRET, seed: int = 1,
+                 frames: Optional[List[dict]] = None, frame_delay_s: float = 0.0, n_instruments: int = 500,
+                 accounts: Optional[Dict[str, str]] = None, latency_by_key: Optional[Dict[str, float]] = None):
+        self.latency_s = latency_s
+        self.limit_per_s = limit_per_s
+        self.fail_ratio = fail_ratio
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.rnd = random.Random(seed)
+        self.frames = frames or []                        # frames gravados, reproduzidos no subscribe
+        self.frame_delay_s = frame_delay_s
+        self.secrets: Dict[str, str] = dict(accounts or {}, **{api_key: api_secret})
+        self.latency_by_key: Dict[str, float] = latency_by_key or {}
+        self.books: Dict[str, Dict[str, dict]] = {k: {} for k in self.secrets}   # api_key -> ordens
+        self.orders: Dict[str, dict] = self.books[api_key]  # conta principal: orderLinkId -> ordem criada
+        self.positions: Dict[str, dict] = {}              # symbol -> posição (one-way, positionIdx 0)
+        self.children: Dict[str, List[str]] = {}          # ordem -> chaves dos TP/SL presos a ela
+        self.recorded: List[dict] = []                    # todos os frames emitidos no WS
+        self.instruments = [self._instrument(i) for i in range(n_instruments)]
+        self.accept_ws = True                             # False simula queda (recusa conexões)
+        self._subscribers: Dict[web.WebSocketResponse, asyncio.Queue] = {}
+        self._windows: Dict[tuple, list] = {}             # (api_key, path) -> [início_janela_ms, usados]
+        self._clock_ms = 0
+        self.stats = {"requests": 0, "orders": 0, "duplicates": 0, "rate_limited": 0, "failed": 0,
+                      "ws_connects": 0, "frames_sent": 0, "reduce_only_rejected": 0}
+        self._runner: Optional[web.AppRunner] = None
+
+    def _now_ms(self) -> int:
+        """Relógio estritamente crescente (updatedTime nunca empata entre dois eventos)."""
+        self._clock_ms = max(self._clock_ms + 1, int(time.time() * 1000))
+        return self._clock_ms
+
+    # ---------------- helpers ----------------
+
+    @staticmethod
+    def _instrument(i: int) -> dict:
+        """BTCUSDT primeiro (tick 0.10, step 0.001); o resto com ticks/steps variados."""
+        symbol = "BTCUSDT" if i == 0 else f"SYM{i}USDT"
+        tick, step = ("0.10", "0.001") if i == 0 else (("0.0001", "0.01", "0.5")[i % 3], ("1", "0.1", "0.001")[i % 3])
+        return {"symbol": symbol, "contractType": "LinearPerpetual", "status": "Trading",
+                "priceFilter": {"minPrice": tick, "maxPrice": "1999999.8", "tickSize": tick},
+                "lotSizeFilter": {"maxOrderQty": "1190.000", "minOrderQty": step, "qtyStep": step,
+                                  "maxMktOrderQty": "500.000", "minNotionalValue": "5"}}
+
+    def _check_sign(self, request: web.Request, payload: str) -> bool:
+        h = request.headers
+        secret = self.secrets.get(h.get("X-BAPI-API-KEY") or "")
+        if secret is None:
+            return False
+        msg = f"{h.get('X-BAPI-TIMESTAMP')}{h.get('X-BAPI-API-KEY')}{h.get('X-BAPI-RECV-WINDOW')}{payload}"
+        expected = hmac.new(secret.encode(), msg.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, h.get("X-BAPI-SIGN", ""))
+
+    def _limit_headers(self, path: str, key: str = ""):
+        now_ms = int(time.time() * 1000)
+        win = self._windows.setdefault((key, path), [now_ms, 0])
+        if now_ms - win[0] >= 1000:
+            win[0], win[1] = now_ms, 0
+        win[1] += 1
+        remaining = self.limit_per_s - win[1]
+        headers = {
+            "X-Bapi-Limit": str(self.limit_per_s),
+            "X-Bapi-Limit-Status": str(max(0, remaining)),
+            "X-Bapi-Limit-Reset-Timestamp": str(win[0] + 1000),
+        }
+        return headers, remaining < 0
+
+    @staticmethod
+    def _reply(ret_code: int, ret_msg: str, result=None, ext=None, headers=None) -> web.Response:
+        body = {"retCode": ret_code, "retMsg": ret_msg, "result": result or {},
+                "retExtInfo": ext or {}, "time": int(time.time() * 1000)}
+        return web.json_response(body, headers=headers)
+
+    def _create(self, item: dict, key: Optional[str] = None):
+        """Cria uma ordem na conta `key` (padrão: principal); retorna (row, info) no formato do create-batch."""
+        key = key or self.api_key
+        book = self.books[key]
+        link = item.get("orderLinkId") or uuid.uuid4().hex
+        if link in book:
+            self.stats["duplicates"] += 1
+            return {"orderId": "", "orderLinkId": link}, {"code": 110072, "msg": "OrderLinkedID is duplicate"}
+        if self.fail_ratio and self.rnd.random() < self.fail_ratio:
+            self.stats["failed"] += 1
+            return {"orderId": "", "orderLinkId": link}, {"code": 10016, "msg": "Internal server error"}
+        if item.get("reduceOnly") and not self._position_size(key, item.get("symbol")):
+            self.stats["reduce_only_rejected"] += 1
+            return {"orderId": "", "orderLinkId": link}, {
+                "code": 110017, "msg": "current position is zero, cannot fix reduce-only order qty"}
+        order_id = uuid.uuid4().hex
+        now = str(self._now_ms())
+        status = "Untriggered" if item.get("triggerPrice") else "New"
+        book[link] = dict(item, orderId=order_id, orderStatus=status, cumExecQty="0", avgPrice="0",
+                          createdTime=now, updatedTime=now)
+        self.stats["orders"] += 1
+        if key == self.api_key:
+            self._emit("order", [book[link]])
+        return {"category": "linear", "symbol": item.get("symbol"), "orderId": order_id,
+                "orderLinkId": link, "createAt": now}, {"code": 0, "msg": "OK"}
+
+    def _position_size(self, key: str, symbol: Optional[str]) -> float:
+        # posições só são simuladas na conta principal: nas subcontas nunca há posição
+        pos = self.positions.get(symbol or "") if key == self.api_key else None
+        return float(pos["size"]) if pos else 0.0
+
+    def _attach_tpsl(self, link: str, o: dict) -> None:
+        """Entrada executada: TP/SL presos a ela viram condicionais reduce-only (tamanho da ordem)."""
+        exit_side = "Sell" if o["side"] == "Buy" else "Buy"
+        legs = []
+        if o.get("takeProfit"):
+            up = o["side"] == "Buy"
+            legs.append(dict(orderType=o.get("tpOrderType") or "Market", stopOrderType="PartialTakeProfit",
+                             triggerPrice=o["takeProfit"], price=o.get("tpLimitPrice") or "0",
+                             triggerDirection=1 if up else 2))
+        if o.get("stopLoss"):
+            up = o["side"] == "Sell"
+            legs.append(dict(orderType=o.get("slOrderType") or "Market", stopOrderType="PartialStopLoss",
+                             triggerPrice=o["stopLoss"], price="0", triggerDirection=1 if up else 2))
+        for leg in legs:
+            order_id = uuid.uuid4().hex
+            now = str(self._now_ms())
+            self.orders[order_id] = dict(leg, symbol=o["symbol"], side=exit_side, qty=o["qty"], orderId=order_id,
+                                         orderLinkId="", reduceOnly=True, orderStatus="Untriggered",
+                                         cumExecQty="0", avgPrice="0", createdTime=now, updatedTime=now)
+            self.children.setdefault(link, []).append(order_id)
+            self._emit("order", [self.orders[order_id]])
+
+    # ---------------- eventos de mercado (geram frames) ----------------
+
+    def fill(self, link: str, qty: Optional[float] = None, price: Optional[float] = None) -> None:
+        """Executa (total ou parcial) uma ordem: emite execution + order + position."""
+        o = self.orders[link]
+        total, done = float(o["qty"]), float(o["cumExecQty"])
+        qty = min(total - done, qty if qty is not None else total - done)
+        if price is None:
+            price = float(o.get("price") or 0) or float(o.get("triggerPrice") or 0)
+        now = self._now_ms()
+        new_done = done + qty
+        o["avgPrice"] = str((float(o["avgPrice"]) * done + price * qty) / new_done) if new_done else "0"
+        o["cumExecQty"] = str(new_done)
+        o["orderStatus"] = "Filled" if new_done >= total else "PartiallyFilled"
+        o["updatedTime"] = str(now)
+        self._emit("execution", [{"symbol": o["symbol"], "orderId": o["orderId"], "orderLinkId": link,
+                                  "side": o["side"], "execId": uuid.uuid4().hex, "execPrice": str(price),
+                                  "execQty": str(qty), "execTime": str(now)}])
+        self._emit("order", [o])
+
+        pos = self.positions.setdefault(o["symbol"], {"symbol": o["symbol"], "side": "", "size": "0",
+                                                      "entryPrice": "0", "positionIdx": 0})
+        signed = float(pos["size"]) * (1 if pos["side"] == "Buy" else -1)
+        delta = qty if o["side"] == "Buy" else -qty
+        new_signed = signed + delta
+        if new_signed and (signed == 0 or (signed > 0) == (delta > 0)):
+            pos["entryPrice"] = str((abs(signed) * float(pos["entryPrice"]) + qty * price) / abs(new_signed))
+        pos["size"] = str(abs(new_signed))
+        pos["side"] = "" if not new_signed else ("Buy" if new_signed > 0 else "Sell")
+        pos["updatedTime"] = str(now)
+        self._emit("position", [dict(pos)])
+        if o["orderStatus"] == "Filled" and link not in self.children:
+            self._attach_tpsl(link, o)
+
+    def cancel(self, link: str) -> None:
+        o = self.orders[link]
+        o["orderStatus"] = "Cancelled"
+        o["updatedTime"] = str(self._now_ms())
+        self._emit("order", [o])
+
+    def _emit(self, topic: str, rows: List[dict]) -> None:
+        frame = {"id": uuid.uuid4().hex, "topic": topic, "creationTime": self._clock_ms,
+                 "data": [dict(r) for r in rows]}
+        self.recorded.append(frame)
+        for q in self._subscribers.values():
+            q.put_nowait(frame)
+
+    async def drop_connections(self) -> None:
+        """Derruba os WebSockets abertos (o cliente deve reconectar e reconciliar)."""
+        for ws in list(self._subscribers):
+            await ws.close()
+
+    async def _preamble(self, request: web.Request):
+        self.stats["requests"] += 1
+        key = request.headers.get("X-BAPI-API-KEY") or ""
+        latency = self.latency_by_key.get(key, self.latency_s)
+        if latency:
+            await asyncio.sleep(latency)
+        payload = request.query_string if request.method == "GET" else await request.text()
+        headers, limited = self._limit_headers(request.path, key)
+        if not self._check_sign(request, payload):
+            return None, self._reply(10004, "error sign!", headers=headers)
+        if limited:
+            self.stats["rate_limited"] += 1
+            return None, self._reply(10006, "Too many visits!", headers=headers)
+        body = dict(request.query) if request.method == "GET" else json.loads(payload or "{}")
+        return (body, headers, key), None
+
+    # ---------------- rotas ----------------
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        ok, err = await self._preamble(request)
+        if err is not None:
+            return err
+        body, headers, key = ok
+        rows, infos = [], []
+        for item in body.get("request", []):
+            row, info = self._create(item, key)
+            rows.append(row)
+            infos.append(info)
+        return self._reply(0, "OK", {"list": rows}, {"list": infos}, headers)
+
+    async def create(self, request: web.Request) -> web.Response:
+        ok, err = await self._preamble(request)
+        if err is not None:
+            return err
+        body, headers, key = ok
+        row, info = self._create(body, key)
+        if info["code"]:
+            return self._reply(info["code"], info["msg"], headers=headers)
+        return self._reply(0, "OK", {"orderId": row["orderId"], "orderLinkId": row["orderLinkId"]}, headers=headers)
+
+    async def _list(self, request: web.Request, rows_for) -> web.Response:
+        """rows_for(api_key) -> linhas da conta que assinou a request."""
+        ok, err = await self._preamble(request)
+        if err is not None:
+            return err
+        _, headers, key = ok
+        rows = rows_for(key)
+        q = request.query
+        limit = int(q.get("limit", 20))
+        start = int(q.get("cursor") or 0)
+        page = rows[start:start + limit]
+        cursor = str(start + limit) if start + limit < len(rows) else ""
+        return self._reply(0, "OK", {"category": q.get("category", "linear"), "list": [dict(r) for r in page],
+                                     "nextPageCursor": cursor}, headers=headers)
+
+    async def orders_realtime(self, request: web.Request) -> web.Response:
+        return await self._list(request, lambda key: [
+            o for o in self.books[key].values() if o["orderStatus"] in ("New", "PartiallyFilled", "Untriggered")])
+
+    async def orders_history(self, request: web.Request) -> web.Response:
+        return await self._list(request, lambda key: sorted(
+            (o for o in self.books[key].values() if o["orderStatus"] in ("Filled", "Cancelled")),
+            key=lambda o: int(o["updatedTime"]), reverse=True))
+
+    async def position_list(self, request: web.Request) -> web.Response:
+        # posições só são simuladas na conta principal
+        return await self._list(request, lambda key: list(self.positions.values()) if key == self.api_key else [])
+
+    async def ws_private(self, request: web.Request):
+        if not self.accept_ws:
+            raise web.HTTPServiceUnavailable()
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["ws_connects"] += 1
+        authed = False
+        writer = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                data = json.loads(msg.data)
+                op = data.get("op")
+                if op == "auth":
+                    key, expires, sign = (data.get("args") or [None, 0, ""])[:3]
+                    expected = hmac.new(self.api_secret.encode(), f"GET/realtime{expires}".encode(),
+                                        hashlib.sha256).hexdigest()
+                    authed = key == self.api_key and hmac.compare_digest(expected, sign or "")
+                    await ws.send_json({"success": authed, "ret_msg": "" if authed else "Invalid sign",
+                                        "op": "auth", "conn_id": str(id(ws))})
+                elif op == "subscribe":
+                    await ws.send_json({"success": authed, "ret_msg": "" if authed else "Request not authorized",
+                                        "op": "subscribe", "conn_id": str(id(ws))})
+                    if authed and writer is None:
+                        q: asyncio.Queue = asyncio.Queue()
+                        for frame in self.frames:
+                            q.put_nowait(frame)
+                        self._subscribers[ws] = q
+                        writer = asyncio.create_task(self._writer(ws, q))
+                elif op == "ping":
+                    await ws.send_json({"success": True, "ret_msg": "pong", "op": "pong", "conn_id": str(id(ws))})
+        finally:
+            self._subscribers.pop(ws, None)
+            if writer is not None:
+                writer.cancel()
+        return ws
+
+    async def _writer(self, ws: web.WebSocketResponse, q: asyncio.Queue) -> None:
+        while True:
+            frame = await q.get()
+            await ws.send_str(json.dumps(frame))
+            self.stats["frames_sent"] += 1
+            if self.frame_delay_s:
+                await asyncio.sleep(self.frame_delay_s)
+
+    async def instruments_info(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        q = request.query
+        limit = min(int(q.get("limit", 500)), 1000)
+        start = int(q.get("cursor") or 0)
+        cursor = str(start + limit) if start + limit < len(self.instruments) else ""
+        return self._reply(0, "OK", {"category": q.get("category", "linear"),
+                                     "list": self.instruments[start:start + limit], "nextPageCursor": cursor})
+
+    async def server_time(self, request: web.Request) -> web.Response:
+        now = time.time()
+        return self._reply(0, "OK", {"timeSecond": str(int(now)), "timeNano": str(int(now * 1e9))})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v5/order/create-batch", self.create_batch)
+        app.router.add_post("/v5/order/create", self.create)
+        app.router.add_get("/v5/order/realtime", self.orders_realtime)
+        app.router.add_get("/v5/order/history", self.orders_history)
+        app.router.add_get("/v5/position/list", self.position_list)
+        app.router.add_get("/v5/private", self.ws_private)
+        app.router.add_get("/v5/market/time", self.server_time)
+        app.router.add_get("/v5/market/instruments-info", self.instruments_info)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Sobe o servidor; port=0 escolhe uma porta livre. Retorna a base_url."""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def _serve(args):
+    frames = []
+    if args.frames:
+        with open(args.frames, "r", encoding="utf-8") as f:
+            frames = [json.loads(line) for line in f if line.strip()]
+    standin = BybitStandIn(args.latency_ms / 1000.0, args.limit_per_s, args.fail_ratio, frames=frames)
+    url = await standin.start(args.host, args.port)
+    print(f"stand-in Bybit v5 em {url} (ws: {url.replace('http', 'ws')}/v5/private, "
+          f"key={API_KEY} secret={API_SECRET}, frames={len(frames)}) — Ctrl+C para sair")
+    await asyncio.Event().wait()
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Stand-in local da API v5 da Bybit.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--limit-per-s", type=int, default=10)
+    ap.add_argument("--fail-ratio", type=float, default=0.0)
+    ap.add_argument("--frames", help="JSONL com frames do WebSocket privado para reproduzir")
+    args = ap.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main_cli()
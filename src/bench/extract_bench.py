@@ -0,0 +1,96 @@
+# src/bench/extract_bench.py
+"""
+Microbenchmark de extract_top_msg_id (utils/utils_topic) sobre mensagens "gravadas":
+objetos TL reais do Telethon, serializados em bytes e lidos de volta (como chegam do
+servidor), em todas as variantes de reply_to do layer atual.
+
+Compara com a versão antiga (atributos + fallback via message.to_dict()).
+
+Uso (a partir da raiz do projeto):
+    python src/bench/extract_bench.py --number 200000
+"""
+import argparse
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+from telethon.extensions import BinaryReader
+from telethon.tl.types import (
+    Message, MessageService, MessageReplyHeader, MessageReplyStoryHeader, PeerChannel, PeerUser,
+    MessageActionTopicCreate,
+)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.utils_topic import extract_top_msg_id  # noqa: E402
+
+
+def _legacy_extract(message):
+    """Versão anterior (telegram_reader/utils_topic), sem o await, para comparação."""
+    if message is None:
+        return None
+    r = getattr(message, "reply_to", None)
+    if r is not None:
+        v = getattr(r, "top_msg_id", None) or getattr(r, "reply_to_top_id", None)
+        if isinstance(v, int):
+            return v
+    for attr in ("top_msg_id", "reply_to_top_id"):
+        v = getattr(message, attr, None)
+        if isinstance(v, int):
+            return v
+    try:
+        d = message.to_dict() or {}
+        rt = d.get("reply_to", {}) or {}
+        v = rt.get("top_msg_id", None) or rt.get("reply_to_top_id", None)
+        if isinstance(v, int):
+            return v
+    except Exception:
+        pass
+    return None
+
+
+def _recorded(obj):
+    """Serializa e lê de volta: mesmo caminho de um objeto vindo do servidor."""
+    return BinaryReader(bytes(obj)).tgread_object()
+
+
+def build_cases():
+    peer = PeerChannel(2427024288)
+    date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    text = "🟢 LONG BTC\nEntrada: 100 - 101 (pm: 100.5)\nTPs: 102, 103\nSL: 98"
+
+    def msg(msg_id, reply_to=None):
+        return Message(id=msg_id, peer_id=peer, date=date, message=text, from_id=PeerUser(42), reply_to=reply_to)
+
+    # (nome, mensagem, top esperado)
+    return [
+        ("forum: resposta dentro do tópico", msg(500, MessageReplyHeader(
+            reply_to_msg_id=480, reply_to_top_id=14, forum_topic=True)), 14),
+        ("forum: mensagem no tópico", msg(501, MessageReplyHeader(
+            reply_to_msg_id=14, forum_topic=True)), 14),
+        ("forum: raiz do tópico (service)", MessageService(
+            id=31, peer_id=peer, date=date, action=MessageActionTopicCreate(title="Sinais", icon_color=0)), 31),
+        ("resposta comum (sem fórum)", msg(502, MessageReplyHeader(reply_to_msg_id=480)), None),
+        ("resposta a story", msg(503, MessageReplyStoryHeader(peer=PeerUser(42), story_id=7)), None),
+        ("sem reply_to", msg(504), None),
+    ]
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Microbenchmark de extract_top_msg_id (offline).")
+    ap.add_argument("--number", type=int, default=100000)
+    args = ap.parse_args()
+
+    print(f"{'variante':<36} {'esperado':>8} {'novo':>6} {'antigo':>7} {'novo ns':>9} {'antigo ns':>10}")
+    for name, obj, expected in build_cases():
+        m = _recorded(obj)
+        new, old = extract_top_msg_id(m), _legacy_extract(m)
+        assert new == expected, (name, new, expected)
+        t_new = timeit.timeit(lambda: extract_top_msg_id(m), number=args.number) / args.number * 1e9
+        t_old = timeit.timeit(lambda: _legacy_extract(m), number=args.number // 10) / (args.number // 10) * 1e9
+        print(f"{name:<36} {expected!s:>8} {new!s:>6} {old!s:>7} {t_new:>9.0f} {t_old:>10.0f}")
+
+
+if __name__ == "__main__":
+    main_cli()
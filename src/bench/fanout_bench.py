@@ -0,0 +1,101 @@
+# src/bench/fanout_bench.py
+"""
+Benchmark do MultiAccountExecutor (copy-trading) contra o stand-in local com N subcontas.
+
+  - sequencial: uma conta depois da outra (como seria com um único BybitClient em loop);
+  - fan-out:    MultiAccountExecutor, todas as contas em paralelo, cliente/pool/rate limit por conta.
+Mede a latência de colocação por conta (do início do sinal até a conta terminar) e confere o
+isolamento de falha: uma conta com secret errado e uma conta lenta (estoura o timeout) não
+atrasam nem derrubam as outras.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/fanout_bench.py --accounts 200 --latency-ms 20 --limit-per-s 10
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bybit_standin import BybitStandIn  # noqa: E402
+from fanout import MultiAccountExecutor  # noqa: E402
+from models import AccountConfig, TradeSignal  # noqa: E402
+
+SIGNAL = TradeSignal(side="LONG", symbol="ETH", entry_low=3190, entry_high=3210, entry_pm=3200.37, sl=3120.5,
+                     lev_min=5, lev_max=10, tps=[3260.12, 3310.5, 3390.77], tags=[])
+
+
+def _accounts(n: int):
+    return [AccountConfig(f"sub{i:04d}", balance_usdt=1000 + 10 * i, risk_pct=0.01,
+                          profile="50_25_25" if i % 2 else "scalp_mack",
+                          api_key=f"key{i:04d}", api_secret=f"secret{i:04d}") for i in range(n)]
+
+
+def _ms(x: float) -> str:
+    return f"{x * 1000:.0f}ms"
+
+
+async def _sequential(executor: MultiAccountExecutor, signal_id: str):
+    """Referência: as mesmas contas/clients, uma de cada vez."""
+    plan = executor.plan(SIGNAL)
+    t0 = time.perf_counter()
+    lat = []
+    for i in plan.active().tolist():
+        await executor.clients[executor.table.account_ids[i]].place_orders(plan.orders(i), signal_id=signal_id)
+        lat.append(time.perf_counter() - t0)
+    return lat
+
+
+async def run(args):
+    accounts = _accounts(args.accounts)
+    secrets = {a.api_key: a.api_secret for a in accounts}
+    slow = accounts[-1].api_key
+    standin = BybitStandIn(args.latency_ms / 1000.0, limit_per_s=args.limit_per_s, accounts=secrets,
+                           latency_by_key={slow: args.timeout_s * 2})
+    url = await standin.start()
+
+    # sequencial e fan-out sem a conta lenta (senão o sequencial só mede o timeout dela)
+    ex = MultiAccountExecutor(accounts[:-1], base_url=url, concurrency=args.concurrency,
+                              account_timeout_s=args.timeout_s)
+    lat = await _sequential(ex, "seqsignal0001")
+    print(f"[sequencial] {len(lat)} contas: primeira={_ms(lat[0])} p50={_ms(sorted(lat)[len(lat) // 2])} "
+          f"última={_ms(lat[-1])}")
+    report = await ex.place_signal(SIGNAL, "fansignal0001")
+    print(f"[fan-out]    {report.summary()}")
+    await ex.close()
+
+    # isolamento de falha: secret errado + conta lenta
+    broken = list(accounts)
+    broken[0] = AccountConfig(broken[0].account_id, broken[0].balance_usdt, broken[0].risk_pct,
+                              broken[0].profile, api_key=broken[0].api_key, api_secret="errado")
+    ex = MultiAccountExecutor(broken, base_url=url, concurrency=args.concurrency, account_timeout_s=args.timeout_s)
+    report = await ex.place_signal(SIGNAL, "fansignal0002")
+    healthy = [r for r in report.results if not (r.error or r.failed)]
+    print(f"[falhas]     {report.summary()}")
+    for r in report.failed_accounts + report.unknown_accounts:
+        print(f"             {r.account_id}: ok={r.ok} falhas={r.failed} erro={r.error} em {_ms(r.latency_s)}")
+    print(f"             saudáveis={len(healthy)} p99 das saudáveis="
+          f"{_ms(sorted(r.latency_s for r in healthy)[int(0.99 * (len(healthy) - 1))])}")
+    print(f"             stand-in: ordens={standin.stats['orders']} limitadas={standin.stats['rate_limited']}")
+    await ex.close()
+    await standin.stop()
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="MultiAccountExecutor contra o stand-in local.")
+    ap.add_argument("--accounts", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--limit-per-s", type=int, default=10, help="limite por conta e endpoint no stand-in")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--timeout-s", type=float, default=1.0, help="timeout por conta")
+    args = ap.parse_args()
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
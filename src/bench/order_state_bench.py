@@ -0,0 +1,148 @@
+# src/bench/order_state_bench.py
+"""
+Confere e mede o OrderStateBook + BybitPrivateStream contra o stand-in local
+(bench/bybit_standin.py), sem rede externa.
+
+Fase 1 (ao vivo): coloca N sinais, executa entradas/TP1 no stand-in, derruba o WebSocket,
+  executa/cancela mais pernas com o stream fora, volta -> o stream reconecta, reconcilia
+  pelo snapshot REST e o livro tem que bater com o estado do stand-in.
+Fase 2 (replay): reproduz os frames gravados na fase 1 num stand-in novo e mede
+  frames/s aplicados e o custo das consultas O(1).
+
+Uso (a partir da raiz do projeto):
+    python src/bench/order_state_bench.py --signals 200 [--record frames.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bybit_client import BybitClient, order_link_id  # noqa: E402
+from bybit_standin import BybitStandIn, API_KEY, API_SECRET  # noqa: E402
+from bybit_bench import _signal  # noqa: E402
+from helpers import build_order_plan  # noqa: E402
+from models import PlanConfig  # noqa: E402
+from order_state import OrderStateBook, BybitPrivateStream  # noqa: E402
+
+
+def _client(url: str) -> BybitClient:
+    return BybitClient(API_KEY, API_SECRET, base_url=url, ws_private_url=url.replace("http", "ws") + "/v5/private")
+
+
+async def _drain(standin: BybitStandIn, stream: BybitPrivateStream, expected_frames: int):
+    while stream.stats["frames"] < expected_frames:
+        await asyncio.sleep(0.005)
+
+
+def _mismatches(book: OrderStateBook, standin: BybitStandIn):
+    bad = []
+    for link, o in standin.orders.items():
+        s = book.get(link)
+        if s is None or s.status != o["orderStatus"] or abs(s.cum_exec_qty - float(o["cumExecQty"])) > 1e-9:
+            bad.append((link, o["orderStatus"], s and s.status))
+    for sym, p in standin.positions.items():
+        s = book.position(sym)
+        if s is None or abs(s.size - float(p["size"])) > 1e-9 or s.side != p["side"]:
+            bad.append((sym, p["size"], s and s.size))
+    return bad
+
+
+async def phase_live(args):
+    standin = BybitStandIn(limit_per_s=100000)
+    url = await standin.start()
+    client = _client(url)
+    book = OrderStateBook()
+    stream = BybitPrivateStream(client, book)
+    task = asyncio.create_task(stream.run())
+    await stream.connected.wait()
+
+    cfg = PlanConfig(tp_alloc=[0.5, 0.25, 0.25], risk_pct=0.01, balance_usdt=1000)
+    sids = [f"sig{i:06d}" for i in range(args.signals)]
+    await asyncio.gather(*(client.place_orders(build_order_plan(_signal(i), cfg), signal_id=sid)
+                           for i, sid in enumerate(sids)))
+    for sid in sids[::2]:
+        # a perna ENTRY1 leva o TP1 preso: executou -> a "corretora" cria o TP1/SL1 dela (sem orderLinkId)
+        standin.fill(order_link_id(sid, "ENTRY1"))
+    await _drain(standin, stream, len(standin.recorded))
+    linked = sum(1 for sid in sids[::2] if book.leg(sid, "TP1") is not None and book.leg(sid, "SL1") is not None)
+    for sid in sids[::2]:
+        standin.fill(book.leg(sid, "TP1").order_id)   # o livro diz qual ordem é o TP1 do sinal
+    await _drain(standin, stream, len(standin.recorded))
+    print(f"[ao vivo]   frames={len(standin.recorded)} divergências={len(_mismatches(book, standin))} "
+          f"TP1/SL1 ligados={linked}/{len(sids[::2])} TP1 do {sids[0]} executado? {book.is_filled(sids[0], 'TP1')}")
+
+    # queda: mudanças com o stream fora
+    standin.accept_ws = False
+    await standin.drop_connections()
+    while stream.connected.is_set():
+        await asyncio.sleep(0.005)
+    for sid in sids[:20:2]:
+        standin.fill(order_link_id(sid, "ENTRY2"))
+    for sid in sids[1:20:2]:
+        standin.cancel(order_link_id(sid, "ENTRY3"))
+    print(f"[queda]     divergências com o stream fora={len(_mismatches(book, standin))}")
+    standin.accept_ws = True
+    t0 = time.perf_counter()
+    await stream.connected.wait()
+    print(f"[reconexão] reconciliado em {time.perf_counter() - t0:.2f}s (inclui backoff) "
+          f"divergências={len(_mismatches(book, standin))} book={book.stats}")
+
+    stream.stop()
+    task.cancel()
+    await client.close()
+    await standin.stop()
+    return standin.recorded
+
+
+async def phase_replay(frames, args):
+    standin = BybitStandIn(limit_per_s=100000, frames=frames)
+    url = await standin.start()
+    client = _client(url)
+    book = OrderStateBook()
+    stream = BybitPrivateStream(client, book)
+    t0 = time.perf_counter()
+    task = asyncio.create_task(stream.run())
+    await _drain(standin, stream, len(frames))
+    dt = time.perf_counter() - t0
+    print(f"[replay]    {len(frames)} frames em {dt * 1000:.0f}ms -> {len(frames) / dt:,.0f} frames/s "
+          f"(ordens={len(book.orders)} posições={len(book.positions)})")
+
+    sid = "sig000000"
+    link = order_link_id(sid, "ENTRY1")
+    n = 200000
+    t_get = timeit.timeit(lambda: book.get(link), number=n) / n * 1e9
+    t_filled = timeit.timeit(lambda: book.is_filled(sid, "TP1"), number=n) / n * 1e9
+    apply = [f for f in frames if f["topic"] == "order"][:1] * n
+    t_apply = timeit.timeit(lambda: book.apply_frame(apply[0]), number=n) / n * 1e9
+    print(f"[consultas] get(orderLinkId)={t_get:.0f}ns is_filled(sinal, TP1)={t_filled:.0f}ns (TP1 executado? {book.is_filled(sid, 'TP1')}) "
+          f"apply_frame(order)={t_apply:.0f}ns")
+
+    stream.stop()
+    task.cancel()
+    await client.close()
+    await standin.stop()
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="OrderStateBook + WebSocket privado contra o stand-in local.")
+    ap.add_argument("--signals", type=int, default=200)
+    ap.add_argument("--record", help="grava os frames da fase ao vivo em JSONL")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+    frames = asyncio.run(phase_live(args))
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for frame in frames:
+                f.write(json.dumps(frame) + "\n")
+    asyncio.run(phase_replay(frames, args))
+
+
+if __name__ == "__main__":
+    main_cli()
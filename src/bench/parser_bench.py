@@ -0,0 +1,213 @@
+# src/bench/parser_bench.py
+"""
+Benchmark de parse_signal_flexible (parser_signal) contra a versão antiga (um re.search por
+campo, com os padrões montados a cada mensagem).
+
+  - equivalência: N mensagens aleatórias cobrindo os formatos aceitos (LONG $COIN/USDT,
+    "🟢 LONG – SOLUSDT", Entrada única/faixa/pm, Entradas Escalonadas, TPs em lista ou TP1..TPn,
+    SL/Stop/Stop Loss, Alavancagem faixa/única, #tags) e variantes quebradas (campo faltando,
+    minúsculas, separadores trocados). Antigo e novo têm que dar o MESMO TradeSignal ou o MESMO
+    ValueError em todas;
+  - throughput (mensagens/s) por formato canônico e no corpus aleatório inteiro.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/parser_bench.py --messages 50000 --number 20000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import TradeSignal  # noqa: E402
+from parser_signal import NUM, _n, parse_signal_flexible  # noqa: E402
+
+
+def _legacy_flexible(text: str) -> TradeSignal:
+    """Versão anterior de parse_signal_flexible, para comparação."""
+    raw = text.strip()
+
+    m_side = re.search(r"\b(LONG|SHORT)\b", raw, flags=re.I)
+    if not m_side:
+        raise ValueError("Não encontrei LONG/SHORT.")
+    side = m_side.group(1).upper()
+
+    sym = None
+    m_sym1 = re.search(r"\b(?:LONG|SHORT)\b\s+\$?([A-Z0-9]{2,15})(?:/USDT|USDT)?", raw, flags=re.I)
+    if m_sym1:
+        sym = m_sym1.group(1).upper()
+    if not sym:
+        m_sym2 = re.search(r"\b([A-Z0-9]{2,15})USDT\b", raw)
+        if m_sym2:
+            sym = m_sym2.group(1).upper()
+    if not sym:
+        m_sym3 = re.search(r"\b(?:LONG|SHORT)\b\s+([A-Z]{2,10})\b", raw)
+        if m_sym3:
+            sym = m_sym3.group(1).upper()
+    if not sym:
+        raise ValueError("Não consegui inferir o símbolo.")
+
+    entry_low = entry_high = entry_pm = None
+    m_esc = re.search(r"Entradas?\s+Escalonadas?\s*:\s*(" + NUM + r")\s*[-–]\s*(" + NUM + r")", raw, flags=re.I)
+    if m_esc:
+        a = _n(m_esc.group(1)); b = _n(m_esc.group(2))
+        entry_low, entry_high = min(a, b), max(a, b)
+        entry_pm = (entry_low + entry_high) / 2.0
+    if entry_pm is None:
+        m_ent = re.search(r"Entrada\s*:\s*(" + NUM + r")\s*[-–]\s*(" + NUM + r")\s*(?:\((?:pm|média)\s*:\s*(" + NUM + r")\))?", raw, flags=re.I)
+        if m_ent:
+            a = _n(m_ent.group(1)); b = _n(m_ent.group(2))
+            entry_low, entry_high = min(a, b), max(a, b)
+            if m_ent.group(3):
+                entry_pm = _n(m_ent.group(3))
+            else:
+                entry_pm = (entry_low + entry_high) / 2.0
+    if entry_pm is None:
+        m_one = re.search(r"Entrada\s*:\s*(" + NUM + r")", raw, flags=re.I)
+        if m_one:
+            v = _n(m_one.group(1))
+            entry_low = entry_high = entry_pm = v
+    if entry_pm is None:
+        raise ValueError("Não consegui ler a Entrada/Entradas Escalonadas.")
+
+    m_sl = re.search(r"\bSL\s*:\s*(" + NUM + r")", raw, flags=re.I)
+    if not m_sl:
+        m_sl = re.search(r"\bStop(?:\s*Loss)?\s*:\s*(" + NUM + r")", raw, flags=re.I)
+    if not m_sl:
+        raise ValueError("Não encontrei SL.")
+    sl = _n(m_sl.group(1))
+
+    tps: List[float] = []
+    m_tps_list = re.search(r"\bTPs?\s*:\s*([^\n\r]+)", raw, flags=re.I)
+    if m_tps_list:
+        chunk = m_tps_list.group(1)
+        for m in re.finditer(NUM, chunk):
+            tps.append(_n(m.group(0)))
+    if not tps:
+        for m in re.finditer(r"\bTP\d+\s*:\s*(" + NUM + r")", raw, flags=re.I):
+            tps.append(_n(m.group(1)))
+    if not tps:
+        raise ValueError("Não encontrei TPs.")
+
+    lev_min = lev_max = None
+    m_lev1 = re.search(r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\s*(?:a|–|-|to|até)\s*(" + NUM + r")\s*[xX]?", raw, flags=re.I)
+    if m_lev1:
+        lev_min, lev_max = _n(m_lev1.group(1)), _n(m_lev1.group(2))
+    else:
+        m_lev2 = re.search(r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\b", raw, flags=re.I)
+        if m_lev2:
+            lev_min = _n(m_lev2.group(1))
+            lev_max = lev_min
+
+    tags = re.findall(r"#\w+", raw)
+
+    return TradeSignal(
+        side=side, symbol=sym,
+        entry_low=entry_low, entry_high=entry_high, entry_pm=entry_pm,
+        sl=sl, lev_min=lev_min, lev_max=lev_max,
+        tps=tps, tags=tags
+    )
+
+
+# ---------------- corpus ----------------
+
+CANONICAL = {
+    "clássico (faixa + pm)": "🟢 LONG BTC\nEntrada: 100 - 101 (pm: 100.5)\nTPs: 102, 103, 104\nSL: 98\n"
+                             "Alavancagem: 5x a 10x\n#scalp",
+    "$COIN/USDT + mercado": "LONG $POPCAT/USDT\nEntrada: 0.027 (mercado)\nTP1: 0.029\nTP2: 0.031\nTP3: 0.034\n"
+                            "Stop Loss: 0.025\nAlavancagem: 3x",
+    "escalonada + SOLUSDT": "🔴 SHORT – SOLUSDT\nEntradas Escalonadas: 173.50-177.00\nTPs: 170, 168,5, 165\n"
+                            "Stop: 180\nAlavancagem: 10x – 20x\n#swing #sol",
+}
+
+
+def _num(rnd: random.Random, base: float) -> str:
+    v = base * rnd.uniform(0.9, 1.1)
+    s = f"{v:.{rnd.choice((0, 1, 2, 4))}f}"
+    return s.replace(".", ",") if rnd.random() < 0.1 else s
+
+
+def random_message(rnd: random.Random) -> str:
+    """Mensagem sintética: formatos aceitos + ruído (campos faltando, caixa, separadores)."""
+    base = rnd.choice((0.027, 1.5, 173.5, 42000.0))
+    side = rnd.choice(("LONG", "SHORT", "long", "Short"))
+    coin = rnd.choice(("BTC", "SOL", "POPCAT", "1000PEPE", "ab"))
+    head = rnd.choice((f"{side} {coin}", f"🟢 {side} – {coin}USDT", f"{side} ${coin}/USDT",
+                       f"{side}\n{coin}USDT", f"Sinal {coin} {side}"))
+    lines = [head]
+    a, b = _num(rnd, base), _num(rnd, base)
+    entry = rnd.choice((f"Entrada: {a} - {b} (pm: {_num(rnd, base)})", f"Entrada: {a} – {b}",
+                        f"Entrada: {a} (mercado)", f"Entradas Escalonadas: {a}-{b}",
+                        f"entrada : {a}", f"Entry: {a}", ""))
+    lines.append(entry)
+    n_tp = rnd.randint(0, 4)
+    tps = [_num(rnd, base) for _ in range(n_tp)]
+    if tps:
+        lines.append(rnd.choice((f"TPs: {', '.join(tps)}", f"TP: {' / '.join(tps)}",
+                                 "\n".join(f"TP{i}: {t}" for i, t in enumerate(tps, 1)))))
+    lines.append(rnd.choice((f"SL: {_num(rnd, base)}", f"Stop: {_num(rnd, base)}",
+                             f"Stop Loss: {_num(rnd, base)}", f"sl:{_num(rnd, base)}", "")))
+    lines.append(rnd.choice(("Alavancagem: 5x", "Alavancagem: 3x a 15x", "Alavancagem: 10x - 20x",
+                             "Alavancagem: 2X até 4X", "alavancagem:7x", "")))
+    if rnd.random() < 0.4:
+        lines.append(" ".join(rnd.sample(("#scalp", "#swing", "#btc", "#vip"), rnd.randint(1, 3))))
+    if rnd.random() < 0.3:
+        rnd.shuffle(lines)
+    return "\n".join(line for line in lines if line)
+
+
+def _outcome(parse, text: str):
+    try:
+        return parse(text)
+    except ValueError as e:
+        return ("ValueError", str(e))
+
+
+def _rate(parse, corpus: List[str], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in corpus:
+            try:
+                parse(text)
+            except ValueError:
+                pass
+        best = min(best, time.perf_counter() - t0)
+    return len(corpus) / best
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="parse_signal_flexible: novo vs antigo (equivalência + msgs/s).")
+    ap.add_argument("--messages", type=int, default=50000, help="tamanho do corpus aleatório")
+    ap.add_argument("--number", type=int, default=20000, help="repetições por formato canônico")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    corpus = [random_message(rnd) for _ in range(args.messages)]
+    diffs = [t for t in corpus if _outcome(parse_signal_flexible, t) != _outcome(_legacy_flexible, t)]
+    accepted = sum(1 for t in corpus if not isinstance(_outcome(parse_signal_flexible, t), tuple))
+    print(f"equivalência: {len(corpus)} mensagens ({accepted} aceitas, {len(corpus) - accepted} com ValueError) "
+          f"-> divergências={len(diffs)}")
+    for t in diffs[:3]:
+        print(f"  divergente: {t!r}\n    novo={_outcome(parse_signal_flexible, t)}\n    antigo={_outcome(_legacy_flexible, t)}")
+
+    print(f"\n{'formato':<26} {'novo msgs/s':>12} {'antigo msgs/s':>14} {'ganho':>7}")
+    for name, text in CANONICAL.items():
+        assert parse_signal_flexible(text) == _legacy_flexible(text), name
+        t_new = timeit.timeit(lambda: parse_signal_flexible(text), number=args.number)
+        t_old = timeit.timeit(lambda: _legacy_flexible(text), number=args.number)
+        print(f"{name:<26} {args.number / t_new:>12,.0f} {args.number / t_old:>14,.0f} {t_old / t_new:>6.2f}x")
+    r_new, r_old = _rate(parse_signal_flexible, corpus), _rate(_legacy_flexible, corpus)
+    print(f"{'corpus aleatório':<26} {r_new:>12,.0f} {r_old:>14,.0f} {r_new / r_old:>6.2f}x")
+    if diffs:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+# src/bench/plan_bench.py
+"""
+Benchmark do planejamento multi-conta (copy-trading): build_order_plan em loop, uma
+conta por vez, vs build_order_plans (NumPy, colunar) para 1 / 100 / 10.000 contas.
+Também confere que as qtys do batch batem com o build_order_plan conta a conta.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/plan_bench.py [--accounts 1,100,10000] [--no-instruments]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from helpers import build_order_plan, _alloc_by_profile  # noqa: E402
+from instruments import parse_instrument  # noqa: E402
+from models import AccountConfig, PlanConfig, TradeSignal  # noqa: E402
+from plan_batch import AccountTable, build_order_plans  # noqa: E402
+
+SIGNAL = TradeSignal(side="LONG", symbol="ETH", entry_low=3190, entry_high=3210, entry_pm=3200.37, sl=3120.5,
+                     lev_min=5, lev_max=10, tps=[3260.12, 3310.5, 3390.77], tags=[])
+ETH = parse_instrument({"symbol": "ETHUSDT", "priceFilter": {"tickSize": "0.01"},
+                        "lotSizeFilter": {"qtyStep": "0.01", "minOrderQty": "0.01", "maxOrderQty": "1500",
+                                          "minNotionalValue": "5"}})
+
+
+def _accounts(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    return [AccountConfig(f"acc{i:05d}", balance_usdt=round(rnd.uniform(50, 50000), 2),
+                          risk_pct=rnd.choice((0.005, 0.01, 0.02)),
+                          profile=rnd.choice(("50_25_25", "scalp_mack"))) for i in range(n)]
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="build_order_plan em loop vs build_order_plans (NumPy).")
+    ap.add_argument("--accounts", default="1,100,10000")
+    ap.add_argument("--no-instruments", action="store_true", help="usa a precisão global (sem InstrumentInfo)")
+    args = ap.parse_args()
+    instruments = None if args.no_instruments else {"ETHUSDT": ETH}
+
+    for n in (int(x) for x in args.accounts.split(",")):
+        accounts = _accounts(n)
+        table = AccountTable(accounts)
+        cfgs = [PlanConfig(tp_alloc=_alloc_by_profile(len(SIGNAL.tps), a.profile), risk_pct=a.risk_pct,
+                           balance_usdt=a.balance_usdt) for a in accounts]
+
+        loop = lambda: [build_order_plan(SIGNAL, c, instruments=instruments) for c in cfgs]
+        batch = lambda: build_order_plans(SIGNAL, table, instruments=instruments)
+        batch_all = lambda: [o for _, o in batch().iter_orders()]
+
+        # conferência: batch == escalar, conta a conta
+        ref, plan = loop(), batch()
+        diff = sum(1 for i, orders in enumerate(ref)
+                   if [(o.tag, o.price, o.qty) for o in orders] != [(o.tag, o.price, o.qty) for o in plan.orders(i)])
+
+        repeat = 50 if n <= 100 else 5
+        t_loop, t_batch, t_all = _best(loop, repeat), _best(batch, repeat), _best(batch_all, repeat)
+        t_table = _best(lambda: AccountTable(accounts), repeat)
+        print(f"[{n:>6} contas] loop={t_loop * 1e3:8.2f}ms  batch={t_batch * 1e3:7.3f}ms "
+              f"({t_loop / t_batch:5.1f}x)  batch+Order's={t_all * 1e3:8.2f}ms  "
+              f"AccountTable={t_table * 1e3:6.2f}ms  divergências={diff}")
+
+
+if __name__ == "__main__":
+    main_cli()
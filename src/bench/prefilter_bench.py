@@ -0,0 +1,80 @@
+# src/bench/prefilter_bench.py
+"""
+Benchmark do pré-filtro "parece um sinal?" sobre um corpus rotulado (bench/prefilter_corpus.jsonl:
+sinais e conversas em pt/en/es, com as armadilhas de substring "slow", "http", "along", "shortly"...).
+
+Compara a heurística antiga (substring: "sl" in texto, "tp" in texto...) com o SignalPrefilter
+(palavra inteira + score), nas línguas padrão e com "es":
+  - falsos positivos (conversa marcada como sinal) e falsos negativos (sinal descartado), por idioma;
+  - throughput (mensagens/s) sobre o corpus.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/prefilter_bench.py [--corpus outro.jsonl] [--repeat 2000]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parser_signal import SignalPrefilter  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "prefilter_corpus.jsonl"
+
+
+def _legacy_is_potential_signal(text: str) -> bool:
+    """Versão anterior de is_potential_signal (substring), para comparação."""
+    t = text.lower()
+    has_side = ("long" in t) or ("short" in t)
+    has_entry = ("entrada" in t) or ("entradas escalonadas" in t) or ("entry" in t)
+    has_tp = ("tp" in t) or ("tps" in t)
+    has_sl = ("sl" in t) or ("stop" in t)
+    return has_side and (has_entry or has_tp or has_sl)
+
+
+def load_corpus(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _rate(fn, texts, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return len(texts) * repeat / (time.perf_counter() - t0)
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Pré-filtro de sinais: substring vs SignalPrefilter.")
+    ap.add_argument("--corpus", default=str(CORPUS), help="JSONL com {lang, label (1=sinal), text}")
+    ap.add_argument("--repeat", type=int, default=2000, help="passadas no corpus para medir msgs/s")
+    ap.add_argument("--min-score", type=float, default=0.6)
+    args = ap.parse_args()
+
+    rows = load_corpus(Path(args.corpus))
+    texts = [r["text"] for r in rows]
+    langs = sorted({r["lang"] for r in rows})
+    variants = [
+        ("substring (antigo)", _legacy_is_potential_signal),
+        ("prefilter pt+en", SignalPrefilter(("pt", "en"), args.min_score).is_signal),
+        ("prefilter pt+en+es", SignalPrefilter(("pt", "en", "es"), args.min_score).is_signal),
+    ]
+    n_pos = sum(1 for r in rows if r["label"])
+    print(f"corpus: {len(rows)} mensagens ({n_pos} sinais, {len(rows) - n_pos} conversas) idiomas={langs}\n")
+    print(f"{'variante':<20} {'falso +':>9} {'falso -':>9}  {'por idioma (fp/fn)':<30} {'msgs/s':>10}")
+    for name, fn in variants:
+        fp = [r for r in rows if not r["label"] and fn(r["text"])]
+        fn_ = [r for r in rows if r["label"] and not fn(r["text"])]
+        per_lang = " ".join(f"{lang}={sum(r['lang'] == lang for r in fp)}/{sum(r['lang'] == lang for r in fn_)}"
+                            for lang in langs)
+        rate = _rate(fn, texts, args.repeat)
+        print(f"{name:<20} {len(fp) / (len(rows) - n_pos):>8.0%} {len(fn_) / n_pos:>8.0%}  {per_lang:<30} {rate:>10,.0f}")
+        for r in fp:
+            print(f"    falso +: [{r['lang']}] {r['text'][:60]!r}")
+
+
+if __name__ == "__main__":
+    main_cli()
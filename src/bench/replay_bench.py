@@ -0,0 +1,196 @@
+# src/bench/replay_bench.py
+"""
+Benchmark offline do caminho quente: router (telegram_reader) -> on_signal_message (main).
+
+Não conecta no Telegram: gera eventos NewMessage sintéticos (forum e não-forum,
+com e sem reply_to) e usa um client falso que só registra forward_messages /
+send_message com latência configurável.
+
+Uso (a partir da raiz do projeto):
+    python src/bench/replay_bench.py --events 5000 --concurrency 50 --send-latency-ms 30
+
+Mede:
+  - handler: tempo de `await router(event)` (roteamento + parse + enfileirar envios)
+  - entrega: do início do evento até o forward concluir no client falso
+  - msgs/s: eventos / tempo total até todas as filas de saída esvaziarem
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# config lê o .env no import: credenciais falsas e sessão em diretório temporário
+os.environ.setdefault("TG_API_ID", "1")
+os.environ.setdefault("TG_API_HASH", "bench")
+os.environ["TG_SESSION_NAME"] = str(Path(tempfile.mkdtemp(prefix="bench-")) / "sessao")
+os.environ["GEMINI_API_KEY"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+import telegram_reader  # noqa: E402
+from outbound import OutboundScheduler  # noqa: E402
+from routing import RouteTable  # noqa: E402
+from dedup import DedupIndex  # noqa: E402
+
+
+# =============================================================================
+# Client / mensagens falsas
+# =============================================================================
+class FakeMessage:
+    def __init__(self, msg_id: int, reply_to=None, text: str = ""):
+        self.id = msg_id
+        self.reply_to = reply_to
+        self.message = text
+
+    async def edit(self, text):
+        return self
+
+
+class FakeClient:
+    """Registra as chamadas de saída; cada uma 'demora' send_latency_s."""
+    def __init__(self, send_latency_s: float):
+        self.send_latency_s = send_latency_s
+        self.calls = []
+        self.forward_done = {}    # id(msg original) -> perf_counter da entrega
+
+    async def forward_messages(self, entity, messages, from_peer):
+        await asyncio.sleep(self.send_latency_s)
+        self.calls.append(("forward", entity))
+        self.forward_done[id(messages)] = time.perf_counter()
+        return messages
+
+    async def send_message(self, entity, text):
+        await asyncio.sleep(self.send_latency_s)
+        self.calls.append(("send", entity))
+        return FakeMessage(len(self.calls), text=text)
+
+
+async def _no_orders(orders, signal_id=None):
+    return {}
+
+
+def _signal_text(i: int) -> str:
+    # preços únicos por evento para não cair no dedup
+    pm = 100 + i * 0.01
+    if i % 2:
+        return (f"🟢 LONG BTC\nEntrada: {pm - 1:.2f} - {pm + 1:.2f} (pm: {pm:.2f})\n"
+                f"TPs: {pm + 2:.2f}, {pm + 3:.2f}, {pm + 4:.2f}\nSL: {pm - 3:.2f}\nAlavancagem: 5x a 10x")
+    return (f"SHORT $ETH/USDT\nEntradas Escalonadas: {pm:.2f}-{pm + 1:.2f}\n"
+            f"TP1: {pm - 1:.2f}\nTP2: {pm - 2:.2f}\nStop Loss: {pm + 3:.2f}")
+
+
+def build_events(n: int, chats, client: FakeClient, signal_ratio: float, seed: int = 1):
+    """
+    chats: lista de (chat_id, forum: bool). Em forum, metade das msgs vem com
+    reply_to.top_msg_id (resposta dentro do tópico) e metade com reply_to.forum_topic
+    e reply_to_msg_id == top (mensagem "solta" no tópico).
+    """
+    rnd = random.Random(seed)
+    evs = []
+    for i in range(n):
+        chat_id, forum = rnd.choice(chats)
+        reply_to = None
+        if forum:
+            top = 100 + rnd.randint(1, 4)
+            if rnd.random() < 0.5:
+                reply_to = SimpleNamespace(top_msg_id=top, reply_to_msg_id=top + 1000, forum_topic=True)
+            else:
+                reply_to = SimpleNamespace(top_msg_id=None, reply_to_msg_id=top, forum_topic=True)
+        elif rnd.random() < 0.3:
+            reply_to = SimpleNamespace(top_msg_id=None, reply_to_msg_id=i, forum_topic=False)
+        text = _signal_text(i) if rnd.random() < signal_ratio else f"bom dia pessoal, mensagem {i}"
+        msg = FakeMessage(10_000 + i, reply_to, text)
+        evs.append(SimpleNamespace(chat_id=chat_id, message=msg, raw_text=text, client=client))
+    return evs
+
+
+def setup_routes(n_forum: int, n_plain: int):
+    chats, entities = [], {}
+    topic_map, target_map = {}, {}
+    for k in range(n_forum + n_plain):
+        chat_id = -1001000000000 - k
+        forum = k < n_forum
+        chats.append((chat_id, forum))
+        entities[chat_id] = SimpleNamespace(id=-chat_id, username=None, title=f"chat{k}", forum=forum)
+        topic_map[chat_id] = [1, 2, 3]
+        target_map[(chat_id, None)] = -4000000000 - (k % 8)
+    table = RouteTable(target_map=target_map, topic_map=topic_map, default_target="me")
+    for chat_id, forum in chats:
+        tops = {100 + t: (t, f"topic{t}") for t in range(1, 5)} if forum else {}
+        table.compile_chat(chat_id, None, tops)
+        telegram_reader.entity_cache.put(entities[chat_id], chat_id=chat_id)
+    return chats, table
+
+
+# =============================================================================
+# Execução
+# =============================================================================
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+async def run(args):
+    chats, table = setup_routes(args.forum_chats, args.plain_chats)
+    telegram_reader.route_table = table
+    main.outbound = OutboundScheduler(args.rate, args.burst)
+    main.dedup = DedupIndex()
+    main.bybit.place_orders = _no_orders  # envio de ordens fora da medição
+
+    client = FakeClient(args.send_latency_ms / 1000.0)
+    events = build_events(args.events, chats, client, args.signal_ratio)
+    router = telegram_reader.build_router(main.on_signal_message, {c for c, _ in chats})
+
+    sem = asyncio.Semaphore(args.concurrency)
+    handler_lat, started = [], {}
+
+    async def one(ev):
+        async with sem:
+            t0 = time.perf_counter()
+            started[id(ev.message)] = t0
+            await router(ev)
+            handler_lat.append(time.perf_counter() - t0)
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(one(ev) for ev in events))
+    # espera as filas de saída esvaziarem
+    while any(main.outbound.queue_depth().values()):
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(args.send_latency_ms / 1000.0 + 0.01)
+    total = time.perf_counter() - t_start
+
+    delivery = [client.forward_done[k] - started[k] for k in client.forward_done]
+    ms = lambda x: f"{x * 1000:.2f}ms"
+    print(f"eventos={len(events)} concorrência={args.concurrency} latência_envio={args.send_latency_ms}ms "
+          f"chats={args.forum_chats} forum + {args.plain_chats} normais")
+    print(f"handler  p50={ms(_pct(handler_lat, 50))} p95={ms(_pct(handler_lat, 95))} p99={ms(_pct(handler_lat, 99))}")
+    print(f"entrega  p50={ms(_pct(delivery, 50))} p95={ms(_pct(delivery, 95))} p99={ms(_pct(delivery, 99))} "
+          f"(forwards={len(delivery)})")
+    print(f"throughput {len(events) / total:,.0f} msgs/s | chamadas de saída={len(client.calls)} | total={total:.2f}s")
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Replay sintético do router + on_signal_message (offline).")
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--send-latency-ms", type=float, default=20.0)
+    ap.add_argument("--signal-ratio", type=float, default=0.3)
+    ap.add_argument("--forum-chats", type=int, default=5)
+    ap.add_argument("--plain-chats", type=int, default=5)
+    ap.add_argument("--rate", type=float, default=1000.0, help="token bucket por destino (envios/s)")
+    ap.add_argument("--burst", type=int, default=1000)
+    args = ap.parse_args()
+    logging.disable(logging.INFO)  # logs por mensagem distorcem a medição
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
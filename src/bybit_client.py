@@ -1,15 +1,307 @@
-from typing import List
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from yarl import URL
+
 from models import Order
+from metrics import metrics
+
+log = logging.getLogger("bybit")
+
+MAINNET_URL = "https://api.bybit.com"
+TESTNET_URL = "https://api-testnet.bybit.com"
+MAINNET_WS_PRIVATE = "wss://stream.bybit.com/v5/private"
+TESTNET_WS_PRIVATE = "wss://stream-testnet.bybit.com/v5/private"
+
+_BATCH_MAX = 10                     # create-batch (linear): até 10 ordens por request
+_DUPLICATE = 110072                 # orderLinkId já existe -> a ordem JÁ foi criada (retry idempotente)
+_RATE_LIMITED = 10006               # too many visits
+_RETRY_CODES = {_RATE_LIMITED, 10016, 10019}   # limite / erro interno / serviço reiniciando
+
+
+def _fmt(x: float) -> str:
+    """Número -> string decimal sem notação científica nem zeros à direita (formato da API)."""
+    s = f"{x:.10f}".rstrip("0").rstrip(".")
+    return s or "0"
+
+
+def order_link_id(signal_id: str, tag: str) -> str:
+    """Id idempotente da ordem (máx. 36 chars): mesmo sinal + mesma perna -> mesmo id."""
+    return f"{signal_id[:28]}-{tag}"[:36]
+
+
+def split_link_id(link_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """Inverso de order_link_id: 'abc123-TP1' -> ('abc123', 'TP1'); ids de fora -> (None, None)."""
+    signal_id, sep, tag = (link_id or "").rpartition("-")
+    return (signal_id, tag) if sep and signal_id else (None, None)
+
 
 class BybitClient:
-    def __init__(self, api_key: str | None = None, api_secret: str | None = None, testnet: bool = True):
+    """
+    Execução assíncrona na API v5 da Bybit:
+      - requests assinadas (HMAC-SHA256), UMA aiohttp.ClientSession com pool keep-alive;
+      - create-batch: o plano de um sinal em 1 round trip (até 10 ordens por batch), com TPs/SL
+        presos às pernas de entrada (ver _plan_params);
+      - acompanha X-Bapi-Limit-Status / Reset por endpoint e espera o reset quando zera;
+      - retry com o MESMO orderLinkId (duplicado = já criado), só nas pernas que falharam.
+    Sem api_key/api_secret roda em modo mock (só imprime o plano, como antes).
+    """
+    def __init__(self, api_key: str | None = None, api_secret: str | None = None, testnet: bool = True,
+                 base_url: str | None = None, category: str = "linear", recv_window: int = 5000,
+                 max_retries: int = 3, pool_size: int = 20, timeout_s: float = 10.0,
+                 ws_private_url: str | None = None, settle_coin: str = "USDT"):
         self.api_key = api_key
         self.api_secret = api_secret
         self.testnet = testnet
-        # TODO: inicializar SDK oficial quando for ligar de verdade
+        self.base_url = (base_url or (TESTNET_URL if testnet else MAINNET_URL)).rstrip("/")
+        self.ws_private_url = ws_private_url or (TESTNET_WS_PRIVATE if testnet else MAINNET_WS_PRIVATE)
+        self.settle_coin = settle_coin
+        self.category = category
+        self.recv_window = recv_window
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.timeout_s = timeout_s
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._limits: Dict[str, Tuple[int, float]] = {}   # path -> (restantes, reset_em epoch s)
+        self.stats: Dict[str, int] = {"requests": 0, "orders_ok": 0, "orders_failed": 0,
+                                      "retries": 0, "duplicates": 0, "rate_limited": 0}
+
+    @property
+    def live(self) -> bool:
+        return bool(self.api_key and self.api_secret)
+
+    # ---------------- HTTP ----------------
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _sign(self, timestamp: str, payload: str) -> str:
+        msg = f"{timestamp}{self.api_key}{self.recv_window}{payload}"
+        return hmac.new(self.api_secret.encode(), msg.encode(), hashlib.sha256).hexdigest()
+
+    def _track_limits(self, path: str, headers) -> None:
+        status = headers.get("X-Bapi-Limit-Status")
+        reset = headers.get("X-Bapi-Limit-Reset-Timestamp")
+        if status is not None and reset is not None:
+            self._limits[path] = (int(status), int(reset) / 1000.0)
+
+    async def _wait_limit(self, path: str) -> None:
+        remaining, reset_at = self._limits.get(path, (1, 0.0))
+        wait = reset_at - time.time()
+        if remaining <= 0 and wait > 0:
+            self.stats["rate_limited"] += 1
+            log.warning(f"[bybit] limite de {path} esgotado; aguardando {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    async def _request(self, method: str, path: str, params: Optional[dict] = None, auth: bool = True) -> dict:
+        """
+        Request assinada (auth=False para endpoints públicos de mercado, funciona sem API key);
+        erros de rede/5xx sobem como exceção (o chamador decide o retry).
+        """
+        await self._wait_limit(path)
+        timestamp = str(int(time.time() * 1000))
+        if method == "GET":
+            payload = "&".join(f"{k}={v}" for k, v in (params or {}).items())
+            # a query assinada tem que ir byte a byte (cursor já vem url-encoded da API)
+            url, body = URL(f"{self.base_url}{path}" + (f"?{payload}" if payload else ""), encoded=True), None
+        else:
+            payload = json.dumps(params or {}, separators=(",", ":"))
+            url, body = f"{self.base_url}{path}", payload
+        headers = {"Content-Type": "application/json"}
+        if auth:
+            headers.update({
+                "X-BAPI-API-KEY": self.api_key,
+                "X-BAPI-TIMESTAMP": timestamp,
+                "X-BAPI-RECV-WINDOW": str(self.recv_window),
+                "X-BAPI-SIGN": self._sign(timestamp, payload),
+            })
+        self.stats["requests"] += 1
+        with metrics.timer("bybit_request"):
+            async with self._get_session().request(method, url, data=body, headers=headers) as resp:
+                self._track_limits(path, resp.headers)
+                if resp.status >= 500:
+                    raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                return await resp.json(content_type=None)
+
+    def ws_auth_args(self, ttl_s: float = 10.0) -> list:
+        """args do {"op": "auth"} do WebSocket privado: [api_key, expires_ms, assinatura]."""
+        expires = int((time.time() + ttl_s) * 1000)
+        sign = hmac.new(self.api_secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
+        return [self.api_key, expires, sign]
+
+    async def fetch_list(self, path: str, params: Optional[dict] = None, max_pages: int = 20,
+                         limit: int = 50, auth: bool = True) -> List[dict]:
+        """GET paginado (nextPageCursor) de endpoints que retornam result.list."""
+        rows: List[dict] = []
+        params = dict(params or {}, category=self.category, limit=limit)
+        for _ in range(max_pages):
+            resp = await self._request("GET", path, params, auth=auth)
+            if resp.get("retCode") != 0:
+                raise RuntimeError(f"{path} retCode={resp.get('retCode')} {resp.get('retMsg')}")
+            result = resp.get("result") or {}
+            rows.extend(result.get("list") or [])
+            cursor = result.get("nextPageCursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+        return rows
+
+    # ---------------- ordens ----------------
+
+    def _order_params(self, o: Order, link_id: str) -> dict:
+        p = {
+            "symbol": o.symbol,
+            "side": o.side,
+            "qty": _fmt(o.qty),
+            "orderLinkId": link_id,
+            "reduceOnly": o.reduce_only,
+        }
+        if o.type == "STOP":
+            # stop a mercado: dispara quando o preço cruza o SL (Sell -> caindo, Buy -> subindo)
+            p.update(orderType="Market", triggerPrice=_fmt(o.price),
+                     triggerDirection=2 if o.side == "Sell" else 1, triggerBy="MarkPrice")
+        elif o.type == "MARKET":
+            p["orderType"] = "Market"
+        else:
+            p.update(orderType="Limit", price=_fmt(o.price), timeInForce="PostOnly" if o.post_only else "GTC")
+        return p
+
+    def _plan_params(self, orders: List[Order], signal_id: str) -> List[dict]:
+        """
+        Plano (ENTRY, TP1..TPn, SL) -> requests do create-batch.
+        Perna reduce-only sem posição aberta é recusada pela Bybit (110017), e no create-batch a
+        entrada ainda não executou. Então TPs e SL não vão como ordens soltas: a entrada é dividida
+        em uma perna por TP (ENTRY1..ENTRYn, com a qty do TP) e cada perna leva o seu takeProfit e o
+        stopLoss do sinal (tpslMode=Partial: TP/SL do tamanho da perna, ativos quando ela executa).
+        Sobra de qty (alocação dos TPs < 100%) vira a perna ENTRY, só com o SL.
+        """
+        entry = next((o for o in orders if not o.reduce_only), None)
+        if entry is None or not entry.qty or entry.qty <= 0:
+            if orders:
+                log.warning(f"[bybit] sinal {signal_id} sem entrada com qty > 0: plano ignorado")
+            return []
+        sl = next((o for o in orders if o.reduce_only and o.type == "STOP"), None)
+        tps = [o for o in orders if o.reduce_only and o.type != "STOP" and o.qty and o.qty > 0]
+
+        legs: List[Tuple[str, float, Optional[Order]]] = []
+        left = entry.qty
+        for tp in tps:
+            qty = min(tp.qty, left)
+            if qty <= entry.qty * 1e-9:
+                break
+            legs.append((entry.tag + tp.tag[2:], qty, tp))
+            left -= qty
+        if left > entry.qty * 1e-9:
+            legs.append((entry.tag, left, None))
+
+        items = []
+        for tag, qty, tp in legs:
+            p = self._order_params(entry, order_link_id(signal_id, tag))
+            p["qty"] = _fmt(qty)
+            if tp is not None or sl is not None:
+                p["tpslMode"] = "Partial"
+            if tp is not None:
+                # TP limit (maker) no preço do TP, disparado pelo último preço
+                p.update(takeProfit=_fmt(tp.price), tpTriggerBy="LastPrice",
+                         tpOrderType="Limit", tpLimitPrice=_fmt(tp.price))
+            if sl is not None:
+                p.update(stopLoss=_fmt(sl.price), slTriggerBy="MarkPrice", slOrderType="Market")
+            items.append(p)
+        return items
+
+    async def _place_batch(self, items: List[dict]) -> Dict[str, dict]:
+        """
+        Envia um batch com retry. Retorna orderLinkId -> {ok, orderId, code, msg}.
+        Só as pernas com erro transitório são reenviadas (mesmo orderLinkId).
+        """
+        results: Dict[str, dict] = {}
+        pending = items
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(0.2 * 2 ** attempt, 5.0))
+            try:
+                resp = await self._request("POST", "/v5/order/create-batch",
+                                           {"category": self.category, "request": pending})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                log.warning(f"[bybit] create-batch falhou (tentativa {attempt + 1}): {e}")
+                continue
+
+            if resp.get("retCode") != 0:
+                code = resp.get("retCode")
+                log.warning(f"[bybit] create-batch retCode={code} {resp.get('retMsg')}")
+                if code in _RETRY_CODES:
+                    continue
+                for p in pending:
+                    results[p["orderLinkId"]] = {"ok": False, "orderId": None, "code": code, "msg": resp.get("retMsg")}
+                return results
+
+            rows = (resp.get("result") or {}).get("list") or []
+            infos = (resp.get("retExtInfo") or {}).get("list") or []
+            retry = []
+            for i, p in enumerate(pending):
+                row = rows[i] if i < len(rows) else {}
+                info = infos[i] if i < len(infos) else {"code": 10016, "msg": "sem retorno para a perna"}
+                link, code = p["orderLinkId"], info.get("code", 0)
+                if code == 0 or code == _DUPLICATE:
+                    if code == _DUPLICATE:
+                        self.stats["duplicates"] += 1
+                    results[link] = {"ok": True, "orderId": row.get("orderId") or None, "code": code, "msg": info.get("msg")}
+                elif code in _RETRY_CODES:
+                    retry.append(p)
+                else:
+                    results[link] = {"ok": False, "orderId": None, "code": code, "msg": info.get("msg")}
+            pending = retry
+            if not pending:
+                return results
+
+        for p in pending:
+            results[p["orderLinkId"]] = {"ok": False, "orderId": None, "code": None, "msg": "retries esgotados"}
+        return results
+
+    async def place_orders(self, orders: List[Order], signal_id: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Coloca o plano de um sinal (entradas com TP/SL presos, ver _plan_params). signal_id gera os
+        orderLinkIds (reenviar o mesmo sinal não duplica). Retorna orderLinkId -> resultado ({} no modo mock).
+        """
+        if not self.live:
+            print("=== [BybitClient] ORDERS (mock) ===")
+            for o in orders:
+                print(o)
+            return {}
+
+        signal_id = signal_id or uuid.uuid4().hex[:16]
+        items = self._plan_params(orders, signal_id)
+
+        t0 = time.perf_counter()
+        batches = [items[i:i + _BATCH_MAX] for i in range(0, len(items), _BATCH_MAX)]
+        results: Dict[str, dict] = {}
+        for part in await asyncio.gather(*(self._place_batch(b) for b in batches)):
+            results.update(part)
+        metrics.observe("bybit_place_signal", time.perf_counter() - t0)
 
-    def place_orders(self, orders: List[Order]) -> None:
-        # TODO: implementar integração real (REST/WebSocket) com flags reduce-only, post-only etc.
-        print("=== [BybitClient] ORDERS (mock) ===")
-        for o in orders:
-            print(o)
+        ok = sum(1 for r in results.values() if r["ok"])
+        self.stats["orders_ok"] += ok
+        self.stats["orders_failed"] += len(results) - ok
+        for link, r in results.items():
+            if not r["ok"]:
+                log.error(f"[bybit] ordem {link} rejeitada: code={r['code']} {r['msg']}")
+        log.info(f"[bybit] sinal {signal_id}: {ok}/{len(results)} ordens aceitas em {len(batches)} batch(es) "
+                 f"({1000 * (time.perf_counter() - t0):.0f}ms)")
+        return results
@@ -1,124 +1,256 @@
 import os
 import json
-from dotenv import load_dotenv
+from dotenv import dotenv_values, find_dotenv, load_dotenv
 
-load_dotenv()
+# === Roteamento (sources, tópicos, destinos) ===
+# Chaves que o hot reload (routing_reload.py) relê do disco sem reiniciar o bot.
+ROUTING_KEYS = ("SOURCE_CHAT", "SOURCE_CHATS", "TOPIC_MAP", "TOPIC_ID", "TARGET_CHAT", "TARGET_MAP", "NOTIFY_ONLY")
+# o que veio do ambiente do processo (não do .env) continua valendo por cima do arquivo, também no reload
+_PROCESS_ROUTING_ENV = {k: os.environ[k] for k in ROUTING_KEYS if k in os.environ}
+
+ENV_FILE = find_dotenv()
+load_dotenv(ENV_FILE)
+
+# Arquivo extra (formato .env) só com o roteamento; relativo à raiz do projeto. Vazio: só o .env.
+# Observado a cada ROUTING_RELOAD_S (0 desliga): mudou -> valida -> troca a RouteTable no ar.
+_raw_routing_file = os.getenv("ROUTING_FILE", "").strip()
+ROUTING_FILE = (_raw_routing_file if os.path.isabs(_raw_routing_file) else
+                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), _raw_routing_file)
+                ) if _raw_routing_file else None
+ROUTING_RELOAD_S = float(os.getenv("ROUTING_RELOAD_S", "2"))
+
+
+def _chat_ref(raw: str):
+    """id numérico -> int; @username -> username sem @ (minúsculo)."""
+    return int(raw) if raw.lstrip("-").isdigit() else raw.lstrip("@").lower()
+
+
+def _topic_key(key: str, strict: bool, what: str):
+    """"chat" -> (chat, None); "chat|topic" -> (chat, topic); topic inválido -> None (ou erro no strict)."""
+    if "|" not in key:
+        return _chat_ref(key), None
+    chat_key, topic_key = key.split("|", 1)
+    try:
+        return _chat_ref(chat_key), int(topic_key)
+    except ValueError:
+        if strict:
+            raise ValueError(f"{what}: tópico inválido em '{key}'")
+        return None
+
+
+def parse_routing(env, strict: bool = False) -> dict:
+    """
+    Lê as chaves de roteamento de um mapeamento (os.environ ou o .env relido).
+    strict=False (boot): o comportamento de sempre, valor inválido é ignorado.
+    strict=True (hot reload): qualquer valor inválido levanta ValueError (a config nova é recusada).
+
+      TARGET_MAP (JSON) com regras por chat e opcionalmente por tópico (chave -> destino):
+        "-1002427024288": "@destino"                 (por chat)
+        "-1002427024288|4": "-4986598952"            (por chat + tópico)
+        "@canal": "@destino"                         (por username do chat)
+      NOTIFY_ONLY: chaves ("chat" ou "chat|topic") que apenas notificam:
+        NOTIFY_ONLY=["-1002427024288|4","@canal|10"]
+        NOTIFY_ONLY="-1002427024288|4,@canal|10" (string separada por vírgulas)
+    """
+    out = {}
+
+    raw_source = (env.get("SOURCE_CHAT") or "").strip()
+    if raw_source:
+        out["SOURCE_CHAT"] = int(raw_source) if raw_source.lstrip("-").isdigit() else raw_source.lstrip("@")
+    else:
+        out["SOURCE_CHAT"] = None
+    out["SOURCE_CHATS"] = env.get("SOURCE_CHATS")
+
+    raw_topic_map = (env.get("TOPIC_MAP") or "").strip()
+    topic_map = None
+    if raw_topic_map:
+        try:
+            topic_map = json.loads(raw_topic_map)
+            if strict:
+                if not isinstance(topic_map, dict):
+                    raise ValueError("TOPIC_MAP: esperado objeto JSON {chat: [tópicos]}")
+                for k, v in topic_map.items():
+                    if not isinstance(v, list) or not all(str(t).isdigit() for t in v):
+                        raise ValueError(f"TOPIC_MAP: '{k}' deve ser uma lista de ids de tópico")
+        except ValueError:
+            if strict:
+                raise
+            topic_map = None  # JSON inválido -> ignora e usa TOPIC_ID
+    out["TOPIC_MAP"] = topic_map
+    raw_tid = (env.get("TOPIC_ID") or "").strip()
+    if strict and raw_tid and not raw_tid.lstrip("-").isdigit():
+        raise ValueError(f"TOPIC_ID inválido: '{raw_tid}'")
+    out["TOPIC_ID"] = int(raw_tid) if not topic_map and raw_tid and raw_tid.lstrip("-").isdigit() else None
+
+    raw_target = (env.get("TARGET_CHAT") or "me").strip()
+    out["TARGET_CHAT"] = int(raw_target) if raw_target.lstrip("-").isdigit() else raw_target.lstrip("@")
+
+    raw_tmap = (env.get("TARGET_MAP") or "").strip()
+    target_map = {}
+    if raw_tmap:
+        try:
+            raw = json.loads(raw_tmap)
+            if not isinstance(raw, dict):
+                raise ValueError("TARGET_MAP: esperado objeto JSON {chave: destino}")
+            for k, v in raw.items():
+                key = _topic_key(str(k).strip(), strict, "TARGET_MAP")
+                if key is None:
+                    continue
+                # normaliza destino: int se numérico, senão username sem @
+                v_norm = str(v).strip()
+                if strict and not v_norm:
+                    raise ValueError(f"TARGET_MAP: destino vazio para '{k}'")
+                target_map[key] = int(v_norm) if v_norm.lstrip("-").isdigit() else v_norm.lstrip("@")
+        except ValueError:
+            if strict:
+                raise
+            target_map = {}
+    out["TARGET_MAP"] = target_map
+
+    raw_notify = (env.get("NOTIFY_ONLY") or "").strip()
+    notify_only = set()
+    if raw_notify:
+        try:
+            parsed = json.loads(raw_notify)
+            if isinstance(parsed, dict):
+                keys = list(parsed.keys())
+            elif isinstance(parsed, list):
+                keys = [str(x) for x in parsed]
+            else:
+                keys = []
+        except Exception:
+            # tenta como string separada por vírgulas
+            keys = [k.strip() for k in raw_notify.split(",") if k.strip()]
+        for k in keys:
+            key = _topic_key(str(k), strict, "NOTIFY_ONLY")
+            if key is not None:
+                notify_only.add(key)
+    out["NOTIFY_ONLY"] = notify_only
+    return out
+
+
+def read_routing_env() -> dict:
+    """Chaves de roteamento relidas do disco (.env, depois ROUTING_FILE); o ambiente do processo prevalece."""
+    values = {}
+    for path in (ENV_FILE, ROUTING_FILE):
+        if path and os.path.exists(path):
+            values.update({k: v for k, v in dotenv_values(path).items() if k in ROUTING_KEYS and v is not None})
+    values.update(_PROCESS_ROUTING_ENV)
+    return values
+
+
+_routing = parse_routing(read_routing_env() if ROUTING_FILE else os.environ)
 
 # === Telegram ===
+
 TG_API_ID = int(os.getenv("TG_API_ID", "0"))
 TG_API_HASH = os.getenv("TG_API_HASH", "")
 TG_SESSION_NAME = os.getenv("TG_SESSION_NAME", "sessao")
 
-# SOURCE_CHAT (único) ou SOURCE_CHATS (lista separada por vírgula, ex: "-1001,@canal")
-_raw_source = os.getenv("SOURCE_CHAT", "").strip()
-if _raw_source:
-    if _raw_source.lstrip("-").isdigit():
-        SOURCE_CHAT = int(_raw_source)
-    else:
-        SOURCE_CHAT = _raw_source.lstrip("@")
-else:
-    SOURCE_CHAT = None
+# SOURCE_CHAT (único) ou SOURCE_CHATS (lista separada por vírgula, ex: "-1001,@canal");
+# SOURCE_CHATS fica bruto, os helpers normalizam (ids -> int, @user -> str sem @)
+SOURCE_CHAT = _routing["SOURCE_CHAT"]
+SOURCE_CHATS = _routing["SOURCE_CHATS"]
 
-# Lista bruta; os helpers normalizam (ids -> int, @user -> str sem @)
-SOURCE_CHATS = os.getenv("SOURCE_CHATS")  # ex: "-1001,@canal"
+# Máximo de entities (chats) em cache no router
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "256"))
 
 # --- Tópicos: TOPIC_ID (único) OU TOPIC_MAP (JSON) ---
 # Exemplo TOPIC_MAP no .env: {"-1002427024288":[4,14,31]}
-_raw_topic_map = os.getenv("TOPIC_MAP", "").strip()
-TOPIC_MAP = None
-if _raw_topic_map:
-    try:
-        TOPIC_MAP = json.loads(_raw_topic_map)
-    except Exception:
-        TOPIC_MAP = None  # JSON inválido -> ignora e usa TOPIC_ID
-
 # TOPIC_ID só faz sentido se NÃO houver TOPIC_MAP
-_raw_tid = os.getenv("TOPIC_ID", "").strip()
-if TOPIC_MAP:
-    TOPIC_ID = None
-else:
-    if _raw_tid and _raw_tid.lstrip("-").isdigit():
-        TOPIC_ID = int(_raw_tid)
-    else:
-        TOPIC_ID = None
+TOPIC_MAP = _routing["TOPIC_MAP"]
+TOPIC_ID = _routing["TOPIC_ID"]
+
+# Refresh delta dos tópicos de fórum: intervalo (s; 0 desliga) e tamanho da página
+TOPIC_REFRESH_S = float(os.getenv("TOPIC_REFRESH_S", "300"))
+TOPIC_REFRESH_LIMIT = int(os.getenv("TOPIC_REFRESH_LIMIT", "50"))
+
+# Cache de tópicos: máx. de fóruns em memória (LRU) e TTL do cache negativo (ids que não são tópico)
+TOPIC_CACHE_CHATS = int(os.getenv("TOPIC_CACHE_CHATS", "256"))
+TOPIC_NEGATIVE_TTL_S = float(os.getenv("TOPIC_NEGATIVE_TTL_S", "300"))
+
+# Prewarm: quantos sources resolver/pré-carregar em paralelo no boot
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "8"))
+
+# Snapshot (warm start) de sources/entities/tópicos; relativo à raiz do projeto, vazio desliga
+TOPIC_SNAPSHOT_FILE = os.getenv("TOPIC_SNAPSHOT_FILE", "topics_snapshot.json").strip() or None
+
+# Exportador de histórico (exporter.py): store local (relativo à raiz do projeto),
+# quantos chats/tópicos exportar em paralelo e mensagens por bloco gravado
+EXPORT_DIR = os.getenv("EXPORT_DIR", "export").strip() or "export"
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "500"))
 
 # --- Destinos ---
-# Fallback global (id numérico, @username ou "me")
-_raw_target = os.getenv("TARGET_CHAT", "me").strip()
-if _raw_target.lstrip("-").isdigit():
-    TARGET_CHAT = int(_raw_target)
-else:
-    TARGET_CHAT = _raw_target.lstrip("@")  # "me" ou username sem @
-
-# TARGET_MAP (JSON) com regras por chat e opcionalmente por tópico
-# Formatos aceitos (chave -> destino):
-#  "-1002427024288": "@destino"                 (por chat)
-#  "-1002427024288|4": "-4986598952"            (por chat + tópico)
-#  "@canal": "@destino"                         (por username do chat)
-_raw_tmap = os.getenv("TARGET_MAP", "").strip()
-TARGET_MAP = {}
-if _raw_tmap:
-    try:
-        raw = json.loads(_raw_tmap)
-        for k, v in raw.items():
-            key = str(k).strip()
-            # normaliza destino: int se numérico, senão username sem @
-            v_norm = str(v).strip()
-            v_norm = int(v_norm) if v_norm.lstrip("-").isdigit() else v_norm.lstrip("@")
-
-            if "|" in key:
-                chat_key, topic_key = key.split("|", 1)
-                ck = int(chat_key) if chat_key.lstrip("-").isdigit() else chat_key.lstrip("@").lower()
-                try:
-                    tk = int(topic_key)
-                except Exception:
-                    continue
-                TARGET_MAP[(ck, tk)] = v_norm
-            else:
-                ck = int(key) if key.lstrip("-").isdigit() else key.lstrip("@").lower()
-                TARGET_MAP[(ck, None)] = v_norm
-    except Exception:
-        TARGET_MAP = {}
-
-# NOTIFY_ONLY: lista de chaves ("chat" ou "chat|topic") para apenas notificar
-# Exemplos válidos no .env:
-#  NOTIFY_ONLY=["-1002427024288|4","@canal|10"]
-#  NOTIFY_ONLY="-1002427024288|4,@canal|10" (string separada por vírgulas)
-_raw_notify = os.getenv("NOTIFY_ONLY", "").strip()
-NOTIFY_ONLY = set()
-if _raw_notify:
-    try:
-        parsed = json.loads(_raw_notify)
-        if isinstance(parsed, dict):
-            keys = list(parsed.keys())
-        elif isinstance(parsed, list):
-            keys = [str(x) for x in parsed]
-        else:
-            keys = []
-    except Exception:
-        # tenta como string separada por vírgulas
-        keys = [k.strip() for k in _raw_notify.split(",") if k.strip()]
-
-    for key in keys:
-        k = str(key)
-        if "|" in k:
-            chat_key, topic_key = k.split("|", 1)
-            ck = int(chat_key) if chat_key.lstrip("-").isdigit() else chat_key.lstrip("@").lower()
-            try:
-                tk = int(topic_key)
-            except Exception:
-                continue
-            NOTIFY_ONLY.add((ck, tk))
-        else:
-            ck = int(k) if k.lstrip("-").isdigit() else k.lstrip("@").lower()
-            NOTIFY_ONLY.add((ck, None))
+# TARGET_CHAT: fallback global (id numérico, @username ou "me")
+# TARGET_MAP / NOTIFY_ONLY: formatos em parse_routing() acima
+TARGET_CHAT = _routing["TARGET_CHAT"]
+TARGET_MAP = _routing["TARGET_MAP"]
+NOTIFY_ONLY = _routing["NOTIFY_ONLY"]
+
+# --- Envio para os destinos (por chat de destino) ---
+# Token bucket: envios/segundo e rajada máxima; tentativas extras em erros transitórios
+OUTBOUND_RATE_PER_S = float(os.getenv("OUTBOUND_RATE_PER_S", "1.0"))
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", "3"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# --- Dedup de sinais repostados entre sources ---
+# DEDUP_MODE: "suppress" (descarta), "annotate" (encaminha com aviso, sem ordens) ou "off"
+DEDUP_MODE = os.getenv("DEDUP_MODE", "annotate").strip().lower()
+DEDUP_WINDOW_S = float(os.getenv("DEDUP_WINDOW_S", "600"))
+DEDUP_MAX_ITEMS = int(os.getenv("DEDUP_MAX_ITEMS", "10000"))
+
+# Journal de sinais (mensagem -> plano -> resultado), para retomar depois de uma queda.
+# Relativo à raiz do projeto; vazio desliga. fsync em lote a cada JOURNAL_FSYNC_MS;
+# planos em voo mais velhos que JOURNAL_REPLAY_MAX_AGE_S não são reenviados no restart.
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "signal_journal.bin").strip() or None
+JOURNAL_FSYNC_MS = float(os.getenv("JOURNAL_FSYNC_MS", "50"))
+JOURNAL_REPLAY_MAX_AGE_S = float(os.getenv("JOURNAL_REPLAY_MAX_AGE_S", "300"))
+JOURNAL_MAX_MB = float(os.getenv("JOURNAL_MAX_MB", "64"))
+
+# --- Pré-filtro de sinais ---
+# Idiomas das palavras-chave (pt, en, es) e score mínimo (0..1) para tratar como sinal
+SIGNAL_LANGS = [x.strip().lower() for x in os.getenv("SIGNAL_LANGS", "pt,en").split(",") if x.strip()]
+SIGNAL_MIN_SCORE = float(os.getenv("SIGNAL_MIN_SCORE", "0.6"))
+
+# --- Métricas (formato Prometheus em http://HOST:PORT/metrics); porta 0 desliga ---
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
 # === Gemini ===
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "15"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+# Cache das notas (LRU + TTL); GEMINI_CACHE_FILE vazio = só em memória (ex.: gemini_cache.json, já no .gitignore)
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "512"))
+GEMINI_CACHE_TTL_S = float(os.getenv("GEMINI_CACHE_TTL_S", "3600"))
+GEMINI_CACHE_FILE = os.getenv("GEMINI_CACHE_FILE", "").strip() or None
+GEMINI_CACHE_FLUSH_S = float(os.getenv("GEMINI_CACHE_FLUSH_S", "5"))   # intervalo mínimo entre gravações do arquivo
+
+# === Trading / Bybit ===
+# Sem API key/secret o BybitClient roda em modo mock (só imprime o plano)
+BYBIT_API_KEY = os.getenv("BYBIT_API_KEY", "").strip() or None
+BYBIT_API_SECRET = os.getenv("BYBIT_API_SECRET", "").strip() or None
+BYBIT_TESTNET = os.getenv("BYBIT_TESTNET", "true").strip().lower() in ("1", "true", "yes")
+BYBIT_BASE_URL = os.getenv("BYBIT_BASE_URL", "").strip() or None   # ex.: stand-in local
+BYBIT_RECV_WINDOW = int(os.getenv("BYBIT_RECV_WINDOW", "5000"))
+BYBIT_MAX_RETRIES = int(os.getenv("BYBIT_MAX_RETRIES", "3"))
+BYBIT_WS_URL = os.getenv("BYBIT_WS_URL", "").strip() or None       # WebSocket privado (padrão: testnet/mainnet)
+BYBIT_SETTLE_COIN = os.getenv("BYBIT_SETTLE_COIN", "USDT").strip()
+# Copy-trading: JSON com as subcontas (account_id, api_key, api_secret, balance_usdt, risk_pct, profile).
+# Vazio desliga; cada sinal vai para todas ao mesmo tempo, além da conta principal.
+BYBIT_ACCOUNTS_FILE = os.getenv("BYBIT_ACCOUNTS_FILE", "").strip() or None
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "64"))
+FANOUT_ACCOUNT_TIMEOUT_S = float(os.getenv("FANOUT_ACCOUNT_TIMEOUT_S", "15"))
+# Livro de ordens/posições alimentado pelo WebSocket privado (só com API key)
+BYBIT_ORDER_STREAM = os.getenv("BYBIT_ORDER_STREAM", "true").strip().lower() in ("1", "true", "yes")
 
-# === Trading / Bybit (stub) ===
 SYMBOL_SUFFIX = os.getenv("SYMBOL_SUFFIX", "USDT")
+# Tick size / qty step / limites por símbolo (instruments-info): cache em disco + refresh em background.
+# PRICE/QTY_PRECISION abaixo só valem para símbolo sem metadata. TTL 0 desliga o refresh.
+INSTRUMENTS_FILE = os.getenv("INSTRUMENTS_FILE", "instruments_cache.json").strip() or None
+INSTRUMENTS_TTL_S = float(os.getenv("INSTRUMENTS_TTL_S", "3600"))
 PRICE_PRECISION = int(os.getenv("PRICE_PRECISION", "2"))
 QTY_PRECISION = int(os.getenv("QTY_PRECISION", "4"))
 DEFAULT_RISK_PCT = float(os.getenv("DEFAULT_RISK_PCT", "0.01"))
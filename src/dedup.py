@@ -0,0 +1,67 @@
+# dedup.py
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from models import TradeSignal
+
+_NORM_RE = re.compile(r"[^0-9a-z.,]+")
+
+
+def _r(x: float, digits: int = 5) -> float:
+    """Arredonda para N dígitos significativos (0.02701 ~ 0.027010, 61000.4 ~ 61000)."""
+    return float(f"{x:.{digits}g}")
+
+
+def signal_fingerprint(signal: TradeSignal) -> Tuple:
+    return (
+        "S", signal.side.upper(), signal.symbol.upper(),
+        _r(signal.entry_low), _r(signal.entry_high), _r(signal.sl),
+        tuple(_r(tp) for tp in signal.tps),
+    )
+
+
+def text_fingerprint(text: str) -> Tuple:
+    """Fallback quando o parse falha: hash do texto sem caixa/emojis/pontuação."""
+    norm = _NORM_RE.sub(" ", (text or "").lower()).strip()
+    return ("T", hashlib.sha1(norm.encode("utf-8")).digest()[:12])
+
+
+class DedupIndex:
+    """
+    Índice de fingerprints com janela de tempo e tamanho máximo.
+    OrderedDict em ordem de chegada: expira/evicta sempre pela frente -> O(1) amortizado.
+    """
+    def __init__(self, window_s: float = 600.0, max_items: int = 10000):
+        self.window_s = window_s
+        self.max_items = max_items
+        self._items: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()  # fp -> (visto_em, origem)
+        self.stats = {"unique": 0, "duplicates": 0}
+
+    def _expire(self, now: float) -> None:
+        items = self._items
+        while items:
+            fp, (seen_at, _) = next(iter(items.items()))
+            if now - seen_at <= self.window_s and len(items) < self.max_items:
+                break
+            items.popitem(last=False)
+
+    def check(self, fp: Tuple, origin: str) -> Optional[Tuple[float, str]]:
+        """
+        Registra fp. Se já foi visto dentro da janela, retorna (idade_s, origem_original);
+        senão retorna None.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        hit = self._items.get(fp)
+        if hit is not None:
+            self.stats["duplicates"] += 1
+            return now - hit[0], hit[1]
+        self._items[fp] = (now, origin)
+        self.stats["unique"] += 1
+        return None
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,164 @@
+# exporter.py
+"""
+Exportador de histórico: baixa as mensagens dos SOURCE_CHATS (e dos tópicos do TOPIC_MAP)
+para o store local (message_store.py), usando a MESMA sessão do bot.
+
+  - cada source com tópicos no TOPIC_MAP é exportado por tópico (stream = topic_id);
+    os demais, o chat inteiro (stream 0, cada mensagem guarda o seu tópico);
+  - páginas de 100 (máximo da API) em ordem crescente de id, vários chats em paralelo;
+  - FloodWait curto a lib dorme sozinha; longo sobe e o flood_aware reinicia o stream
+    a partir do checkpoint;
+  - checkpoint = maior id gravado por (chat, stream), no próprio índice do store:
+    rodar de novo continua de onde parou (e depois só traz o que é novo).
+
+Uso (a partir da raiz do projeto):
+    python src/exporter.py [--dir export] [--concurrency 4] [--since 2024-01-01] [--stats]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from telethon import utils
+from telethon.tl.types import MessageService
+
+import config as config
+from helpers import normalize_sources, normalize_topic_map
+from message_store import MessageStore
+from models import StoredMessage
+from utils.utils_topic import extract_top_msg_id, flood_aware
+
+log = logging.getLogger("exporter")
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _record(chat_id: int, msg) -> StoredMessage:
+    return StoredMessage(chat_id, extract_top_msg_id(msg) or 0, msg.id, int(msg.date.timestamp()),
+                         msg.sender_id or 0, msg.message or "")
+
+
+class HistoryExporter:
+    def __init__(self, client, store: MessageStore, concurrency: int = 4, batch: int = 500,
+                 since: Optional[datetime] = None, sync_every: int = 20):
+        self.client = client
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.batch = max(1, batch)
+        self.since = since
+        self.sync_every = sync_every
+        self._unsynced = 0
+        self.stats: Dict[str, int] = {"streams": 0, "messages": 0, "blocks": 0, "failed": 0}
+
+    def _append(self, chat_id: int, stream: int, records: List[StoredMessage]) -> int:
+        n = self.store.append(chat_id, stream, records)
+        if n:
+            self.stats["messages"] += n
+            self.stats["blocks"] += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self.store.sync()
+                self._unsynced = 0
+        return n
+
+    async def export_stream(self, entity, chat_id: int, stream: int) -> int:
+        """Um (chat, tópico): do checkpoint até a mensagem mais recente, em blocos de `batch`."""
+        hw = self.store.high_water(chat_id, stream)
+        kw = {"min_id": hw} if hw else ({"offset_date": self.since} if self.since else {})
+        buf: List[StoredMessage] = []
+        total = 0
+        t0 = time.perf_counter()
+        # reverse=True: do mais antigo para o mais novo (o checkpoint só anda para frente);
+        # wait_time=0: sem a pausa de 1s por página que a lib põe em iterações longas
+        async for msg in self.client.iter_messages(entity, limit=None, reverse=True, wait_time=0,
+                                                   reply_to=stream or None, **kw):
+            if isinstance(msg, MessageService):
+                continue
+            buf.append(_record(chat_id, msg))
+            if len(buf) >= self.batch:
+                total += self._append(chat_id, stream, buf)
+                buf = []
+        total += self._append(chat_id, stream, buf)
+        log.info(f"[export] {chat_id}/{stream or '-'}: +{total} mensagens (checkpoint "
+                 f"{hw} -> {self.store.high_water(chat_id, stream)}) em {time.perf_counter() - t0:.1f}s")
+        return total
+
+    async def export_source(self, source, topics: Set[int]) -> None:
+        try:
+            entity = await flood_aware(lambda: self.client.get_entity(source), f"get_entity {source}")
+        except Exception as e:
+            self.stats["failed"] += 1
+            log.error(f"[export] não consegui resolver source {source}: {e}")
+            return
+        chat_id = utils.get_peer_id(entity)
+        for stream in sorted(topics) or [0]:
+            try:
+                # FloodWait longo no meio: reinicia o stream; o checkpoint evita rebaixar o que já foi gravado
+                await flood_aware(lambda: self.export_stream(entity, chat_id, stream),
+                                  f"export {chat_id}/{stream or '-'}", max_retries=5)
+                self.stats["streams"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                log.error(f"[export] falha em {chat_id}/{stream or '-'}: {e}")
+
+    async def run(self, sources: Set[int | str], topic_map: Dict[int | str, Set[int]]) -> Dict[str, int]:
+        sem = asyncio.Semaphore(self.concurrency)
+        t0 = time.perf_counter()
+
+        async def one(source):
+            async with sem:
+                await self.export_source(source, topic_map.get(source, set()))
+
+        try:
+            await asyncio.gather(*(one(s) for s in sources))
+        finally:
+            self.store.sync()
+        log.info(f"[export] {self.stats['streams']} streams, {self.stats['messages']} mensagens novas em "
+                 f"{self.stats['blocks']} blocos, falhas={self.stats['failed']} em {time.perf_counter() - t0:.1f}s")
+        return self.stats
+
+
+def _print_stats(store: MessageStore) -> None:
+    for (chat_id, stream), s in sorted(store.stats().items()):
+        first = datetime.fromtimestamp(s["first_date"], timezone.utc).strftime("%Y-%m-%d")
+        last = datetime.fromtimestamp(s["last_date"], timezone.utc).strftime("%Y-%m-%d")
+        print(f"{chat_id}/{stream or '-'}: {s['messages']} mensagens em {s['blocks']} blocos, "
+              f"{first}..{last}, checkpoint={s['high_water']}")
+
+
+async def _main(args) -> None:
+    from telegram_reader import client, ensure_login
+
+    store = MessageStore(str(_BASE_DIR / args.dir))
+    try:
+        await ensure_login()
+        sources = normalize_sources(getattr(config, "SOURCE_CHATS", None), fallback_source=config.SOURCE_CHAT)
+        topic_map = normalize_topic_map(config.TOPIC_MAP, config.SOURCE_CHAT, config.TOPIC_ID)
+        since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc) if args.since else None
+        exporter = HistoryExporter(client, store, args.concurrency, args.batch, since)
+        await exporter.run(sources, topic_map)
+    finally:
+        store.close()
+        await client.disconnect()
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Exporta o histórico dos sources para o store local (retomável).")
+    ap.add_argument("--dir", default=config.EXPORT_DIR, help="diretório do store (relativo à raiz do projeto)")
+    ap.add_argument("--concurrency", type=int, default=config.EXPORT_CONCURRENCY, help="chats em paralelo")
+    ap.add_argument("--batch", type=int, default=config.EXPORT_BATCH, help="mensagens por bloco gravado")
+    ap.add_argument("--since", help="data inicial (YYYY-MM-DD) na 1ª exportação de cada stream")
+    ap.add_argument("--stats", action="store_true", help="só mostra o conteúdo do store")
+    args = ap.parse_args()
+    if args.stats:
+        with MessageStore(str(_BASE_DIR / args.dir), readonly=True) as store:
+            _print_stats(store)
+        return
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,168 @@
+# fanout.py
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set
+
+from bybit_client import BybitClient
+from models import AccountConfig, TradeSignal
+from metrics import metrics
+from plan_batch import AccountTable, BatchPlan, build_order_plans
+
+log = logging.getLogger("fanout")
+
+
+def load_accounts(path: str) -> List[AccountConfig]:
+    """
+    JSON com a lista de subcontas:
+      [{"account_id": "sub1", "api_key": "...", "api_secret": "...",
+        "balance_usdt": 1000, "risk_pct": 0.01, "profile": "50_25_25"}, ...]
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    accounts = []
+    for i, a in enumerate(raw):
+        if not a.get("api_key") or not a.get("api_secret"):
+            raise ValueError(f"{path}: conta #{i} sem api_key/api_secret")
+        accounts.append(AccountConfig(
+            account_id=str(a.get("account_id") or f"acc{i}"),
+            balance_usdt=float(a.get("balance_usdt") or 0.0),
+            risk_pct=float(a.get("risk_pct") or 0.0),
+            profile=a.get("profile") or "50_25_25",
+            api_key=a["api_key"],
+            api_secret=a["api_secret"],
+        ))
+    return accounts
+
+
+@dataclass
+class AccountResult:
+    account_id: str
+    ok: int = 0                  # ordens aceitas
+    failed: int = 0              # ordens rejeitadas/sem retry
+    latency_s: float = 0.0       # do início do fan-out até a conta terminar (inclui fila)
+    error: Optional[str] = None  # exceção/timeout da conta (as outras seguem)
+    unknown: bool = False        # timeout: o batch pode ter entrado; reenviar com os mesmos orderLinkIds
+
+
+@dataclass
+class FanoutReport:
+    signal_id: str
+    results: List[AccountResult]
+    total_s: float
+
+    def percentile(self, p: float) -> float:
+        lat = sorted(r.latency_s for r in self.results)
+        return lat[min(len(lat) - 1, int(round(p / 100.0 * (len(lat) - 1))))] if lat else 0.0
+
+    @property
+    def failed_accounts(self) -> List[AccountResult]:
+        return [r for r in self.results if not r.unknown and (r.error or r.failed)]
+
+    @property
+    def unknown_accounts(self) -> List[AccountResult]:
+        """Contas canceladas por timeout: estado desconhecido, não falha (retry idempotente resolve)."""
+        return [r for r in self.results if r.unknown]
+
+    def summary(self) -> str:
+        slow = max(self.results, key=lambda r: r.latency_s, default=None)
+        return (f"sinal {self.signal_id}: {len(self.results)} contas em {self.total_s * 1000:.0f}ms "
+                f"p50={self.percentile(50) * 1000:.0f}ms p99={self.percentile(99) * 1000:.0f}ms "
+                f"falhas={len(self.failed_accounts)} desconhecidas={len(self.unknown_accounts)}"
+                + (f" mais_lenta={slow.account_id} ({slow.latency_s * 1000:.0f}ms)" if slow else ""))
+
+
+class MultiAccountExecutor:
+    """
+    Copy-trading: o plano de um sinal vai para N subcontas ao mesmo tempo.
+      - um BybitClient por conta: pool de conexões, orçamento de rate limit
+        (X-Bapi-Limit-Status é por UID) e retries próprios;
+      - isolamento de falha: exceção/timeout de uma conta vira AccountResult.error, o resto segue;
+        timeout cancela a conta no meio do envio, então ela sai como `unknown` (o batch pode ter
+        entrado): reenviar com o mesmo signal_id resolve, pois os orderLinkIds são idempotentes;
+      - `concurrency` limita quantas contas estão com request em voo (sockets/CPU do processo);
+      - latência de colocação por conta no relatório e no histograma "fanout_account".
+    """
+    def __init__(self, accounts: Sequence[AccountConfig], testnet: bool = True, base_url: Optional[str] = None,
+                 recv_window: int = 5000, max_retries: int = 3, pool_size: int = 4, timeout_s: float = 10.0,
+                 concurrency: int = 64, account_timeout_s: float = 15.0):
+        self.table = AccountTable(accounts)
+        self.clients: Dict[str, BybitClient] = {
+            a.account_id: BybitClient(a.api_key, a.api_secret, testnet=testnet, base_url=base_url,
+                                      recv_window=recv_window, max_retries=max_retries,
+                                      pool_size=pool_size, timeout_s=timeout_s)
+            for a in accounts
+        }
+        self.concurrency = concurrency
+        self.account_timeout_s = account_timeout_s
+        self.last_latency: Dict[str, float] = {}
+        self.stats: Dict[str, int] = {"signals": 0, "accounts_ok": 0, "accounts_failed": 0,
+                                      "accounts_unknown": 0, "orders_ok": 0, "orders_failed": 0, "timeouts": 0}
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(c.close() for c in self.clients.values()), return_exceptions=True)
+
+    def plan(self, signal: TradeSignal, symbol_suffix: str = "USDT", instruments=None, **kw) -> BatchPlan:
+        return build_order_plans(signal, self.table, symbol_suffix=symbol_suffix, instruments=instruments, **kw)
+
+    async def place_plan(self, plan: BatchPlan, signal_id: str, only: Optional[Set[str]] = None) -> FanoutReport:
+        """only: restringe a essas contas (ex.: reenvio das `unknown` de um relatório anterior)."""
+        sem = asyncio.Semaphore(self.concurrency)
+        t0 = time.perf_counter()
+
+        async def one(i: int) -> AccountResult:
+            account_id = self.table.account_ids[i]
+            res = AccountResult(account_id)
+            try:
+                async with sem:
+                    results = await asyncio.wait_for(
+                        self.clients[account_id].place_orders(plan.orders(i), signal_id=signal_id),
+                        self.account_timeout_s)
+                res.ok = sum(1 for r in results.values() if r["ok"])
+                res.failed = len(results) - res.ok
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                res.unknown = True
+                res.error = (f"timeout ({self.account_timeout_s:.0f}s): estado desconhecido, "
+                             f"reenviar com os mesmos orderLinkIds")
+            except Exception as e:
+                res.error = f"{type(e).__name__}: {e}"
+            res.latency_s = time.perf_counter() - t0
+            metrics.observe("fanout_account", res.latency_s)
+            self.last_latency[account_id] = res.latency_s
+            if res.unknown:
+                log.warning(f"[fanout] conta {account_id} sinal {signal_id}: {res.error}")
+            elif res.error or res.failed:
+                log.error(f"[fanout] conta {account_id} sinal {signal_id}: ok={res.ok} falhas={res.failed} {res.error or ''}")
+            return res
+
+        active = [i for i in plan.active().tolist() if only is None or self.table.account_ids[i] in only]
+        results = await asyncio.gather(*(one(i) for i in active))
+        report = FanoutReport(signal_id, list(results), time.perf_counter() - t0)
+
+        self.stats["signals"] += 1
+        bad, unknown = len(report.failed_accounts), len(report.unknown_accounts)
+        self.stats["accounts_failed"] += bad
+        self.stats["accounts_unknown"] += unknown
+        self.stats["accounts_ok"] += len(results) - bad - unknown
+        self.stats["orders_ok"] += sum(r.ok for r in results)
+        self.stats["orders_failed"] += sum(r.failed for r in results)
+        log.info(f"[fanout] {report.summary()}")
+        return report
+
+    async def place_signal(self, signal: TradeSignal, signal_id: str, symbol_suffix: str = "USDT",
+                           instruments=None, only: Optional[Set[str]] = None) -> FanoutReport:
+        with metrics.timer("fanout_plan"):
+            plan = self.plan(signal, symbol_suffix=symbol_suffix, instruments=instruments)
+        return await self.place_plan(plan, signal_id, only)
+
+    def collect(self):
+        """Coletor para metrics.add_collector."""
+        yield "fanout_accounts", {}, len(self.clients)
+        for k, v in self.stats.items():
+            yield f"fanout_{k}", {}, v
@@ -1,6 +1,7 @@
 # helpers.py
+import math
 from typing import List
-from models import TradeSignal, PlanConfig, Order
+from models import TradeSignal, PlanConfig, Order, InstrumentInfo
 
 def _alloc_by_profile(num_tps: int, profile: str) -> List[float]:
     if num_tps == 3:
@@ -52,36 +53,85 @@ def calc_qty(balance_usdt: float, risk_pct: float, pm: float, sl: float) -> floa
         raise ValueError("PM e SL inválidos para cálculo de quantidade.")
     return (balance_usdt * risk_pct) / dist
 
-def build_order_plan(signal: TradeSignal, cfg: PlanConfig, symbol_suffix: str = "USDT") -> list:
+def quantize_price(info: InstrumentInfo, price: float) -> float:
+    """Preço no tick mais próximo do símbolo."""
+    return round(round(price / info.tick_size) * info.tick_size, info.price_decimals)
+
+def quantize_qty(info: InstrumentInfo, qty: float) -> float:
+    """Quantidade para baixo no qty_step (nunca arredonda risco para cima), limitada ao max_qty."""
+    q = math.floor(qty / info.qty_step + 1e-9) * info.qty_step
+    if info.max_qty:
+        q = min(q, info.max_qty)
+    return round(q, info.qty_decimals)
+
+def _tp_qtys(info: InstrumentInfo, total: float, fracs: List[float]) -> List[float]:
+    """
+    Divide a qty total entre os TPs no qty_step. A sobra do arredondamento vai para o último TP
+    (se as frações fecham 100%) e perna abaixo do min_qty é somada à seguinte (a última, à anterior).
+    """
+    legs = [quantize_qty(info, total * f) for f in fracs]
+    if legs and abs(sum(fracs) - 1.0) < 1e-6:
+        legs[-1] = round(total - sum(legs[:-1]), info.qty_decimals)
+    for i in range(len(legs) - 1):
+        if 0 < legs[i] < info.min_qty:
+            legs[i + 1] = round(legs[i + 1] + legs[i], info.qty_decimals)
+            legs[i] = 0.0
+    if len(legs) > 1 and 0 < legs[-1] < info.min_qty:
+        j = max((i for i in range(len(legs) - 1) if legs[i]), default=None)
+        if j is not None:
+            legs[j] = round(legs[j] + legs[-1], info.qty_decimals)
+            legs[-1] = 0.0
+    return legs
+
+def build_order_plan(signal: TradeSignal, cfg: PlanConfig, symbol_suffix: str = "USDT",
+                     instruments=None) -> list:
+    """
+    Entrada + TPs + SL. Com `instruments` (InstrumentCache ou qualquer coisa com .get(symbol))
+    e o símbolo conhecido, preços vão para o tick e qtys para o qty_step/limites do símbolo —
+    sem I/O, o cache já está em memória. Sem metadata, cai na precisão global do PlanConfig.
+    Abaixo do min_qty/min_notional as qtys saem 0 (o BybitClient não envia perna com qty 0).
+    """
     from models import Order  # evitar import circular
 
     qty_total = calc_qty(cfg.balance_usdt, cfg.risk_pct, signal.entry_pm, signal.sl) if (cfg.balance_usdt and cfg.risk_pct) else 0.0
     symbol = signal.symbol.upper() + symbol_suffix
     side_entry = "Sell" if signal.side.upper() == "SHORT" else "Buy"
     side_tp = "Buy" if side_entry == "Sell" else "Sell"
+    tps = list(zip(signal.tps, cfg.tp_alloc))
+
+    info = instruments.get(symbol) if instruments is not None else None
+    if info is not None:
+        px = lambda p: quantize_price(info, p)
+        qty = quantize_qty(info, qty_total) if qty_total else 0.0
+        if qty < info.min_qty or qty * signal.entry_pm < info.min_notional:
+            qty = 0.0
+        tp_qtys = _tp_qtys(info, qty, [f for _, f in tps]) if qty else [0.0] * len(tps)
+    else:
+        px = lambda p: round(p, cfg.price_precision)
+        qty = round(qty_total, cfg.qty_precision) if qty_total else 0.0
+        tp_qtys = [round(qty_total * f, cfg.qty_precision) if qty_total else 0.0 for _, f in tps]
 
     orders: list = []
     # Entrada no PM (limit)
     orders.append(Order(
         type="LIMIT", side=side_entry, symbol=symbol,
-        price=round(signal.entry_pm, cfg.price_precision),
-        qty=round(qty_total, cfg.qty_precision) if qty_total else 0.0,
+        price=px(signal.entry_pm),
+        qty=qty,
         tag="ENTRY", reduce_only=False, post_only=cfg.use_post_only
     ))
     # TPs
-    for i, (tp_price, frac) in enumerate(zip(signal.tps, cfg.tp_alloc), start=1):
-        q = qty_total * frac if qty_total else 0.0
+    for i, ((tp_price, _), q) in enumerate(zip(tps, tp_qtys), start=1):
         orders.append(Order(
             type="LIMIT", side=side_tp, symbol=symbol,
-            price=round(tp_price, cfg.price_precision),
-            qty=round(q, cfg.qty_precision),
+            price=px(tp_price),
+            qty=q,
             tag=f"TP{i}", reduce_only=True, post_only=cfg.use_post_only
         ))
     # SL
     orders.append(Order(
         type="STOP", side=side_tp, symbol=symbol,
-        price=round(signal.sl, cfg.price_precision),
-        qty=round(qty_total, cfg.qty_precision),
+        price=px(signal.sl),
+        qty=qty,
         tag="SL", reduce_only=True, post_only=False
     ))
     return orders
@@ -0,0 +1,157 @@
+# instruments.py
+import asyncio
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Dict, Optional
+
+from bybit_client import BybitClient
+from models import InstrumentInfo
+from metrics import metrics
+
+log = logging.getLogger("instruments")
+
+_CACHE_VERSION = 1
+
+
+def _f(v) -> float:
+    try:
+        return float(v) if v not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _decimals(step: str) -> int:
+    """'0.010' -> 2, '1' -> 0, '5e-05' -> 5."""
+    exp = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exp)
+
+
+def parse_instrument(row: dict) -> Optional[InstrumentInfo]:
+    """Linha de /v5/market/instruments-info -> InstrumentInfo (None se faltar tick/step)."""
+    pf = row.get("priceFilter") or {}
+    lf = row.get("lotSizeFilter") or {}
+    tick, step = pf.get("tickSize"), lf.get("qtyStep") or lf.get("basePrecision")
+    if not row.get("symbol") or not _f(tick) or not _f(step):
+        return None
+    return InstrumentInfo(
+        symbol=row["symbol"],
+        tick_size=_f(tick),
+        qty_step=_f(step),
+        min_qty=_f(lf.get("minOrderQty")),
+        max_qty=_f(lf.get("maxOrderQty")),
+        min_notional=_f(lf.get("minNotionalValue") or lf.get("minOrderAmt")),
+        price_decimals=_decimals(tick),
+        qty_decimals=_decimals(step),
+    )
+
+
+class InstrumentCache:
+    """
+    tick size / qty step / limites por símbolo, carregados em bulk (1 GET paginado para a
+    categoria inteira) e renovados em background a cada ttl_s. get() é só um dict lookup:
+    o build_order_plan nunca faz I/O. Persiste em disco para o restart já sair quantizando.
+    A troca do dict é copy-on-write (refresh monta um dict novo e substitui de uma vez).
+    """
+    def __init__(self, client: BybitClient, path: Optional[str] = None, ttl_s: float = 3600.0):
+        self.client = client
+        self.path = path
+        self.ttl_s = ttl_s
+        self.by_symbol: Dict[str, InstrumentInfo] = {}
+        self.loaded_at = 0.0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def get(self, symbol: str) -> Optional[InstrumentInfo]:
+        info = self.by_symbol.get(symbol)
+        if info is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return info
+
+    def __len__(self) -> int:
+        return len(self.by_symbol)
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.loaded_at >= self.ttl_s
+
+    async def refresh(self) -> int:
+        with metrics.timer("instruments_refresh"):
+            rows = await self.client.fetch_list("/v5/market/instruments-info", {}, max_pages=10,
+                                                limit=1000, auth=False)
+        fresh = {}
+        for row in rows:
+            info = parse_instrument(row)
+            if info is not None:
+                fresh[info.symbol] = info
+        if not fresh:
+            raise RuntimeError("instruments-info veio vazio")
+        self.by_symbol = fresh
+        self.loaded_at = time.time()
+        self.stats["refreshes"] += 1
+        log.info(f"[instruments] {len(fresh)} símbolos ({self.client.category}) atualizados")
+        self.save()
+        return len(fresh)
+
+    async def refresh_loop(self) -> None:
+        """Refresh imediato se o cache (disco) estiver velho; depois a cada ttl_s."""
+        while True:
+            wait = self.ttl_s - (time.time() - self.loaded_at)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                log.warning(f"[instruments] refresh falhou (mantendo {len(self.by_symbol)} símbolos): {e}")
+                await asyncio.sleep(min(60.0, self.ttl_s))
+
+    # ---------------- disco ----------------
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        data = {
+            "v": _CACHE_VERSION,
+            "saved_at": self.loaded_at,
+            "category": self.client.category,
+            "instruments": [[i.symbol, i.tick_size, i.qty_step, i.min_qty, i.max_qty, i.min_notional,
+                             i.price_decimals, i.qty_decimals] for i in self.by_symbol.values()],
+        }
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            log.error(f"[instruments] falha ao salvar {self.path}: {e}")
+
+    def load(self) -> bool:
+        """Carrega do disco (mesmo velho: melhor que a precisão global até o refresh chegar)."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("v") != _CACHE_VERSION or data.get("category") != self.client.category:
+                return False
+            self.by_symbol = {row[0]: InstrumentInfo(*row) for row in data.get("instruments", [])}
+            self.loaded_at = float(data.get("saved_at") or 0.0)
+        except Exception as e:
+            log.error(f"[instruments] falha ao carregar {self.path}: {e}")
+            return False
+        log.info(f"[instruments] {len(self.by_symbol)} símbolos carregados de {self.path} "
+                 f"(idade {time.time() - self.loaded_at:.0f}s)")
+        return True
+
+    def collect(self):
+        """Coletor para metrics.add_collector."""
+        yield "instruments_symbols", {}, len(self.by_symbol)
+        yield "instruments_age_seconds", {}, time.time() - self.loaded_at if self.loaded_at else -1
+        for k, v in self.stats.items():
+            yield f"instruments_{k}", {}, v
@@ -0,0 +1,357 @@
+# journal.py
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from models import Order, TradeSignal
+
+log = logging.getLogger("journal")
+
+# Frame: <len u32, crc32 u32 (de kind+payload), kind u8> + payload
+_FRAME = struct.Struct("<IIB")
+K_MESSAGE, K_PLAN, K_OUTCOME = 1, 2, 3
+# alvo de um plano/resultado: conta principal ou subcontas (fan-out)
+T_MAIN, T_FANOUT = 0, 1
+
+_MSG = struct.Struct("<qId")                 # chat_id, msg_id, ts
+_PLAN_HEAD = struct.Struct("<qId16sB")       # chat_id, msg_id, ts, signal_id, targets (bits)
+_SIGNAL = struct.Struct("<Bdddddd")          # side (1=LONG), entry_low, entry_high, entry_pm, sl, lev_min, lev_max
+_ORDER = struct.Struct("<BBBdd")             # type, side (1=Buy), flags (1=reduce_only 2=post_only), price, qty
+_OUTCOME = struct.Struct("<d16sBHH")         # ts, signal_id, target, ok, failed
+
+_TYPES = ("LIMIT", "MARKET", "STOP")
+_NAN = float("nan")
+
+
+class MessageRecord:
+    """Mensagem cujo forward (ou aviso) já saiu: reentrega é ignorada."""
+    __slots__ = ("chat_id", "msg_id", "ts")
+
+    def __init__(self, chat_id: int, msg_id: int, ts: float):
+        self.chat_id, self.msg_id, self.ts = chat_id, msg_id, ts
+
+
+class PlanRecord:
+    """Sinal + plano de ordens ANTES de ir para a corretora (targets: bits T_MAIN/T_FANOUT)."""
+    __slots__ = ("chat_id", "msg_id", "ts", "signal_id", "targets", "signal", "orders")
+
+    def __init__(self, chat_id: int, msg_id: int, ts: float, signal_id: str, targets: int,
+                 signal: TradeSignal, orders: List[Order]):
+        self.chat_id, self.msg_id, self.ts, self.signal_id = chat_id, msg_id, ts, signal_id
+        self.targets, self.signal, self.orders = targets, signal, orders
+
+
+class OutcomeRecord:
+    """Resultado da execução de um plano num alvo (error != "" -> falhou antes de concluir)."""
+    __slots__ = ("ts", "signal_id", "target", "ok", "failed", "error")
+
+    def __init__(self, ts: float, signal_id: str, target: int, ok: int, failed: int, error: str = ""):
+        self.ts, self.signal_id, self.target = ts, signal_id, target
+        self.ok, self.failed, self.error = ok, failed, error
+
+
+# ---------------- codificação ----------------
+
+def _str(s: str) -> bytes:
+    b = (s or "").encode("utf-8")[:65535]
+    return struct.pack("<H", len(b)) + b
+
+
+def _read_str(buf, pos: int) -> Tuple[str, int]:
+    n = struct.unpack_from("<H", buf, pos)[0]
+    pos += 2
+    return bytes(buf[pos:pos + n]).decode("utf-8"), pos + n
+
+
+def _opt(x: Optional[float]) -> float:
+    return _NAN if x is None else float(x)
+
+
+def _unopt(x: float) -> Optional[float]:
+    return None if math.isnan(x) else x
+
+
+def _sid(signal_id: str) -> bytes:
+    return signal_id.encode("ascii")[:16]
+
+
+def _encode_plan(r: PlanRecord) -> bytes:
+    s = r.signal
+    parts = [_PLAN_HEAD.pack(r.chat_id, r.msg_id, r.ts, _sid(r.signal_id), r.targets),
+             _SIGNAL.pack(s.side.upper() == "LONG", s.entry_low, s.entry_high, s.entry_pm, s.sl,
+                          _opt(s.lev_min), _opt(s.lev_max)),
+             _str(s.symbol), _str(",".join(s.tags or [])),
+             struct.pack(f"<B{len(s.tps)}d", len(s.tps), *s.tps),
+             struct.pack("<B", len(r.orders))]
+    for o in r.orders:
+        parts.append(_ORDER.pack(_TYPES.index(o.type) if o.type in _TYPES else 0, o.side == "Buy",
+                                 (1 if o.reduce_only else 0) | (2 if o.post_only else 0), _opt(o.price), o.qty))
+        parts.append(_str(o.symbol))
+        parts.append(_str(o.tag))
+    return b"".join(parts)
+
+
+def _decode_plan(buf, pos: int) -> PlanRecord:
+    chat_id, msg_id, ts, sid, targets = _PLAN_HEAD.unpack_from(buf, pos)
+    pos += _PLAN_HEAD.size
+    long, lo, hi, pm, sl, lev_min, lev_max = _SIGNAL.unpack_from(buf, pos)
+    pos += _SIGNAL.size
+    symbol, pos = _read_str(buf, pos)
+    tags, pos = _read_str(buf, pos)
+    n = buf[pos]
+    tps = list(struct.unpack_from(f"<{n}d", buf, pos + 1))
+    pos += 1 + 8 * n
+    signal = TradeSignal(side="LONG" if long else "SHORT", symbol=symbol, entry_low=lo, entry_high=hi,
+                         entry_pm=pm, sl=sl, lev_min=_unopt(lev_min), lev_max=_unopt(lev_max), tps=tps,
+                         tags=tags.split(",") if tags else [])
+    orders = []
+    n = buf[pos]
+    pos += 1
+    for _ in range(n):
+        typ, buy, flags, price, qty = _ORDER.unpack_from(buf, pos)
+        pos += _ORDER.size
+        osym, pos = _read_str(buf, pos)
+        tag, pos = _read_str(buf, pos)
+        orders.append(Order(type=_TYPES[typ], side="Buy" if buy else "Sell", symbol=osym, price=_unopt(price),
+                            qty=qty, tag=tag, reduce_only=bool(flags & 1), post_only=bool(flags & 2)))
+    return PlanRecord(chat_id, msg_id, ts, sid.rstrip(b"\0").decode("ascii"), targets, signal, orders)
+
+
+def _frame(kind: int, payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload), zlib.crc32(payload, kind), kind) + payload
+
+
+class SignalJournal:
+    """
+    Journal só de append do caminho mensagem -> sinal -> ordens, para sobreviver a uma queda
+    entre o forward e o place_orders:
+      - MESSAGE (chat, msg) quando o envio para o destino termina (não quando é enfileirado);
+        PLAN (sinal + ordens) antes de ir para a corretora; OUTCOME (ok/falhas/erro) por alvo
+        quando a execução termina;
+      - frames binários com crc32; um frame cortado no fim (queda no meio do write) é truncado na abertura;
+      - append = encode + 1 write() no arquivo (já sobrevive à morte do processo); o fsync
+        (queda da máquina) é em lote, numa thread, a cada fsync_ms — nada disso espera no hot path;
+      - handled guarda só as últimas keep_messages mensagens; passou de max_bytes, o run() compacta
+        o arquivo (mensagens mantidas + planos em voo) sem parar o hot path;
+      - open() relê tudo: mensagens já encaminhadas (reentrega é ignorada) e planos sem OUTCOME
+        (em voo na queda), que o main reenvia com o mesmo signal_id (orderLinkIds idempotentes).
+        Mensagem com PLAN mas sem MESSAGE (caiu antes do forward sair) volta a ser tratada se for
+        reentregue: o forward sai e o plano, com o mesmo signal_id, volta como duplicado.
+    """
+    def __init__(self, path: str, fsync_ms: float = 50.0, max_bytes: int = 64 << 20, keep_messages: int = 50000):
+        self.path = path
+        self.fsync_s = fsync_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.keep_messages = keep_messages
+        self.handled: "OrderedDict[Tuple[int, int], float]" = OrderedDict()   # (chat, msg) -> ts (ordem de chegada)
+        self.pending: Dict[Tuple[str, int], PlanRecord] = {}     # (signal_id, alvo) -> plano sem resultado
+        self._fd: Optional[int] = None
+        self._size = 0                                            # tamanho atual do arquivo
+        self._compact_at = max_bytes
+        self._tail: Optional[List[bytes]] = None                  # frames gravados durante uma compactação
+        self._dirty = False
+        self._stopping = False
+        self.stats: Dict[str, int] = {"records": 0, "bytes": 0, "fsyncs": 0, "replayed": 0,
+                                      "truncated": 0, "skipped": 0, "write_errors": 0,
+                                      "compactions": 0}
+
+    # ---------------- abertura / replay ----------------
+
+    def open(self) -> None:
+        t0 = time.perf_counter()
+        self._size = self._replay() if os.path.exists(self.path) else 0
+        if self._size > self.max_bytes:
+            self.compact()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        log.info(f"[journal] {self.stats['replayed']} registros relidos em {1000 * (time.perf_counter() - t0):.0f}ms: "
+                 f"{len(self.handled)} mensagens tratadas, {len(self.pending)} planos em voo")
+
+    def _replay(self) -> int:
+        with open(self.path, "rb") as f:
+            buf = memoryview(f.read())
+        pos, end, hsize = 0, len(buf), _FRAME.size
+        plans: Dict[Tuple[str, int], int] = {}                   # (signal_id, alvo) -> offset do payload
+        while pos + hsize <= end:
+            n, crc, kind = _FRAME.unpack_from(buf, pos)
+            body = pos + hsize
+            if body + n > end or zlib.crc32(buf[body:body + n], kind) != crc:
+                break
+            if kind == K_MESSAGE:
+                chat_id, msg_id, ts = _MSG.unpack_from(buf, body)
+                self._handled(chat_id, msg_id, ts)
+            elif kind == K_PLAN:
+                _, _, _, sid, targets = _PLAN_HEAD.unpack_from(buf, body)
+                sid = sid.rstrip(b"\0").decode("ascii")
+                for target in (T_MAIN, T_FANOUT):
+                    if targets & (1 << target):
+                        plans[(sid, target)] = body
+            elif kind == K_OUTCOME:
+                _, sid, target, _, _ = _OUTCOME.unpack_from(buf, body)
+                plans.pop((sid.rstrip(b"\0").decode("ascii"), target), None)
+            self.stats["replayed"] += 1
+            pos = body + n
+        # só os planos em voo são decodificados por inteiro
+        decoded: Dict[int, PlanRecord] = {}
+        for key, off in plans.items():
+            if off not in decoded:
+                decoded[off] = _decode_plan(buf, off)
+            self.pending[key] = decoded[off]
+        if pos != end:
+            self.stats["truncated"] += end - pos
+            log.warning(f"[journal] {end - pos} bytes inválidos no fim de {self.path} (queda no meio de um write); truncando")
+            buf.release()
+            with open(self.path, "r+b") as f:
+                f.truncate(pos)
+        return pos
+
+    def _snapshot(self) -> Tuple[bytes, int]:
+        """Conteúdo compactado: mensagens mantidas + planos em voo (retorna também quantos planos)."""
+        parts = [_frame(K_MESSAGE, _MSG.pack(chat_id, msg_id, ts))
+                 for (chat_id, msg_id), ts in self.handled.items()]
+        seen = set()
+        for rec in self.pending.values():
+            if id(rec) not in seen:
+                seen.add(id(rec))
+                parts.append(_frame(K_PLAN, _encode_plan(rec)))
+        return b"".join(parts), len(seen)
+
+    @staticmethod
+    def _write_tmp(tmp: str, data: bytes) -> None:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compacted(self, size: int, plans: int) -> None:
+        self._size = size
+        self._compact_at = max(self.max_bytes, 2 * size)    # não recompacta em loop se o mínimo já é grande
+        self.stats["compactions"] += 1
+        log.info(f"[journal] compactado: {len(self.handled)} mensagens, {plans} planos em voo, {size} bytes")
+
+    def compact(self) -> None:
+        """Reescreve só as mensagens mantidas + planos em voo (tmp + os.replace), com o arquivo fechado."""
+        data, plans = self._snapshot()
+        tmp = self.path + ".tmp"
+        self._write_tmp(tmp, data)
+        os.replace(tmp, self.path)
+        self._compacted(len(data), plans)
+
+    async def _compact_live(self) -> None:
+        """
+        compact() com o journal aberto: o snapshot é montado no loop, gravado+fsync numa thread;
+        frames escritos nesse meio tempo (no arquivo antigo) vão também para `_tail` e entram no
+        fim do novo antes do os.replace, que então passa a receber os appends.
+        """
+        self._tail = []
+        tmp = self.path + ".tmp"
+        try:
+            data, plans = self._snapshot()
+            await asyncio.to_thread(self._write_tmp, tmp, data)
+            if self._fd is None:                              # fechado durante a compactação
+                os.remove(tmp)
+                return
+            tail = b"".join(self._tail)
+            with open(tmp, "ab") as f:
+                f.write(tail)
+            os.replace(tmp, self.path)
+            old, self._fd = self._fd, os.open(self.path, os.O_WRONLY | os.O_APPEND, 0o644)
+            os.close(old)
+            self._dirty = self._dirty or bool(tail)
+            self._compacted(len(data) + len(tail), plans)
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            log.error(f"[journal] falha ao compactar: {e}")
+        finally:
+            self._tail = None
+
+    # ---------------- escrita (hot path) ----------------
+
+    def _handled(self, chat_id: int, msg_id: int, ts: float) -> None:
+        self.handled[(chat_id, msg_id)] = ts
+        if len(self.handled) > self.keep_messages:
+            self.handled.popitem(last=False)
+
+    def seen(self, chat_id: int, msg_id: int) -> bool:
+        if (chat_id, msg_id) in self.handled:
+            self.stats["skipped"] += 1
+            return True
+        return False
+
+    def _write(self, kind: int, payload: bytes) -> None:
+        if self._fd is None:
+            return
+        frame = _frame(kind, payload)
+        try:
+            os.write(self._fd, frame)
+        except OSError as e:
+            # disco cheio etc.: o bot segue operando, sem journal para esse registro
+            self.stats["write_errors"] += 1
+            log.error(f"[journal] falha ao gravar: {e}")
+            return
+        if self._tail is not None:
+            self._tail.append(frame)
+        self._dirty = True
+        self._size += len(frame)
+        self.stats["records"] += 1
+        self.stats["bytes"] += len(frame)
+
+    def message(self, chat_id: int, msg_id: int) -> None:
+        ts = time.time()
+        self._handled(chat_id, msg_id, ts)
+        self._write(K_MESSAGE, _MSG.pack(chat_id, msg_id, ts))
+
+    def plan(self, chat_id: int, msg_id: int, signal_id: str, signal: TradeSignal, orders: List[Order],
+             targets: int = 1 << T_MAIN) -> PlanRecord:
+        rec = PlanRecord(chat_id, msg_id, time.time(), signal_id, targets, signal, orders)
+        for target in (T_MAIN, T_FANOUT):
+            if targets & (1 << target):
+                self.pending[(signal_id, target)] = rec
+        self._write(K_PLAN, _encode_plan(rec))
+        return rec
+
+    def outcome(self, signal_id: str, target: int, ok: int, failed: int, error: str = "") -> None:
+        self.pending.pop((signal_id, target), None)
+        self._write(K_OUTCOME, _OUTCOME.pack(time.time(), _sid(signal_id), target, ok, failed) + _str(error))
+
+    # ---------------- fsync em lote ----------------
+
+    def _fsync(self) -> None:
+        os.fsync(self._fd)
+        self.stats["fsyncs"] += 1
+
+    async def run(self) -> None:
+        """Loop de fsync em lote: no máximo 1 fsync a cada fsync_ms, só se houve escrita; compacta
+        quando o arquivo passa de max_bytes."""
+        while not self._stopping:
+            await asyncio.sleep(self.fsync_s)
+            if self._size > self._compact_at and self._fd is not None:
+                await self._compact_live()
+            if self._dirty and self._fd is not None:
+                self._dirty = False
+                try:
+                    await asyncio.to_thread(self._fsync)
+                except OSError as e:
+                    self.stats["write_errors"] += 1
+                    log.error(f"[journal] falha no fsync: {e}")
+
+    def close(self) -> None:
+        self._stopping = True
+        if self._fd is not None:
+            try:
+                self._fsync()
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def collect(self):
+        """Coletor para metrics.add_collector."""
+        yield "journal_pending", {}, len(self.pending)
+        yield "journal_handled", {}, len(self.handled)
+        for k, v in self.stats.items():
+            yield f"journal_{k}", {}, v
@@ -1,121 +1,274 @@
 import asyncio
+import hashlib
 import logging
+import time
+from pathlib import Path
 from typing import List, Optional, Set
 
 from models import PlanConfig, Order
 from parser_signal import (
-    parse_signal,           # parser “estrito”
-    parse_signal_flexible,  # parser tolerante (fallback)
-    is_potential_signal,    # heurística “parece um sinal?”
+    parse_signal_any,       # estrito (fast-path) -> tolerante (fallback), com contadores
+    SignalPrefilter,        # heurística “parece um sinal?” (score por palavras-chave)
+    PARSE_STATS,
 )
-from ai_api import local_validate, gemini_validate
+from ai_api import local_validate, gemini_validate_async, note_cache
 from bybit_client import BybitClient
-from telegram_reader import ensure_login, start_listening, run_forever
+from order_state import OrderStateBook, BybitPrivateStream
+from instruments import InstrumentCache
+from fanout import MultiAccountExecutor, load_accounts
+from outbound import OutboundScheduler
+from dedup import DedupIndex, signal_fingerprint, text_fingerprint
+from journal import SignalJournal, T_FANOUT, T_MAIN
+from metrics import metrics
+from telegram_reader import ensure_login, start_listening, run_forever, fastmap, apply_routing
+from routing_reload import RoutingReloader
 import config as config
 from helpers import build_order_plan, choose_tp_profile, alloc_for_signal
 
 log = logging.getLogger("main")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-bybit = BybitClient(testnet=True)
+bybit = BybitClient(
+    config.BYBIT_API_KEY, config.BYBIT_API_SECRET, testnet=config.BYBIT_TESTNET,
+    base_url=config.BYBIT_BASE_URL, recv_window=config.BYBIT_RECV_WINDOW, max_retries=config.BYBIT_MAX_RETRIES,
+    ws_private_url=config.BYBIT_WS_URL, settle_coin=config.BYBIT_SETTLE_COIN,
+)
+order_book = OrderStateBook()
+fanout = MultiAccountExecutor(
+    load_accounts(str(Path(__file__).resolve().parent.parent / config.BYBIT_ACCOUNTS_FILE)),
+    testnet=config.BYBIT_TESTNET, base_url=config.BYBIT_BASE_URL, recv_window=config.BYBIT_RECV_WINDOW,
+    max_retries=config.BYBIT_MAX_RETRIES, concurrency=config.FANOUT_CONCURRENCY,
+    account_timeout_s=config.FANOUT_ACCOUNT_TIMEOUT_S,
+) if config.BYBIT_ACCOUNTS_FILE else None
+instruments = InstrumentCache(
+    bybit, str(Path(__file__).resolve().parent.parent / config.INSTRUMENTS_FILE) if config.INSTRUMENTS_FILE else None,
+    ttl_s=config.INSTRUMENTS_TTL_S,
+)
+order_stream = BybitPrivateStream(bybit, order_book)
+prefilter = SignalPrefilter(config.SIGNAL_LANGS, config.SIGNAL_MIN_SCORE)
+outbound = OutboundScheduler(config.OUTBOUND_RATE_PER_S, config.OUTBOUND_BURST, config.OUTBOUND_MAX_RETRIES)
+dedup = DedupIndex(config.DEDUP_WINDOW_S, config.DEDUP_MAX_ITEMS)
+journal = SignalJournal(
+    str(Path(__file__).resolve().parent.parent / config.JOURNAL_FILE), fsync_ms=config.JOURNAL_FSYNC_MS,
+    max_bytes=int(config.JOURNAL_MAX_MB * (1 << 20)),
+) if config.JOURNAL_FILE else None
+# roteamento relido do .env/ROUTING_FILE sem reiniciar (troca a RouteTable no ar)
+routing_reloader = RoutingReloader(apply_routing, interval_s=config.ROUTING_RELOAD_S)
+_bg_tasks: Set[asyncio.Task] = set()  # referência forte às tasks em background (Gemini, ordens)
 
 # ---------------- helpers locais ----------------
 
-def _topic_allowed(chat_id: int, topic_id: Optional[int]) -> bool:
+def _build_extras(issues: List[str], note: Optional[str], profile: str, signal, orders: List[Order]) -> str:
+    """Monta os EXTRAS (sem nome de chat/tópico)."""
+    parts = []
+
+    if issues:
+        parts.append("⚠️ **Validação local encontrou problemas:**\n- " + "\n- ".join(issues))
+    else:
+        parts.append("✅ **Validação local OK.**")
+
+    if note:
+        parts.append("🤖 **Gemini:** " + note)
+
+    parts.append(f"📌 **Profile escolhido:** {profile}")
+    parts.append(f"📊 **Sinal parseado:**\n`{signal}`")
+
+    plan_txt = "\n".join(str(o) for o in orders)
+    parts.append("🧾 **Plano de ordens (mock):**\n```\n" + plan_txt + "\n```")
+
+    return "\n\n".join(parts)
+
+
+async def _edit_with_gemini_note(target, sent_fut, text: str, issues: List[str], profile: str, signal,
+                                 orders: List[Order]) -> None:
+    """Roda o Gemini fora do event loop e edita os extras (já enviados/enfileirados) quando a nota chegar."""
+    try:
+        with metrics.timer("gemini_validate"):
+            note = await gemini_validate_async(signal, text)
+        if note:
+            sent = await sent_fut
+            await outbound.edit_message(target, sent, _build_extras(issues, note, profile, signal, orders))
+    except Exception as e:
+        log.error(f"[gemini] falha ao editar extras com a nota: {e}")
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+
+async def _place_orders(signal_id: str, orders: List[Order]) -> None:
+    try:
+        with metrics.timer("place_orders"):
+            results = await bybit.place_orders(orders, signal_id=signal_id)
+    except Exception as e:
+        log.error(f"[bybit] falha ao enviar ordens do sinal {signal_id}: {e}")
+        if journal is not None:
+            journal.outcome(signal_id, T_MAIN, 0, 0, f"{type(e).__name__}: {e}")
+        return
+    if journal is not None:
+        ok = sum(1 for r in results.values() if r["ok"])
+        journal.outcome(signal_id, T_MAIN, ok, len(results) - ok)
+
+
+async def _place_fanout(signal_id: str, signal) -> None:
+    try:
+        with metrics.timer("place_fanout"):
+            report = await fanout.place_signal(signal, signal_id, symbol_suffix=config.SYMBOL_SUFFIX,
+                                               instruments=instruments)
+    except Exception as e:
+        log.error(f"[fanout] falha no sinal {signal_id}: {e}")
+        if journal is not None:
+            journal.outcome(signal_id, T_FANOUT, 0, 0, f"{type(e).__name__}: {e}")
+        return
+    if report.unknown_accounts:
+        # contas com estado desconhecido (timeout): 1 reenvio só para elas, com o mesmo signal_id
+        # (o que já tinha entrado volta como duplicado/ok)
+        only = {r.account_id for r in report.unknown_accounts}
+        log.warning(f"[fanout] sinal {signal_id}: {len(only)} contas sem confirmação; reenviando")
+        try:
+            retry = await fanout.place_signal(signal, signal_id, symbol_suffix=config.SYMBOL_SUFFIX,
+                                              instruments=instruments, only=only)
+        except Exception as e:
+            log.error(f"[fanout] reenvio do sinal {signal_id} falhou: {e}")
+            return
+        if retry.unknown_accounts:
+            # segue sem confirmação: o plano fica em voo no journal e o replay do boot reenvia
+            log.warning(f"[fanout] sinal {signal_id}: {len(retry.unknown_accounts)} contas ainda sem "
+                        f"confirmação; plano mantido no journal")
+            return
+        retried = {r.account_id: r for r in retry.results}
+        report.results = [retried.get(r.account_id, r) for r in report.results]
+    if journal is not None:
+        bad = len(report.failed_accounts)
+        journal.outcome(signal_id, T_FANOUT, len(report.results) - bad, bad)
+
+
+def _journal_when_sent(fut: asyncio.Future, chat_id: int, msg_id: int) -> None:
+    """MESSAGE no journal só quando o forward/aviso sai de fato (a fila do outbound só enfileira)."""
+    def done(f: asyncio.Future) -> None:
+        if not f.cancelled() and f.exception() is None:
+            journal.message(chat_id, msg_id)
+    fut.add_done_callback(done)
+
+
+def _signal_id(chat_id: int, msg_id: int, signal) -> str:
     """
-    Retorna True se topic_id estiver permitido em TOPIC_MAP para esse chat.
-    Se TOPIC_MAP não estiver definido/estiver vazio, considera NÃO permitido.
+    Id do sinal (base dos orderLinkIds e chave do journal): identidade da mensagem + conteúdo.
+    Só o conteúdo colidiria num repost depois da janela do dedup (110072 = "já criado" e nada
+    seria colocado); a mesma mensagem reentregue/reenviada do journal mantém o mesmo id.
     """
-    tm = getattr(config, "TOPIC_MAP", None)
-    if not tm or topic_id is None:
-        return False
-
-    # TOPIC_MAP veio do .env (JSON); as chaves geralmente são strings
-    key_candidates = [chat_id, str(chat_id)]
-    for key in key_candidates:
-        if key in tm:
-            try:
-                allowed_list = tm[key]
-            except Exception:
-                continue
-            try:
-                allowed: Set[int] = set(int(x) for x in allowed_list)
-            except Exception:
-                allowed = set()
-            return topic_id in allowed
-    return False
+    key = f"{chat_id}:{msg_id}:{signal_fingerprint(signal)!r}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _replay_pending() -> None:
+    """Planos do journal sem resultado (processo caiu entre o forward e as ordens): reenvia com o
+    mesmo signal_id (orderLinkIds idempotentes; o que já tinha entrado volta como duplicado/ok)."""
+    for (signal_id, target), rec in list(journal.pending.items()):
+        age = time.time() - rec.ts
+        if age > config.JOURNAL_REPLAY_MAX_AGE_S:
+            log.warning(f"[journal] plano {signal_id} ({rec.signal.side} {rec.signal.symbol}) de {age:.0f}s atrás "
+                        f"não reenviado (JOURNAL_REPLAY_MAX_AGE_S={config.JOURNAL_REPLAY_MAX_AGE_S:.0f})")
+            journal.outcome(signal_id, target, 0, 0, "expirado no replay")
+        elif target == T_MAIN:
+            log.info(f"[journal] reenviando plano em voo {signal_id} ({rec.signal.side} {rec.signal.symbol})")
+            _spawn(_place_orders(signal_id, rec.orders))
+        elif fanout is not None:
+            log.info(f"[journal] reenviando fan-out em voo {signal_id}")
+            _spawn(_place_fanout(signal_id, rec.signal))
 
 
 # ---------------- handler principal ----------------
 
 async def on_signal_message(text: str, event) -> None:
     try:
-        # Destino dinâmico resolvido pelo telegram_reader (TARGET_MAP)
+        # Decisão de rota pré-compilada pelo telegram_reader (RouteTable)
+        route = getattr(event, "_route", None)
         target = getattr(event, "_target_chat", config.TARGET_CHAT)
         chat_id = int(getattr(event, "chat_id", 0))
         topic_id = getattr(event, "_topic_id", None)
-        chat_username = getattr(event, "_chat_username", None)
 
         # 1) Só age se "parecer trade"
-        if not is_potential_signal(text):
+        with metrics.timer("is_potential_signal"):
+            is_signal = prefilter.is_signal(text)
+        if not is_signal:
+            metrics.inc("not_signal")
             return
 
         # 2) Só age se o tópico estiver permitido no TOPIC_MAP
-        if not _topic_allowed(chat_id, topic_id):
+        if route is None or not route.allowed:
             log.info(f"[skip] trade detectado mas topic_id={topic_id} não está no TOPIC_MAP para chat={chat_id}")
             return
 
-        # 3) Se configurado para "somente notificar", envia aviso e não faz forward
-        notify_only = False
-        # checa por (chat, topic) -> (chat, None) -> (username, topic) -> (username, None)
-        if (chat_id, topic_id) in config.NOTIFY_ONLY:
-            notify_only = True
-        elif (chat_id, None) in config.NOTIFY_ONLY:
-            notify_only = True
-        elif chat_username and (chat_username, topic_id) in config.NOTIFY_ONLY:
-            notify_only = True
-        elif chat_username and (chat_username, None) in config.NOTIFY_ONLY:
-            notify_only = True
+        # Reentrega de mensagem já tratada antes de um restart (journal): não repete forward nem ordens
+        msg_id = event.message.id
+        if journal is not None and journal.seen(chat_id, msg_id):
+            log.info(f"[journal] mensagem {chat_id}/{msg_id} já tratada; ignorando")
+            return
+
+        # 3) Parse (estrito -> flexível), sem exceções no caminho comum
+        with metrics.timer("parse"):
+            signal = parse_signal_any(text)
+        metrics.inc("parsed" if signal is not None else "failed")
+
+        # 4) Dedup entre sources (mesmo sinal repostado): antes do forward
+        dup = None
+        if config.DEDUP_MODE != "off":
+            fp = signal_fingerprint(signal) if signal is not None else text_fingerprint(text)
+            origin = getattr(event, "_chat_title", None) or str(chat_id)
+            dup = dedup.check(fp, origin)
+            if dup is not None:
+                log.info(f"[dedup] duplicado de '{dup[1]}' (há {dup[0]:.0f}s) chat={chat_id} modo={config.DEDUP_MODE}")
+                if config.DEDUP_MODE == "suppress":
+                    return
+
+        # 5) Se configurado para "somente notificar", envia aviso e não faz forward
+        notify_only = route.notify_only
 
         if notify_only:
             chat_title = getattr(event, "_chat_title", "Origem")
             topic_title = getattr(event, "_topic_title", None)
             topic_str = f" | tópico: {topic_title}" if topic_title else ""
-            await event.client.send_message(
-                target,
+            routed = outbound.send_message(
+                event.client, target,
                 f"🔔 Nova mensagem detectada em {chat_title}{topic_str}."
             )
         else:
             # Reencaminhar a mensagem original (com mídia) para o destino
-            # (equivalente ao forward do Telegram)
-            await event.client.forward_messages(
-                entity=target,
+            # (equivalente ao forward do Telegram). Enfileirado por destino: a ordem
+            # forward -> extras é garantida pela fila, sem esperar o envio aqui.
+            routed = outbound.forward_messages(
+                event.client, target,
                 messages=event.message,
                 from_peer=event.chat_id
             )
-
-        # 4) Extras: tenta parse (estrito -> flexível)
-        parsed_ok = True
-        try:
-            signal = parse_signal(text)
-        except Exception:
-            try:
-                signal = parse_signal_flexible(text)
-            except Exception:
-                parsed_ok = False
+        if journal is not None:
+            _journal_when_sent(routed, chat_id, msg_id)
+
+        # Duplicado (modo annotate): avisa no destino e não repete Gemini nem ordens
+        if dup is not None:
+            outbound.send_message(
+                event.client, target,
+                f"♻️ Sinal duplicado de {dup[1]} (há {dup[0]:.0f}s) — ordens não reenviadas."
+            )
+            return
 
         # Se não conseguiu parsear, ainda assim envie um extra curtinho
-        if not parsed_ok:
-            await event.client.send_message(
-                target,
+        if signal is None:
+            outbound.send_message(
+                event.client, target,
                 "⚠️ Sinal detectado, mas não consegui interpretar os campos (formato não suportado)."
             )
             return
 
-        # 5) Validação local (regras determinísticas)
-        issues = local_validate(signal)
+        # 6) Validação local (regras determinísticas)
+        with metrics.timer("local_validate"):
+            issues = local_validate(signal)
 
-        # 6) Profile + alocação
+        # 7) Profile + alocação
         profile = choose_tp_profile(
             signal=signal,
             default_profile=config.TP_PROFILE,
@@ -126,9 +279,6 @@ async def on_signal_message(text: str, event) -> None:
         )
         alloc = alloc_for_signal(signal, profile)
 
-        # 7) Observações do Gemini (opcional)
-        note = gemini_validate(signal, text)
-
         # 8) Plano de ordens (mock)
         cfg = PlanConfig(
             tp_alloc=alloc,
@@ -138,46 +288,92 @@ async def on_signal_message(text: str, event) -> None:
             qty_precision=config.QTY_PRECISION,
             use_post_only=True
         )
-        orders: List[Order] = build_order_plan(signal, cfg, symbol_suffix=config.SYMBOL_SUFFIX)
-
-        # 9) Monta os EXTRAS (sem nome de chat/tópico)
-        parts = []
-
-        if issues:
-            parts.append("⚠️ **Validação local encontrou problemas:**\n- " + "\n- ".join(issues))
-        else:
-            parts.append("✅ **Validação local OK.**")
-
-        if note:
-            parts.append("🤖 **Gemini:** " + note)
-
-        parts.append(f"📌 **Profile escolhido:** {profile}")
-        parts.append(f"📊 **Sinal parseado:**\n`{signal}`")
-
-        plan_txt = "\n".join(str(o) for o in orders)
-        parts.append("🧾 **Plano de ordens (mock):**\n```\n" + plan_txt + "\n```")
-
-        final_msg = "\n\n".join(parts)
-
-        # 10) Envia os extras (em uma segunda mensagem, logo após o forward)
-        await event.client.send_message(target, final_msg)
-
-        # (Mock) envio para Bybit – substitua quando integrar de verdade
-        bybit.place_orders(orders)
+        with metrics.timer("build_order_plan"):
+            orders: List[Order] = build_order_plan(signal, cfg, symbol_suffix=config.SYMBOL_SUFFIX,
+                                                     instruments=instruments)
+
+        # 9) Envia os EXTRAS já (sem a nota do Gemini), logo após o forward
+        sent_fut = outbound.send_message(event.client, target, _build_extras(issues, None, profile, signal, orders))
+
+        # 10) Observações do Gemini (opcional) chegam depois e editam a mensagem já enviada
+        _spawn(_edit_with_gemini_note(target, sent_fut, text, issues, profile, signal, orders))
+
+        # 11) Ordens na Bybit em background (batch + retry idempotente pelo id do sinal);
+        #     o plano vai para o journal antes, o resultado quando a execução termina
+        signal_id = _signal_id(chat_id, msg_id, signal)
+        if journal is not None:
+            journal.plan(chat_id, msg_id, signal_id, signal, orders,
+                         targets=(1 << T_MAIN) | ((1 << T_FANOUT) if fanout is not None else 0))
+        _spawn(_place_orders(signal_id, orders))
+        if fanout is not None:
+            # subcontas do copy-trading, todas em paralelo
+            _spawn(_place_fanout(signal_id, signal))
 
     except Exception as e:
         target = getattr(event, "_target_chat", config.TARGET_CHAT)
-        await event.client.send_message(target, f"⚠️ Erro ao processar mensagem: {e}")
+        outbound.send_message(event.client, target, f"⚠️ Erro ao processar mensagem: {e}")
         log.exception(e)
 
 
 # ---------------- boot/loop ----------------
 
+def _collect_stats():
+    """Gauges/contadores que já existem nos módulos, expostos no /metrics."""
+    for path, v in PARSE_STATS.items():
+        yield "parse_total", {"path": path}, v
+    for k, v in note_cache.stats.items():
+        yield f"gemini_cache_{k}", {}, v
+    for k, v in dedup.stats.items():
+        yield f"dedup_{k}", {}, v
+    for k, v in fastmap.stats.items():
+        yield f"topics_{k}", {}, v
+    for k, v in bybit.stats.items():
+        yield f"bybit_{k}", {}, v
+    for k, v in order_stream.stats.items():
+        yield f"order_stream_{k}", {}, v
+
+
 async def main():
+    if config.METRICS_PORT:
+        metrics.add_collector(_collect_stats)
+        metrics.add_collector(outbound.collect)
+        metrics.add_collector(order_book.collect)
+        metrics.add_collector(instruments.collect)
+        if fanout is not None:
+            metrics.add_collector(fanout.collect)
+        if journal is not None:
+            metrics.add_collector(journal.collect)
+        metrics.add_collector(routing_reloader.collect)
+        await metrics.start_http(config.METRICS_HOST, config.METRICS_PORT)
+    # metadata dos símbolos: disco agora, refresh (se velho) em background
+    instruments.load()
+    loops = []
+    if config.INSTRUMENTS_TTL_S > 0:
+        loops.append(asyncio.create_task(instruments.refresh_loop()))
+    # journal: mensagens já tratadas + planos em voo de antes de uma queda, antes de ouvir o Telegram
+    if journal is not None:
+        journal.open()
+        loops.append(asyncio.create_task(journal.run()))
+        _replay_pending()
     client = start_listening(on_signal_message)
+    if config.ROUTING_RELOAD_S > 0 and routing_reloader.paths:
+        loops.append(asyncio.create_task(routing_reloader.run()))
     # Garante sessão antes de ficar aguardando eventos
     await ensure_login()
-    await run_forever(client)
+    if bybit.live and config.BYBIT_ORDER_STREAM:
+        loops.append(asyncio.create_task(order_stream.run()))
+    try:
+        await run_forever(client)
+    finally:
+        order_stream.stop()
+        for task in loops:
+            task.cancel()
+        await bybit.close()
+        if fanout is not None:
+            await fanout.close()
+        if journal is not None:
+            journal.close()
+        note_cache.flush()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,280 @@
+# message_store.py
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import StoredMessage
+
+# Bloco (em messages.dat), comprimido com zlib:
+#   n u32 | ids u32[n] | offsets u32[n] (posição de cada registro) | n registros:
+#   <id u32, date u32, topic u32, sender i64, len u32> + texto utf-8
+# A tabela de ids/offsets no começo deixa o acesso por id montar só 1 registro.
+_REC = struct.Struct("<IIIqI")
+_N = struct.Struct("<I")
+# Entrada do índice (index.bin), uma por bloco:
+#   chat i64, stream u32 (tópico exportado; 0 = chat inteiro), first_id, last_id, first_date, last_date,
+#   offset u64, length u32, count u32
+_IDX = struct.Struct("<qIIIIIQII")
+
+DATA_FILE = "messages.dat"
+INDEX_FILE = "index.bin"
+
+
+class BlockRef(tuple):
+    """Entrada do índice (tupla nomeada barata, ordenável por first_id dentro do stream)."""
+    __slots__ = ()
+    chat_id = property(lambda self: self[0])
+    stream = property(lambda self: self[1])
+    first_id = property(lambda self: self[2])
+    last_id = property(lambda self: self[3])
+    first_date = property(lambda self: self[4])
+    last_date = property(lambda self: self[5])
+    offset = property(lambda self: self[6])
+    length = property(lambda self: self[7])
+    count = property(lambda self: self[8])
+
+
+def _encode(records: List[StoredMessage]) -> bytes:
+    n = len(records)
+    head = _N.size + 8 * n
+    ids, offsets, parts, pos = array("I"), array("I"), [], head
+    for r in records:
+        text = (r.text or "").encode("utf-8")
+        ids.append(r.id)
+        offsets.append(pos)
+        parts.append(_REC.pack(r.id, r.date, r.topic_id or 0, r.sender_id or 0, len(text)))
+        parts.append(text)
+        pos += _REC.size + len(text)
+    return zlib.compress(_N.pack(n) + ids.tobytes() + offsets.tobytes() + b"".join(parts), 6)
+
+
+def _record(chat_id: int, raw: bytes, pos: int) -> Tuple[StoredMessage, int]:
+    mid, date, topic, sender, n = _REC.unpack_from(raw, pos)
+    pos += _REC.size
+    return StoredMessage(chat_id, topic, mid, date, sender, raw[pos:pos + n].decode("utf-8")), pos + n
+
+
+def _decode(ref: BlockRef, blob: bytes) -> List[StoredMessage]:
+    raw = zlib.decompress(blob)
+    out, chat = [], ref.chat_id
+    pos = _N.size + 8 * _N.unpack_from(raw)[0]
+    while pos < len(raw):
+        m, pos = _record(chat, raw, pos)
+        out.append(m)
+    return out
+
+
+class _RawBlock:
+    """Bloco descomprimido + tabela de ids (cache do acesso aleatório)."""
+    __slots__ = ("raw", "ids", "offsets")
+
+    def __init__(self, blob: bytes):
+        self.raw = zlib.decompress(blob)
+        n = _N.unpack_from(self.raw)[0]
+        self.ids = array("I", self.raw[_N.size:_N.size + 4 * n])
+        self.offsets = array("I", self.raw[_N.size + 4 * n:_N.size + 8 * n])
+
+
+def read_blocks(path: str, refs: Iterable[BlockRef]) -> Iterator[StoredMessage]:
+    """Lê blocos direto do messages.dat, sem abrir o índice (workers do backtest)."""
+    with open(os.path.join(path, DATA_FILE), "rb") as f:
+        for ref in refs:
+            f.seek(ref.offset)
+            yield from _decode(ref, f.read(ref.length))
+
+
+class MessageStore:
+    """
+    Store local de mensagens exportadas, só de append:
+      - messages.dat: blocos zlib (um por lote exportado) de registros binários;
+      - index.bin:    uma entrada fixa por bloco (chat, stream, faixa de ids/datas, offset).
+    O índice é gravado DEPOIS do bloco: ele é o checkpoint (high-water por (chat, stream)).
+    Se o processo cair no meio, sobra no máximo um bloco órfão no .dat (ignorado) ou uma
+    entrada parcial/sem dados no índice (descartada na abertura).
+    Leitura: sequencial por stream (blocos em ordem de id), por data (bisect nos blocos) ou
+    aleatória por id (bisect nos blocos + tabela de ids do bloco, com LRU de blocos descomprimidos).
+    """
+    def __init__(self, path: str, readonly: bool = False, block_cache: int = 16):
+        self.path = path
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        self.streams: Dict[Tuple[int, int], List[BlockRef]] = {}
+        self._first_ids: Dict[Tuple[int, int], List[int]] = {}
+        self._cache: "OrderedDict[int, _RawBlock]" = OrderedDict()
+        self.block_cache = block_cache
+        self._load_index()
+        mode = "rb" if readonly else "a+b"
+        self._data = open(os.path.join(path, DATA_FILE), mode) if (not readonly or self.streams) else None
+        self._index = None if readonly else open(os.path.join(path, INDEX_FILE), "ab")
+
+    # ---------------- índice ----------------
+
+    def _load_index(self) -> None:
+        idx_path = os.path.join(self.path, INDEX_FILE)
+        data_path = os.path.join(self.path, DATA_FILE)
+        if not os.path.exists(idx_path):
+            return
+        data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        with open(idx_path, "rb") as f:
+            raw = f.read()
+        refs = []
+        for i in range(len(raw) // _IDX.size):
+            ref = BlockRef(_IDX.unpack_from(raw, i * _IDX.size))
+            if ref.offset + ref.length > data_size:
+                break                                   # índice à frente dos dados (queda antes do fsync)
+            refs.append(ref)
+        if refs and not self._block_ok(data_path, refs[-1]):
+            refs.pop()                                  # último bloco com lixo (o adler32 do zlib não bate)
+        for ref in refs:
+            self._add_ref(ref)
+        valid = len(refs) * _IDX.size
+        if valid != len(raw) and not self.readonly:
+            with open(idx_path, "r+b") as f:
+                f.truncate(valid)
+
+    @staticmethod
+    def _block_ok(data_path: str, ref: BlockRef) -> bool:
+        with open(data_path, "rb") as f:
+            f.seek(ref.offset)
+            try:
+                zlib.decompress(f.read(ref.length))
+                return True
+            except zlib.error:
+                return False
+
+    def _add_ref(self, ref: BlockRef) -> None:
+        key = (ref.chat_id, ref.stream)
+        self.streams.setdefault(key, []).append(ref)
+        self._first_ids.setdefault(key, []).append(ref.first_id)
+
+    def high_water(self, chat_id: int, stream: int = 0) -> int:
+        """Maior id já gravado no stream (0 se nunca exportado): o ponto de retomada."""
+        refs = self.streams.get((chat_id, stream))
+        return refs[-1].last_id if refs else 0
+
+    def stats(self) -> Dict[Tuple[int, int], dict]:
+        return {key: {"blocks": len(refs), "messages": sum(r.count for r in refs), "high_water": refs[-1].last_id,
+                      "first_date": refs[0].first_date, "last_date": refs[-1].last_date}
+                for key, refs in self.streams.items()}
+
+    # ---------------- escrita ----------------
+
+    def append(self, chat_id: int, stream: int, records: List[StoredMessage]) -> int:
+        """
+        Grava um lote (ids crescentes) como um bloco. Ids <= high-water são descartados,
+        então reexportar um trecho depois de uma queda não duplica. Retorna quantos entraram.
+        """
+        hw = self.high_water(chat_id, stream)
+        records = [r for r in records if r.id > hw]
+        if not records:
+            return 0
+        records.sort(key=lambda r: r.id)
+        blob = _encode(records)
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(blob)
+        self._data.flush()
+        ref = BlockRef((chat_id, stream, records[0].id, records[-1].id,
+                        min(r.date for r in records), max(r.date for r in records),
+                        offset, len(blob), len(records)))
+        self._index.write(_IDX.pack(*ref))
+        self._index.flush()
+        self._add_ref(ref)
+        return len(records)
+
+    def sync(self) -> None:
+        """fsync dos dados antes do índice (o índice nunca aponta para bytes que não chegaram ao disco)."""
+        if self._data is not None and not self.readonly:
+            os.fsync(self._data.fileno())
+        if self._index is not None:
+            os.fsync(self._index.fileno())
+
+    def close(self) -> None:
+        if not self.readonly:
+            self.sync()
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+
+    # ---------------- leitura ----------------
+
+    def _raw_block(self, ref: BlockRef) -> _RawBlock:
+        block = self._cache.get(ref.offset)
+        if block is not None:
+            self._cache.move_to_end(ref.offset)
+            return block
+        self._data.seek(ref.offset)
+        block = self._cache[ref.offset] = _RawBlock(self._data.read(ref.length))
+        while len(self._cache) > self.block_cache:
+            self._cache.popitem(last=False)
+        return block
+
+    def get(self, chat_id: int, msg_id: int, stream: int = 0) -> Optional[StoredMessage]:
+        """Acesso aleatório por id: bisect nos blocos + bisect na tabela de ids do bloco."""
+        key = (chat_id, stream)
+        refs = self.streams.get(key)
+        if not refs:
+            return None
+        i = bisect_right(self._first_ids[key], msg_id) - 1
+        if i < 0 or msg_id > refs[i].last_id:
+            return None
+        block = self._raw_block(refs[i])
+        j = bisect_left(block.ids, msg_id)
+        if j == len(block.ids) or block.ids[j] != msg_id:
+            return None
+        return _record(chat_id, block.raw, block.offsets[j])[0]
+
+    def iter_stream(self, chat_id: int, stream: int = 0, since: Optional[int] = None,
+                    until: Optional[int] = None, topic_id: Optional[int] = None) -> Iterator[StoredMessage]:
+        """
+        Mensagens de um stream em ordem de id, opcionalmente entre datas (epoch s, [since, until)).
+        topic_id filtra pelo tópico de cada mensagem (útil no stream 0, o chat inteiro).
+        """
+        refs = self.streams.get((chat_id, stream), [])
+        start = 0
+        if since is not None:
+            # blocos em ordem de id ~ ordem de data: pula direto para o 1º que pode conter `since`
+            start = bisect_left([r.last_date for r in refs], since)
+        for ref in refs[start:]:
+            if until is not None and ref.first_date >= until:
+                break
+            for m in self._iter_block(ref):
+                if since is not None and m.date < since:
+                    continue
+                if until is not None and m.date >= until:
+                    continue
+                if topic_id is not None and m.topic_id != topic_id:
+                    continue
+                yield m
+
+    def _iter_block(self, ref: BlockRef) -> List[StoredMessage]:
+        # leitura sequencial não passa pelo LRU (não expulsa os blocos do acesso aleatório)
+        self._data.seek(ref.offset)
+        return _decode(ref, self._data.read(ref.length))
+
+    def messages(self, chat_id: int, topic_id: Optional[int] = None, since: Optional[int] = None,
+                 until: Optional[int] = None) -> Iterator[StoredMessage]:
+        """Um chat (ou um tópico dele): usa o stream do tópico se foi exportado à parte, senão filtra o chat inteiro."""
+        if topic_id and (chat_id, topic_id) in self.streams:
+            yield from self.iter_stream(chat_id, topic_id, since, until)
+        else:
+            yield from self.iter_stream(chat_id, 0, since, until, topic_id=topic_id)
+
+    def refs_in_file_order(self) -> List[BlockRef]:
+        return sorted((r for refs in self.streams.values() for r in refs), key=lambda r: r.offset)
+
+    def iter_all(self) -> Iterator[StoredMessage]:
+        """Varredura sequencial do arquivo inteiro (mais rápida; sem ordem entre chats)."""
+        for ref in self.refs_in_file_order():
+            yield from self._iter_block(ref)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
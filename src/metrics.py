@@ -0,0 +1,122 @@
+# metrics.py
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+log = logging.getLogger("metrics")
+
+# Limites (segundos) dos buckets: de 50µs (parse/lookup) até 30s (Gemini/FloodWait)
+BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# coletor: () -> iterável de (nome_métrica, {label: valor}, valor)
+Collector = Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]
+
+
+class Metrics:
+    """
+    Histogramas de latência por estágio + contadores, em memória (sem lock: tudo roda no event loop).
+    render() gera o formato texto do Prometheus; start_http() serve em /metrics.
+    """
+    def __init__(self, prefix: str = "forwarder"):
+        self.prefix = prefix
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._collectors: List[Collector] = []
+
+    def observe(self, stage: str, seconds: float) -> None:
+        h = self.stages.get(stage)
+        if h is None:
+            h = self.stages[stage] = Histogram()
+        h.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def inc(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_collector(self, fn: Collector) -> None:
+        """Gauges calculados na hora do scrape (ex.: profundidade das filas de saída)."""
+        self._collectors.append(fn)
+
+    # ---------------- exposição ----------------
+
+    def render(self) -> str:
+        p = self.prefix
+        out = [f"# TYPE {p}_stage_seconds histogram"]
+        for stage, h in sorted(self.stages.items()):
+            acc = 0
+            for le, c in zip(BUCKETS, h.counts):
+                acc += c
+                out.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{le:g}"}} {acc}')
+            out.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            out.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+            out.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+        out.append(f"# TYPE {p}_messages_total counter")
+        for name, v in sorted(self.counters.items()):
+            out.append(f'{p}_messages_total{{result="{name}"}} {v}')
+
+        for fn in self._collectors:
+            try:
+                for name, labels, value in fn():
+                    lbl = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                    out.append(f"{p}_{name}{{{lbl}}} {value}" if lbl else f"{p}_{name} {value}")
+            except Exception as e:
+                log.error(f"[metrics] coletor falhou: {e}")
+        return "\n".join(out) + "\n"
+
+    async def start_http(self, host: str, port: int):
+        """Servidor HTTP mínimo (GET /metrics) no próprio event loop."""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request_line = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                path = request_line.split()[1] if len(request_line.split()) > 1 else b"/"
+                if path == b"/metrics":
+                    body, status = self.render().encode("utf-8"), b"200 OK"
+                else:
+                    body, status = b"not found\n", b"404 Not Found"
+                writer.write(b"HTTP/1.1 " + status + b"\r\n"
+                             b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                             b"Connection: close\r\n\r\n" + body)
+                await writer.drain()
+            except Exception as e:
+                log.error(f"[metrics] erro no scrape: {e}")
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        log.info(f"[metrics] servindo em http://{host}:{port}/metrics")
+        return server
+
+
+metrics = Metrics()
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 
 @dataclass
@@ -24,6 +24,15 @@ class PlanConfig:
     qty_precision: int = 4
     use_post_only: bool = True
 
+@dataclass
+class AccountConfig:
+    account_id: str                       # subconta (copy-trading)
+    balance_usdt: float
+    risk_pct: float
+    profile: str = "50_25_25"             # perfil de alocação dos TPs (helpers._alloc_by_profile)
+    api_key: Optional[str] = None
+    api_secret: Optional[str] = field(default=None, repr=False)
+
 @dataclass
 class Order:
     type: str                # "LIMIT" / "MARKET" / "STOP"
@@ -34,3 +43,48 @@ class Order:
     tag: str                 # "ENTRY" / "TP1"... / "SL"
     reduce_only: bool = False
     post_only: bool = False
+
+@dataclass
+class InstrumentInfo:
+    symbol: str              # "ETHUSDT"
+    tick_size: float         # passo de preço
+    qty_step: float          # passo de quantidade
+    min_qty: float
+    max_qty: float           # máx. por ordem limit
+    min_notional: float = 0.0
+    price_decimals: int = 2  # casas do tick_size/qty_step (arredonda sem lixo de float)
+    qty_decimals: int = 4
+
+@dataclass
+class OrderState:
+    order_link_id: str
+    order_id: str
+    symbol: str
+    side: str                # "Buy" / "Sell"
+    status: str              # orderStatus da Bybit: New / PartiallyFilled / Filled / Cancelled / Untriggered ...
+    price: float
+    qty: float
+    cum_exec_qty: float = 0.0
+    avg_price: float = 0.0
+    updated_ms: int = 0      # updatedTime da Bybit (ms); descarta update mais velho que o estado
+    signal_id: Optional[str] = None
+    tag: Optional[str] = None  # "ENTRY" / "TP1"... / "SL"
+
+@dataclass
+class PositionState:
+    symbol: str
+    side: str                # "Buy" / "Sell" / "" (sem posição)
+    size: float
+    entry_price: float
+    unrealised_pnl: float = 0.0
+    position_idx: int = 0
+    updated_ms: int = 0
+
+@dataclass
+class StoredMessage:
+    chat_id: int             # id marcado (-100...)
+    topic_id: int            # top_msg_id do tópico (0 = sem tópico)
+    id: int
+    date: int                # epoch (s)
+    sender_id: int
+    text: str
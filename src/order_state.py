@@ -0,0 +1,358 @@
+# order_state.py
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+
+from bybit_client import BybitClient, split_link_id
+from models import OrderState, PositionState
+from metrics import metrics
+
+log = logging.getLogger("order_state")
+
+OPEN_STATUSES = {"Created", "New", "PartiallyFilled", "Untriggered", "Triggered"}
+# stopOrderType das ordens de TP/SL que a Bybit cria a partir da perna (sem orderLinkId nosso)
+_CHILD_KINDS = {"TakeProfit": "TP", "PartialTakeProfit": "TP", "StopLoss": "SL", "PartialStopLoss": "SL"}
+
+
+def _f(v) -> float:
+    try:
+        return float(v) if v not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class OrderStateBook:
+    """
+    Estado vivo de ordens e posições (em memória, sem lock: tudo roda no event loop).
+      - orders:      orderLinkId -> OrderState       (O(1))
+      - by_order_id: orderId -> orderLinkId          (execuções sem orderLinkId)
+      - by_signal:   signal_id -> {tag: orderLinkId} (O(1) "o TP1 do sinal X executou?")
+                     TP/SL presos às pernas ENTRYn chegam sem orderLinkId (chave = orderId) e são
+                     ligados à perna por (símbolo, TP/SL, trigger, qty): TP de ENTRYn -> "TPn",
+                     SL de ENTRYn -> "SLn", SL da perna ENTRY (sobra sem TP) -> "SL"
+      - positions:   (symbol, positionIdx) -> PositionState
+      - exec_totals: orderLinkId -> [qty, valor] das execuções aplicadas (execId único)
+    Cada update traz updatedTime; update mais velho que o estado atual é descartado, então
+    frames do WebSocket e snapshot REST podem chegar em qualquer ordem.
+    """
+    def __init__(self, max_exec_ids: int = 10000):
+        self.orders: Dict[str, OrderState] = {}
+        self.by_order_id: Dict[str, str] = {}
+        self.by_signal: Dict[str, Dict[str, str]] = {}
+        self.positions: Dict[Tuple[str, int], PositionState] = {}
+        self.exec_totals: Dict[str, List[float]] = {}
+        # (symbol, "TP"/"SL", trigger, qty) -> [(signal_id, tag)] das pernas à espera do TP/SL (FIFO)
+        self._awaiting: Dict[Tuple[str, str, float, float], List[Tuple[str, str]]] = {}
+        self._parent_keys: Dict[str, List[Tuple[Tuple[str, str, float, float], str]]] = {}  # perna -> (chave, tag)
+        self._exec_ids: "OrderedDict[str, None]" = OrderedDict()   # execuções já aplicadas (dedup)
+        self.max_exec_ids = max_exec_ids
+        self.stats: Dict[str, int] = {"order_updates": 0, "executions": 0, "position_updates": 0,
+                                      "stale": 0, "reconciles": 0, "unknown": 0}
+
+    # ---------------- lookups (O(1)) ----------------
+
+    def get(self, link_id: str) -> Optional[OrderState]:
+        return self.orders.get(link_id)
+
+    def get_by_order_id(self, order_id: str) -> Optional[OrderState]:
+        link = self.by_order_id.get(order_id)
+        return self.orders.get(link) if link else None
+
+    def orders_for_signal(self, signal_id: str) -> Dict[str, OrderState]:
+        """tag -> OrderState das pernas conhecidas do sinal."""
+        return {tag: self.orders[link] for tag, link in self.by_signal.get(signal_id, {}).items()}
+
+    def leg(self, signal_id: str, tag: str) -> Optional[OrderState]:
+        link = self.by_signal.get(signal_id, {}).get(tag)
+        return self.orders.get(link) if link else None
+
+    def is_filled(self, signal_id: str, tag: str) -> bool:
+        o = self.leg(signal_id, tag)
+        return o is not None and o.status == "Filled"
+
+    def position(self, symbol: str, position_idx: int = 0) -> Optional[PositionState]:
+        return self.positions.get((symbol, position_idx))
+
+    def open_orders(self) -> List[OrderState]:
+        return [o for o in self.orders.values() if o.status in OPEN_STATUSES]
+
+    # ---------------- updates ----------------
+
+    def apply_order(self, row: dict) -> bool:
+        link = row.get("orderLinkId") or row.get("orderId")
+        if not link:
+            return False
+        updated = int(row.get("updatedTime") or row.get("createdTime") or 0)
+        cur = self.orders.get(link)
+        if cur is not None and updated and updated < cur.updated_ms:
+            self.stats["stale"] += 1
+            return False
+
+        signal_id, tag = split_link_id(row.get("orderLinkId") or "")
+        if not signal_id:
+            if cur is not None and cur.signal_id:
+                signal_id, tag = cur.signal_id, cur.tag
+            else:
+                signal_id, tag = self._link_child(row)
+        state = OrderState(
+            order_link_id=link,
+            order_id=row.get("orderId") or (cur.order_id if cur else ""),
+            symbol=row.get("symbol") or (cur.symbol if cur else ""),
+            side=row.get("side") or (cur.side if cur else ""),
+            status=row.get("orderStatus") or (cur.status if cur else "New"),
+            price=_f(row.get("price") or row.get("triggerPrice")),
+            qty=_f(row.get("qty")),
+            cum_exec_qty=_f(row.get("cumExecQty")),
+            avg_price=_f(row.get("avgPrice")),
+            updated_ms=updated,
+            signal_id=signal_id,
+            tag=tag,
+        )
+        self._merge_executions(state)
+        self.orders[link] = state
+        if state.order_id:
+            self.by_order_id[state.order_id] = link
+        if signal_id:
+            self.by_signal.setdefault(signal_id, {})[tag] = link
+            if row.get("orderLinkId"):
+                self._track_parent(link, row, state)
+        self.stats["order_updates"] += 1
+        return True
+
+    @staticmethod
+    def _child_key(symbol: str, kind: str, trigger, qty) -> Tuple[str, str, float, float]:
+        return symbol, kind, round(_f(trigger), 10), round(_f(qty), 10)
+
+    def _track_parent(self, link: str, row: dict, state: OrderState) -> None:
+        """Perna com takeProfit/stopLoss presos: guarda as chaves pelas quais o TP/SL dela vai chegar."""
+        keys = self._parent_keys.get(link)
+        if keys is None:
+            n = state.tag[len("ENTRY"):] if state.tag and state.tag.startswith("ENTRY") else None
+            if n is None or not (row.get("takeProfit") or row.get("stopLoss")):
+                return
+            keys = []
+            for kind, field in (("TP", "takeProfit"), ("SL", "stopLoss")):
+                if _f(row.get(field)):
+                    key = self._child_key(state.symbol, kind, row[field], state.qty)
+                    self._awaiting.setdefault(key, []).append((state.signal_id, kind + n))
+                    keys.append((key, kind + n))
+            self._parent_keys[link] = keys
+        elif state.status in ("Cancelled", "Rejected", "Deactivated") and not state.cum_exec_qty:
+            # não executou: TP/SL dela nunca vão existir
+            self._drop_parent(link, state)
+
+    def _drop_parent(self, link: str, state: OrderState) -> None:
+        for key, tag in self._parent_keys.pop(link, ()):
+            waiting = self._awaiting.get(key)
+            if waiting and (state.signal_id, tag) in waiting:
+                waiting.remove((state.signal_id, tag))
+                if not waiting:
+                    del self._awaiting[key]
+
+    def _link_child(self, row: dict) -> Tuple[Optional[str], Optional[str]]:
+        """TP/SL criado pela Bybit (sem orderLinkId) -> (signal_id, "TPn"/"SLn") da perna que o gerou."""
+        kind = _CHILD_KINDS.get(row.get("stopOrderType") or "")
+        if kind is None:
+            return None, None
+        key = self._child_key(row.get("symbol") or "", kind, row.get("triggerPrice"), row.get("qty"))
+        waiting = self._awaiting.get(key)
+        if not waiting:
+            return None, None
+        signal_id, tag = waiting.pop(0)
+        if not waiting:
+            del self._awaiting[key]
+        return signal_id, tag
+
+    def _merge_executions(self, o: OrderState) -> None:
+        """
+        cumExecQty nunca diminui: fica o maior entre o do frame/snapshot e a soma das execuções
+        (execução que chega antes do frame de 'order' adianta o estado; a que chega depois de um
+        frame que já a contou não soma de novo).
+        """
+        acc = self.exec_totals.get(o.order_link_id)
+        if acc is not None and acc[0] > o.cum_exec_qty:
+            o.cum_exec_qty = acc[0]
+            o.avg_price = acc[1] / acc[0]
+        if o.qty and o.cum_exec_qty >= o.qty:
+            o.status = "Filled"
+        elif o.cum_exec_qty > 0 and o.status in ("New", "Created"):
+            o.status = "PartiallyFilled"
+
+    def apply_execution(self, row: dict) -> bool:
+        """Execução: soma por ordem (dedup por execId); vale enquanto passar do que o último frame de 'order' contou."""
+        exec_id = row.get("execId")
+        if exec_id:
+            if exec_id in self._exec_ids:
+                return False
+            self._exec_ids[exec_id] = None
+            while len(self._exec_ids) > self.max_exec_ids:
+                self._exec_ids.popitem(last=False)
+        link = row.get("orderLinkId") or self.by_order_id.get(row.get("orderId") or "")
+        o = self.orders.get(link) if link else None
+        if o is None:
+            return False
+        qty, price = _f(row.get("execQty")), _f(row.get("execPrice"))
+        acc = self.exec_totals.setdefault(o.order_link_id, [0.0, 0.0])
+        acc[0] += qty
+        acc[1] += qty * price
+        self._merge_executions(o)
+        self.stats["executions"] += 1
+        return True
+
+    def apply_position(self, row: dict) -> bool:
+        key = (row.get("symbol") or "", int(row.get("positionIdx") or 0))
+        updated = int(row.get("updatedTime") or 0)
+        cur = self.positions.get(key)
+        if cur is not None and updated and updated < cur.updated_ms:
+            self.stats["stale"] += 1
+            return False
+        self.positions[key] = PositionState(
+            symbol=key[0],
+            side=row.get("side") or "",
+            size=_f(row.get("size")),
+            entry_price=_f(row.get("entryPrice") or row.get("avgPrice")),
+            unrealised_pnl=_f(row.get("unrealisedPnl")),
+            position_idx=key[1],
+            updated_ms=updated,
+        )
+        self.stats["position_updates"] += 1
+        return True
+
+    def apply_frame(self, frame: dict) -> int:
+        """Frame do WebSocket privado ({"topic": "order"|"execution"|"position"[.categoria], "data": [...]})."""
+        topic = (frame.get("topic") or "").split(".", 1)[0]
+        apply = {"order": self.apply_order, "execution": self.apply_execution,
+                 "position": self.apply_position}.get(topic)
+        if apply is None:
+            return 0
+        return sum(1 for row in frame.get("data") or () if apply(row))
+
+    def reconcile(self, open_orders: Iterable[dict], positions: Iterable[dict],
+                  history: Iterable[dict] = ()) -> Set[str]:
+        """
+        Aplica o snapshot REST: ordens abertas + posições (+ histórico recente para as que fecharam
+        enquanto o stream estava fora). Retorna as ordens que continuam sem estado conhecido
+        (abertas aqui, ausentes no snapshot e no histórico) — ficam com status "Unknown".
+        """
+        self.stats["reconciles"] += 1
+        seen = set()
+        for row in list(open_orders) + list(history):
+            self.apply_order(row)
+            seen.add(row.get("orderLinkId") or row.get("orderId"))
+        for row in positions:
+            self.apply_position(row)
+        unknown = {o.order_link_id for o in self.open_orders() if o.order_link_id not in seen}
+        for link in unknown:
+            self.orders[link].status = "Unknown"
+        self.stats["unknown"] += len(unknown)
+        return unknown
+
+    def collect(self):
+        """Coletor para metrics.add_collector."""
+        yield "orders_tracked", {}, len(self.orders)
+        yield "orders_open", {}, sum(1 for o in self.orders.values() if o.status in OPEN_STATUSES)
+        yield "positions_open", {}, sum(1 for p in self.positions.values() if p.size)
+        for k, v in self.stats.items():
+            yield f"order_book_{k}", {}, v
+
+
+class BybitPrivateStream:
+    """
+    WebSocket privado v5 (order / execution / position) alimentando um OrderStateBook.
+    A cada (re)conexão: auth -> subscribe -> UM snapshot REST (reconcile) -> aplica frames.
+    Reconecta com backoff exponencial; ping a cada 20s (a Bybit derruba sem ping).
+    """
+    def __init__(self, client: BybitClient, book: OrderStateBook,
+                 topics: Tuple[str, ...] = ("order", "execution", "position"), ping_s: float = 20.0):
+        self.client = client
+        self.book = book
+        self.topics = topics
+        self.ping_s = ping_s
+        self.connected = asyncio.Event()
+        self._stopped = False
+        self.stats: Dict[str, int] = {"connects": 0, "frames": 0, "errors": 0}
+
+    async def _op(self, ws, payload: dict) -> None:
+        """Envia um op e espera a resposta dele, aplicando frames que chegarem no meio."""
+        await ws.send_json(payload)
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                raise ConnectionError(f"WebSocket fechado durante {payload['op']}")
+            data = json.loads(msg.data)
+            if "topic" in data:
+                self._apply(data)
+            elif data.get("op") == payload["op"]:
+                if not data.get("success", False):
+                    raise PermissionError(f"{payload['op']} recusado: {data.get('ret_msg')}")
+                return
+        raise ConnectionError(f"WebSocket fechado durante {payload['op']}")
+
+    def _apply(self, frame: dict) -> None:
+        self.stats["frames"] += 1
+        with metrics.timer("order_frame"):
+            self.book.apply_frame(frame)
+
+    async def _reconcile(self) -> None:
+        c = self.client
+        with metrics.timer("order_reconcile"):
+            open_orders, positions = await asyncio.gather(
+                c.fetch_list("/v5/order/realtime", {"settleCoin": c.settle_coin}),
+                c.fetch_list("/v5/position/list", {"settleCoin": c.settle_coin}),
+            )
+            live = {r.get("orderLinkId") or r.get("orderId") for r in open_orders}
+            history = []
+            if any(o.order_link_id not in live for o in self.book.open_orders()):
+                # alguma ordem aberta sumiu enquanto o stream estava fora: 1 página do histórico
+                history = await c.fetch_list("/v5/order/history", {}, max_pages=1)
+            unknown = self.book.reconcile(open_orders, positions, history)
+        log.info(f"[order-stream] snapshot: abertas={len(open_orders)} posições={len(positions)} "
+                 f"histórico={len(history)} sem_estado={len(unknown)}")
+
+    async def _ping(self, ws) -> None:
+        while True:
+            await asyncio.sleep(self.ping_s)
+            await ws.send_json({"op": "ping"})
+
+    async def run(self) -> None:
+        backoff = 1.0
+        while not self._stopped:
+            try:
+                async with self.client._get_session().ws_connect(self.client.ws_private_url) as ws:
+                    await self._op(ws, {"op": "auth", "args": self.client.ws_auth_args()})
+                    await self._op(ws, {"op": "subscribe", "args": list(self.topics)})
+                    await self._reconcile()
+                    self.stats["connects"] += 1
+                    self.connected.set()
+                    backoff = 1.0
+                    log.info(f"[order-stream] conectado em {self.client.ws_private_url} tópicos={list(self.topics)}")
+                    ping = asyncio.create_task(self._ping(ws))
+                    try:
+                        async for msg in ws:
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            data = json.loads(msg.data)
+                            if "topic" in data:
+                                self._apply(data)
+                    finally:
+                        ping.cancel()
+                        self.connected.clear()
+            except asyncio.CancelledError:
+                raise
+            except PermissionError as e:
+                self.stats["errors"] += 1
+                log.error(f"[order-stream] {e}")
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.warning(f"[order-stream] conexão caiu: {e}")
+            if self._stopped:
+                break
+            log.info(f"[order-stream] reconectando em {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def stop(self) -> None:
+        self._stopped = True
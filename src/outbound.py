@@ -0,0 +1,157 @@
+# outbound.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+from telethon.errors import FloodWaitError, ServerError
+
+from metrics import metrics
+
+log = logging.getLogger("outbound")
+
+# Erros transitórios: tenta de novo (mantendo a ordem) até max_retries
+_TRANSIENT = (ServerError, ConnectionError, asyncio.TimeoutError, OSError)
+
+
+class _Job:
+    __slots__ = ("factory", "future", "kind", "enqueued_at", "attempts")
+
+    def __init__(self, factory: Callable[[], Awaitable[Any]], future: asyncio.Future, kind: str):
+        self.factory = factory
+        self.future = future
+        self.kind = kind
+        self.enqueued_at = time.perf_counter()
+        self.attempts = 0
+
+
+class _Destination:
+    """Fila + token bucket de UM destino. Um worker por destino, só enquanto houver fila."""
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate = rate_per_s
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.queue: Deque[_Job] = deque()
+        self.worker: asyncio.Task | None = None
+        self.parked_until = 0.0
+        self.stats: Dict[str, float] = {"sent": 0, "failed": 0, "retries": 0, "flood_waits": 0,
+                                        "last_latency_s": 0.0, "max_latency_s": 0.0}
+
+    def _wait_for_token(self) -> float:
+        """Consome 1 token e retorna 0, ou retorna quantos segundos faltam para o próximo."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class OutboundScheduler:
+    """
+    Agendador de envios para o Telegram, por destino:
+      - fila + token bucket por chat de destino;
+      - FloodWait estaciona SÓ o destino afetado e repete o mesmo envio (ordem preservada);
+      - outros destinos seguem na velocidade normal.
+    """
+    def __init__(self, rate_per_s: float = 1.0, burst: int = 3, max_retries: int = 3):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_retries = max_retries
+        self._dests: Dict[Any, _Destination] = {}
+
+    # ---------------- API ----------------
+
+    def submit(self, target, factory: Callable[[], Awaitable[Any]], kind: str = "send") -> asyncio.Future:
+        """
+        Enfileira factory() para o destino; o future resolve com o retorno do envio.
+        kind nomeia o estágio nas métricas (send / forward / edit).
+        """
+        dest = self._dests.get(target)
+        if dest is None:
+            dest = self._dests[target] = _Destination(self.rate_per_s, self.burst)
+        fut = asyncio.get_running_loop().create_future()
+        dest.queue.append(_Job(factory, fut, kind))
+        if dest.worker is None:
+            dest.worker = asyncio.create_task(self._run(target, dest))
+        return fut
+
+    def send_message(self, client, target, text: str) -> asyncio.Future:
+        return self.submit(target, lambda: client.send_message(target, text))
+
+    def forward_messages(self, client, target, messages, from_peer) -> asyncio.Future:
+        return self.submit(target, lambda: client.forward_messages(entity=target, messages=messages, from_peer=from_peer),
+                           kind="forward")
+
+    def edit_message(self, target, message, text: str) -> asyncio.Future:
+        return self.submit(target, lambda: message.edit(text), kind="edit")
+
+    def queue_depth(self) -> Dict[Any, int]:
+        return {t: len(d.queue) for t, d in self._dests.items()}
+
+    def collect(self):
+        """Coletor para metrics.add_collector: fila e contadores por destino."""
+        for t, d in self._dests.items():
+            yield "outbound_queue_depth", {"target": str(t)}, len(d.queue)
+            for k in ("sent", "failed", "retries", "flood_waits"):
+                yield f"outbound_{k}", {"target": str(t)}, d.stats[k]
+
+    def stats(self) -> Dict[Any, Dict[str, float]]:
+        return {t: dict(d.stats, queued=len(d.queue), parked_s=max(0.0, d.parked_until - time.monotonic()))
+                for t, d in self._dests.items()}
+
+    # ---------------- worker ----------------
+
+    async def _run(self, target, dest: _Destination) -> None:
+        try:
+            while dest.queue:
+                wait = dest._wait_for_token()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                job = dest.queue[0]
+                t0 = time.perf_counter()
+                try:
+                    result = await job.factory()
+                except FloodWaitError as e:
+                    dest.stats["flood_waits"] += 1
+                    dest.parked_until = time.monotonic() + e.seconds
+                    log.warning(f"[outbound] FloodWait {e.seconds}s em target={target} (fila={len(dest.queue)})")
+                    await asyncio.sleep(e.seconds)
+                    continue
+                except _TRANSIENT as e:
+                    job.attempts += 1
+                    if job.attempts <= self.max_retries:
+                        dest.stats["retries"] += 1
+                        log.warning(f"[outbound] erro transitório em target={target} (tentativa {job.attempts}): {e}")
+                        await asyncio.sleep(min(2 ** job.attempts, 30))
+                        continue
+                    self._fail(target, dest, e)
+                    continue
+                except Exception as e:
+                    self._fail(target, dest, e)
+                    continue
+
+                dest.queue.popleft()
+                metrics.observe(job.kind, time.perf_counter() - t0)
+                latency = time.perf_counter() - job.enqueued_at
+                metrics.observe(f"{job.kind}_queued", latency)
+                dest.stats["sent"] += 1
+                dest.stats["last_latency_s"] = latency
+                dest.stats["max_latency_s"] = max(dest.stats["max_latency_s"], latency)
+                if not job.future.done():
+                    job.future.set_result(result)
+        finally:
+            dest.worker = None
+
+    def _fail(self, target, dest: _Destination, exc: BaseException) -> None:
+        job = dest.queue.popleft()
+        dest.stats["failed"] += 1
+        log.error(f"[outbound] falha ao enviar para target={target}: {exc}")
+        if not job.future.done():
+            job.future.set_exception(exc)
+            job.future.exception()  # já logado; evita "exception was never retrieved"
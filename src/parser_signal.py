@@ -1,6 +1,6 @@
 # parser_signal.py
 import re
-from typing import List, Optional
+from typing import Dict, List, Optional
 from models import TradeSignal
 
 NUM = r"[-+]?\d+(?:[.,]\d+)?"
@@ -8,26 +8,184 @@ NUM = r"[-+]?\d+(?:[.,]\d+)?"
 def _n(x: str) -> float:
     return float(x.replace(",", "."))
 
-def is_potential_signal(text: str) -> bool:
+# --- Pré-filtro "parece um sinal?" ---
+# Palavras-chave por idioma e categoria (fragmentos de regex, sempre casados com \b nas bordas).
+# LONG/SHORT valem para todos os idiomas; o parser exige um dos dois de qualquer forma.
+SIGNAL_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
+    "pt": {
+        "entry": [r"entradas?"],
+        "tp": [r"tps?\d*", r"alvos?"],
+        "sl": [r"sl", r"stops?(?:\s*loss)?"],
+    },
+    "en": {
+        "entry": [r"entry", r"entries"],
+        "tp": [r"tps?\d*", r"targets?", r"take\s*profits?"],
+        "sl": [r"sl", r"stops?(?:\s*loss)?"],
+    },
+    "es": {
+        "entry": [r"entradas?"],
+        "tp": [r"tps?\d*", r"objetivos?"],
+        "sl": [r"sl", r"stops?(?:\s*loss)?"],
+    },
+}
+
+# Pesos: só LONG/SHORT + pelo menos um campo passa do limiar padrão (0.6);
+# sem LONG/SHORT o score máximo é 0.5.
+_SCORE_WEIGHTS: Dict[str, float] = {"side": 0.5, "entry": 0.5 / 3, "tp": 0.5 / 3, "sl": 0.5 / 3}
+
+
+class SignalPrefilter:
+    """
+    Matcher multi-palavra com \b (uma varredura do texto), montado 1x no boot.
+    score() devolve a confiança em [0, 1]; is_signal() compara com o limiar.
+    """
+    def __init__(self, langs=("pt", "en"), min_score: float = 0.6):
+        cats: Dict[str, List[str]] = {"side": [r"long", r"short"], "entry": [], "tp": [], "sl": []}
+        for lang in langs:
+            table = SIGNAL_KEYWORDS.get(str(lang).strip().lower())
+            if not table:
+                continue
+            for cat, words in table.items():
+                for w in words:
+                    if w not in cats[cat]:
+                        cats[cat].append(w)
+        # alternativas mais longas primeiro (ex.: "stop loss" antes de "stop")
+        groups = "|".join(
+            f"(?P<{cat}>{'|'.join(sorted(words, key=len, reverse=True))})"
+            for cat, words in cats.items() if words
+        )
+        self.langs = tuple(langs)
+        self.min_score = min_score
+        # lookahead com as letras iniciais: o sre descarta rápido as posições que não iniciam palavra-chave
+        first = sorted({w[0] for words in cats.values() for w in words})
+        heads = "".join(first).lower() + "".join(first).upper()
+        self._re = re.compile(r"\b(?=[" + heads + r"])(?i:" + groups + r")\b")
+
+    def score(self, text: str) -> float:
+        found = set()
+        for m in self._re.finditer(text):
+            found.add(m.lastgroup)
+            if len(found) == 4:
+                break
+        return sum(_SCORE_WEIGHTS[c] for c in found)
+
+    def is_signal(self, text: str) -> bool:
+        return self.score(text) >= self.min_score
+
+
+_default_prefilter = SignalPrefilter()
+
+
+def is_potential_signal(text: str, prefilter: Optional[SignalPrefilter] = None) -> bool:
     """
     Heurística leve para decidir se o texto parece um 'sinal de trade'.
     Aceita variações como: LONG/SHORT, Entrada, TP/TPs, SL, 'Entradas Escalonadas', etc.
+    Casa palavras inteiras ("sl" não casa "slow", "tp" não casa "http").
     """
-    t = text.lower()
-    has_side = ("long" in t) or ("short" in t)
-    has_entry = ("entrada" in t) or ("entradas escalonadas" in t) or ("entry" in t)
-    has_tp = ("tp" in t) or ("tps" in t)
-    has_sl = ("sl" in t) or ("stop" in t)
-    # exemplos como "Entrada: 0.027 (mercado)" também contam
-    return has_side and (has_entry or has_tp or has_sl)
-
-def parse_signal(text: str) -> TradeSignal:
+    return (prefilter or _default_prefilter).is_signal(text)
+
+# Formato canônico do canal (linhas nessa ordem; Alavancagem e #tags opcionais):
+#   🟢 LONG BTC            (ou "SHORT $BTC/USDT")
+#   Entrada: 61000 - 62000 (pm: 61500)
+#   TPs: 63000, 64000, 65000
+#   SL: 59000
+#   Alavancagem: 5x a 10x
+#   #swing #btc
+_STRICT_RE = re.compile(
+    r"[^\w\n#]*(LONG|SHORT)[ \t]+\$?([A-Z0-9]{2,15})(?:/USDT)?[ \t]*\n\s*"
+    r"Entrada:[ \t]*(" + NUM + r")[ \t]*[-–][ \t]*(" + NUM + r")"
+    r"(?:[ \t]*\((?:pm|média)[ \t]*:[ \t]*(" + NUM + r")\))?[ \t]*\n\s*"
+    r"TPs?:[ \t]*(" + NUM + r"(?:[ \t]*,[ \t]*" + NUM + r")*)[ \t]*\n\s*"
+    r"SL:[ \t]*(" + NUM + r")[ \t]*"
+    r"(?:\n\s*Alavancagem:[ \t]*(" + NUM + r")[ \t]*[xX]"
+    r"(?:[ \t]*(?:a|–|-|to|até)[ \t]*(" + NUM + r")[ \t]*[xX]?)?[ \t]*)?"
+    r"(?:\n\s*(#\w+(?:[ \t]+#\w+)*)[ \t]*)?"
+)
+
+# Contadores de caminho do parse (strict = fast-path, flexible = fallback, failed = nenhum)
+PARSE_STATS: Dict[str, int] = {"strict": 0, "flexible": 0, "failed": 0}
+
+
+def parse_signal(text: str) -> Optional[TradeSignal]:
     """
-    (SEU PARSER ESTRITO ATUAL)
-    Mantém como já estava – não removi nada aqui no seu projeto.
+    Parser estrito do formato canônico (ver _STRICT_RE): um único match ancorado.
+    Retorna None (sem exceção) se o texto não seguir o template,
+    para que o chamador caia no parse_signal_flexible.
     """
-    # ... (seu código atual do parse estrito)
-    raise NotImplementedError  # deixar aqui só para lembrar que já existe no seu arquivo
+    m = _STRICT_RE.fullmatch(text.strip())
+    if not m:
+        return None
+    side, sym, a, b, pm, tps_chunk, sl, lev_a, lev_b, tags_chunk = m.groups()
+
+    a = _n(a); b = _n(b)
+    entry_low, entry_high = min(a, b), max(a, b)
+    entry_pm = _n(pm) if pm else (entry_low + entry_high) / 2.0
+
+    lev_min = lev_max = None
+    if lev_a is not None:
+        lev_min = _n(lev_a)
+        lev_max = _n(lev_b) if lev_b is not None else lev_min
+
+    return TradeSignal(
+        side=side, symbol=sym,
+        entry_low=entry_low, entry_high=entry_high, entry_pm=entry_pm,
+        sl=_n(sl), lev_min=lev_min, lev_max=lev_max,
+        tps=[_n(x) for x in _NUM_RE.findall(tps_chunk)],
+        tags=tags_chunk.split() if tags_chunk else []
+    )
+
+
+def parse_signal_any(text: str) -> Optional[TradeSignal]:
+    """
+    Estrito -> flexível, atualizando PARSE_STATS.
+    Retorna None se nenhum dos dois conseguiu interpretar o texto.
+    """
+    signal = parse_signal(text)
+    if signal is not None:
+        PARSE_STATS["strict"] += 1
+        return signal
+    try:
+        signal = parse_signal_flexible(text)
+    except ValueError:
+        PARSE_STATS["failed"] += 1
+        return None
+    PARSE_STATS["flexible"] += 1
+    return signal
+
+# --- Gramática compilada 1x no import ---
+# Tokenizer: acha as palavras-chave que ancoram cada campo numa única varredura.
+# Cada campo é lido com um match ANCORADO na posição do token (sem rescan do texto).
+# O lookahead por classe de caractere (sem re.I) deixa o sre descartar rápido
+# as posições que não podem iniciar nenhum token.
+_TOKEN_RE = re.compile(
+    r"(?=[LSTEAlsteaſ#])(?i:"
+    r"(?P<side>\b(?:LONG|SHORT)\b)"
+    r"|(?P<s>\bS(?:L|TOP))"
+    r"|(?P<tp>\bTP)"
+    r"|(?P<ent>Entrada)"
+    r"|(?P<lev>Alavancagem)"
+    r"|(?P<tag>#))"
+)
+_SIDE_SYM_RE = re.compile(r"(LONG|SHORT)(?:\s+\$?([A-Z0-9]{2,15}))?", re.I)
+_SYM_USDT_RE = re.compile(r"\b([A-Z0-9]{2,15})USDT\b")
+_SYM_CAPS_RE = re.compile(r"\b(?:LONG|SHORT)\b\s+([A-Z]{2,10})\b")
+_ESC_RE = re.compile(r"Entradas?\s+Escalonadas?\s*:\s*(" + NUM + r")\s*[-–]\s*(" + NUM + r")", re.I)
+_ENT_RE = re.compile(
+    r"Entrada\s*:\s*(" + NUM + r")"
+    r"(?:\s*[-–]\s*(" + NUM + r")\s*(?:\((?:pm|média)\s*:\s*(" + NUM + r")\))?)?",
+    re.I,
+)
+_SL_RE = re.compile(r"SL\s*:\s*(" + NUM + r")", re.I)
+_STOP_RE = re.compile(r"Stop(?:\s*Loss)?\s*:\s*(" + NUM + r")", re.I)
+_TPS_LIST_RE = re.compile(r"TPs?\s*:\s*([^\n\r]+)", re.I)
+_TP_N_RE = re.compile(r"TP\d+\s*:\s*(" + NUM + r")", re.I)
+_LEV_RANGE_RE = re.compile(
+    r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\s*(?:a|–|-|to|até)\s*(" + NUM + r")\s*[xX]?", re.I
+)
+_LEV_ONE_RE = re.compile(r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\b", re.I)
+_TAG_RE = re.compile(r"#\w+")
+_NUM_RE = re.compile(NUM)
+
 
 def parse_signal_flexible(text: str) -> TradeSignal:
     """
@@ -39,30 +197,72 @@ def parse_signal_flexible(text: str) -> TradeSignal:
     - 'TPs: 0.3296, 0.3380, ...' -> lista
     - 'TP1/TP2/TP3 ...' -> lista
     - 'Alavancagem: 3x a 15x' ou 'Alavancagem: 5x'
+
+    Uma única varredura de tokens; vale sempre a PRIMEIRA ocorrência de cada campo.
     """
     raw = text.strip()
 
+    side = sym = None
+    m_esc = m_ent = m_one = m_sl = m_stop = m_tps_list = m_lev1 = m_lev2 = None
+    tp_n: List[float] = []
+    tags: List[str] = []
+    tp_end = tag_end = 0
+
+    for tok in _TOKEN_RE.finditer(raw):
+        kind = tok.lastgroup
+        pos = tok.start()
+        if kind == "side":
+            if side is None or sym is None:
+                m = _SIDE_SYM_RE.match(raw, pos)
+                if side is None:
+                    side = m.group(1).upper()
+                if sym is None and m.group(2):
+                    sym = m.group(2).upper()
+        elif kind == "ent":
+            if m_esc is None:
+                m_esc = _ESC_RE.match(raw, pos)
+            if m_ent is None or m_one is None:
+                m = _ENT_RE.match(raw, pos)
+                if m:
+                    if m_one is None:
+                        m_one = m
+                    if m_ent is None and m.group(2) is not None:
+                        m_ent = m
+        elif kind == "s":
+            if raw[pos + 1] in "lL":
+                if m_sl is None:
+                    m_sl = _SL_RE.match(raw, pos)
+            elif m_stop is None:
+                m_stop = _STOP_RE.match(raw, pos)
+        elif kind == "tp":
+            if m_tps_list is None:
+                m_tps_list = _TPS_LIST_RE.match(raw, pos)
+            if pos >= tp_end:
+                m = _TP_N_RE.match(raw, pos)
+                if m:
+                    tp_n.append(_n(m.group(1)))
+                    tp_end = m.end()
+        elif kind == "lev":
+            if m_lev1 is None:
+                m_lev1 = _LEV_RANGE_RE.match(raw, pos)
+            if m_lev2 is None:
+                m_lev2 = _LEV_ONE_RE.match(raw, pos)
+        elif pos >= tag_end:  # tag
+            m = _TAG_RE.match(raw, pos)
+            if m:
+                tags.append(m.group(0))
+                tag_end = m.end()
+
     # 1) Side e Símbolo
-    m_side = re.search(r"\b(LONG|SHORT)\b", raw, flags=re.I)
-    if not m_side:
+    if side is None:
         raise ValueError("Não encontrei LONG/SHORT.")
-    side = m_side.group(1).upper()
-
-    # símbolos possíveis
-    # ex: LONG $POPCAT/USDT  |  LONG – SOLUSDT  |  LONG SOL USDT
-    sym = None
-    # $COIN/USDT
-    m_sym1 = re.search(r"\b(?:LONG|SHORT)\b\s+\$?([A-Z0-9]{2,15})(?:/USDT|USDT)?", raw, flags=re.I)
-    if m_sym1:
-        sym = m_sym1.group(1).upper()
-    # fallback: pegar palavra em CAPS seguida de USDT
+    # fallbacks raros: palavra em CAPS seguida de USDT / palavra maiúscula após LONG/SHORT
     if not sym:
-        m_sym2 = re.search(r"\b([A-Z0-9]{2,15})USDT\b", raw)
+        m_sym2 = _SYM_USDT_RE.search(raw)
         if m_sym2:
             sym = m_sym2.group(1).upper()
     if not sym:
-        # último recurso: palavra maiúscula de 2-10 letras depois de LONG/SHORT
-        m_sym3 = re.search(r"\b(?:LONG|SHORT)\b\s+([A-Z]{2,10})\b", raw)
+        m_sym3 = _SYM_CAPS_RE.search(raw)
         if m_sym3:
             sym = m_sym3.group(1).upper()
     if not sym:
@@ -70,82 +270,48 @@ def parse_signal_flexible(text: str) -> TradeSignal:
 
     # 2) Entrada / Entradas Escalonadas
     entry_low = entry_high = entry_pm = None
-
-    # Entradas Escalonadas: 173.50-177.00
-    m_esc = re.search(r"Entradas?\s+Escalonadas?\s*:\s*(" + NUM + r")\s*[-–]\s*(" + NUM + r")", raw, flags=re.I)
     if m_esc:
         a = _n(m_esc.group(1)); b = _n(m_esc.group(2))
         entry_low, entry_high = min(a, b), max(a, b)
         entry_pm = (entry_low + entry_high) / 2.0
-
-    # Entrada: a - b (pm: x)  (formato clássico)
-    if entry_pm is None:
-        m_ent = re.search(r"Entrada\s*:\s*(" + NUM + r")\s*[-–]\s*(" + NUM + r")\s*(?:\((?:pm|média)\s*:\s*(" + NUM + r")\))?", raw, flags=re.I)
-        if m_ent:
-            a = _n(m_ent.group(1)); b = _n(m_ent.group(2))
-            entry_low, entry_high = min(a, b), max(a, b)
-            if m_ent.group(3):
-                entry_pm = _n(m_ent.group(3))
-            else:
-                entry_pm = (entry_low + entry_high) / 2.0
-
-    # Entrada: valor único (mercado)
-    if entry_pm is None:
-        m_one = re.search(r"Entrada\s*:\s*(" + NUM + r")", raw, flags=re.I)
-        if m_one:
-            v = _n(m_one.group(1))
-            entry_low = entry_high = entry_pm = v
-
-    if entry_pm is None:
-        # Em falta de 'Entrada', usa média entre TP1 e preço atual? Aqui não: pede explicitamente.
+    elif m_ent:
+        a = _n(m_ent.group(1)); b = _n(m_ent.group(2))
+        entry_low, entry_high = min(a, b), max(a, b)
+        if m_ent.group(3):
+            entry_pm = _n(m_ent.group(3))
+        else:
+            entry_pm = (entry_low + entry_high) / 2.0
+    elif m_one:
+        entry_low = entry_high = entry_pm = _n(m_one.group(1))
+    else:
         raise ValueError("Não consegui ler a Entrada/Entradas Escalonadas.")
 
-    # 3) SL
-    m_sl = re.search(r"\bSL\s*:\s*(" + NUM + r")", raw, flags=re.I)
-    if not m_sl:
-        # aceitar 'Stop:' ou 'Stop Loss:'
-        m_sl = re.search(r"\bStop(?:\s*Loss)?\s*:\s*(" + NUM + r")", raw, flags=re.I)
+    # 3) SL ('SL:' tem prioridade sobre 'Stop:'/'Stop Loss:')
+    m_sl = m_sl or m_stop
     if not m_sl:
         raise ValueError("Não encontrei SL.")
     sl = _n(m_sl.group(1))
 
-    # 4) TPs
+    # 4) TPs: lista 'TPs: v1, v2' tem prioridade sobre 'TP1: v | TP2: v'
     tps: List[float] = []
-
-    # TPs: v1, v2, v3 ...
-    m_tps_list = re.search(r"\bTPs?\s*:\s*([^\n\r]+)", raw, flags=re.I)
     if m_tps_list:
-        # pega linha após "TPs:" e extrai números
-        chunk = m_tps_list.group(1)
-        for m in re.finditer(NUM, chunk):
-            tps.append(_n(m.group(0)))
-
-    # TP1: v  | TP2: v ...
+        tps = [_n(x) for x in _NUM_RE.findall(m_tps_list.group(1))]
     if not tps:
-        for m in re.finditer(r"\bTP\d+\s*:\s*(" + NUM + r")", raw, flags=re.I):
-            tps.append(_n(m.group(1)))
-
+        tps = tp_n
     if not tps:
         raise ValueError("Não encontrei TPs.")
 
     # 5) Alavancagem
     lev_min = lev_max = None
-    m_lev1 = re.search(r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\s*(?:a|–|-|to|até)\s*(" + NUM + r")\s*[xX]?", raw, flags=re.I)
     if m_lev1:
         lev_min, lev_max = _n(m_lev1.group(1)), _n(m_lev1.group(2))
-    else:
-        # Alavancagem: 5x
-        m_lev2 = re.search(r"Alavancagem\s*:\s*(" + NUM + r")\s*[xX]\b", raw, flags=re.I)
-        if m_lev2:
-            lev_min = _n(m_lev2.group(1))
-            lev_max = lev_min
-
-    # 6) Tags/Notas
-    tags = re.findall(r"#\w+", raw)
+    elif m_lev2:
+        lev_min = _n(m_lev2.group(1))
+        lev_max = lev_min
 
     return TradeSignal(
         side=side, symbol=sym,
         entry_low=entry_low, entry_high=entry_high, entry_pm=entry_pm,
         sl=sl, lev_min=lev_min, lev_max=lev_max,
         tps=tps, tags=tags
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,147 @@
+# plan_batch.py
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from helpers import _alloc_by_profile, quantize_price
+from models import AccountConfig, Order, TradeSignal
+
+
+class AccountTable:
+    """
+    Contas do copy-trading em colunas (montado uma vez, reaproveitado a cada sinal):
+      balance[n], risk[n], profile_code[n] + a lista de perfis distintos.
+    """
+    def __init__(self, accounts: Sequence[AccountConfig]):
+        self.account_ids: List[str] = [a.account_id for a in accounts]
+        self.balance = np.fromiter((a.balance_usdt or 0.0 for a in accounts), dtype=np.float64, count=len(accounts))
+        self.risk = np.fromiter((a.risk_pct or 0.0 for a in accounts), dtype=np.float64, count=len(accounts))
+        self.profiles: List[str] = sorted({a.profile for a in accounts})
+        code = {p: i for i, p in enumerate(self.profiles)}
+        self.profile_code = np.fromiter((code[a.profile] for a in accounts), dtype=np.int32, count=len(accounts))
+        self.index: Dict[str, int] = {aid: i for i, aid in enumerate(self.account_ids)}
+
+    def __len__(self) -> int:
+        return len(self.account_ids)
+
+    def alloc_matrix(self, num_tps: int) -> np.ndarray:
+        """[n, num_tps]: fração de cada TP por conta (uma linha por perfil, expandida por índice)."""
+        rows = np.array([_alloc_by_profile(num_tps, p) for p in self.profiles], dtype=np.float64)
+        return rows.reshape(len(self.profiles), num_tps)[self.profile_code]
+
+
+@dataclass
+class BatchPlan:
+    """
+    Plano de UM sinal para N contas, em colunas. As pernas (ENTRY, TP1..TPk, SL) têm
+    tipo/lado/preço iguais para todas as contas; só a qty muda: qty[conta, perna].
+    Objetos Order só são criados sob demanda (orders()).
+    """
+    accounts: AccountTable
+    symbol: str
+    types: List[str]
+    sides: List[str]
+    tags: List[str]
+    reduce_only: List[bool]
+    post_only: List[bool]
+    prices: np.ndarray          # [pernas]
+    qty: np.ndarray             # [contas, pernas]
+
+    def __len__(self) -> int:
+        return self.qty.shape[0]
+
+    def _row(self, account: Union[int, str]) -> int:
+        return self.accounts.index[account] if isinstance(account, str) else account
+
+    def orders(self, account: Union[int, str]) -> List[Order]:
+        """Order's de uma conta (por índice ou account_id), no mesmo formato do build_order_plan."""
+        q = self.qty[self._row(account)].tolist()
+        prices = self.prices.tolist()
+        return [Order(type=t, side=s, symbol=self.symbol, price=p, qty=qq, tag=tag, reduce_only=ro, post_only=po)
+                for t, s, p, qq, tag, ro, po in zip(self.types, self.sides, prices, q, self.tags,
+                                                   self.reduce_only, self.post_only)]
+
+    def active(self) -> np.ndarray:
+        """Índices das contas com entrada > 0 (as outras não têm o que enviar)."""
+        return np.flatnonzero(self.qty[:, 0] > 0)
+
+    def iter_orders(self) -> Iterator[Tuple[str, List[Order]]]:
+        for i in self.active().tolist():
+            yield self.accounts.account_ids[i], self.orders(i)
+
+
+def _floor_step(x: np.ndarray, step: float, decimals: int) -> np.ndarray:
+    return np.round(np.floor(x / step + 1e-9) * step, decimals)
+
+
+def build_order_plans(signal: TradeSignal, accounts: Union[AccountTable, Sequence[AccountConfig]],
+                      symbol_suffix: str = "USDT", instruments=None, price_precision: int = 2,
+                      qty_precision: int = 4, use_post_only: bool = True) -> BatchPlan:
+    """
+    build_order_plan vetorizado para N contas: mesmas regras (risco por distância PM->SL,
+    divisão dos TPs pelo perfil de cada conta, quantização por InstrumentInfo ou precisão global),
+    calculadas em arrays NumPy.
+    """
+    table = accounts if isinstance(accounts, AccountTable) else AccountTable(accounts)
+    symbol = signal.symbol.upper() + symbol_suffix
+    side_entry = "Sell" if signal.side.upper() == "SHORT" else "Buy"
+    side_tp = "Buy" if side_entry == "Sell" else "Sell"
+    k = len(signal.tps)
+    info = instruments.get(symbol) if instruments is not None else None
+
+    dist = abs(signal.sl - signal.entry_pm)
+    funded = (table.balance != 0) & (table.risk != 0)
+    if funded.any() and dist <= 0:
+        raise ValueError("PM e SL inválidos para cálculo de quantidade.")
+    total = np.where(funded, table.balance * table.risk / (dist or 1.0), 0.0)
+    alloc = table.alloc_matrix(k)
+
+    if info is not None:
+        px = lambda p: quantize_price(info, p)
+        qty = _floor_step(total, info.qty_step, info.qty_decimals)
+        if info.max_qty:
+            qty = np.minimum(qty, info.max_qty)
+        qty[(qty < info.min_qty) | (qty * signal.entry_pm < info.min_notional)] = 0.0
+        legs = _floor_step(qty[:, None] * alloc, info.qty_step, info.qty_decimals)
+        if info.max_qty:
+            legs = np.minimum(legs, info.max_qty)
+        if k:
+            # sobra do arredondamento no último TP (perfis que fecham 100%)
+            full = np.abs(alloc.sum(axis=1) - 1.0) < 1e-6
+            legs[full, -1] = np.round(qty[full] - legs[full, :-1].sum(axis=1), info.qty_decimals)
+            # perna abaixo do min_qty vai para a seguinte...
+            for i in range(k - 1):
+                m = (legs[:, i] > 0) & (legs[:, i] < info.min_qty)
+                legs[m, i + 1] = np.round(legs[m, i + 1] + legs[m, i], info.qty_decimals)
+                legs[m, i] = 0.0
+            # ...e a última, para a anterior não-zero
+            if k > 1:
+                nz = legs[:, :-1] > 0
+                m = (legs[:, -1] > 0) & (legs[:, -1] < info.min_qty) & nz.any(axis=1)
+                rows = np.flatnonzero(m)
+                j = (k - 2) - np.argmax(nz[rows, ::-1], axis=1)
+                legs[rows, j] = np.round(legs[rows, j] + legs[rows, -1], info.qty_decimals)
+                legs[rows, -1] = 0.0
+    else:
+        px = lambda p: round(p, price_precision)
+        qty = np.round(total, qty_precision)
+        legs = np.round(total[:, None] * alloc, qty_precision)
+
+    n = len(table)
+    qty_matrix = np.empty((n, k + 2), dtype=np.float64)
+    qty_matrix[:, 0] = qty
+    qty_matrix[:, 1:k + 1] = legs
+    qty_matrix[:, k + 1] = qty
+
+    return BatchPlan(
+        accounts=table,
+        symbol=symbol,
+        types=["LIMIT"] * (k + 1) + ["STOP"],
+        sides=[side_entry] + [side_tp] * (k + 1),
+        tags=["ENTRY"] + [f"TP{i}" for i in range(1, k + 1)] + ["SL"],
+        reduce_only=[False] + [True] * (k + 1),
+        post_only=[use_post_only] * (k + 1) + [False],
+        prices=np.array([px(signal.entry_pm)] + [px(tp) for tp in signal.tps] + [px(signal.sl)], dtype=np.float64),
+        qty=qty_matrix,
+    )
@@ -0,0 +1,155 @@
+# routing.py
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from helpers import normalize_topic_map
+import config as config
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    allowed: bool                 # tópico whitelisted no TOPIC_MAP -> segue o pipeline
+    target: Any                   # id/username de destino (TARGET_MAP ou TARGET_CHAT)
+    notify_only: bool             # só avisa no destino, sem forward
+    topic_id: Optional[int]
+    topic_title: Optional[str]
+
+
+def bare_id(chat_id: int) -> int:
+    """-1002427024288 -> 2427024288 (id 'marcado' do Telethon -> id do entity)."""
+    s = str(chat_id)
+    if s.startswith("-100"):
+        return int(s[4:])
+    return -chat_id if chat_id < 0 else chat_id
+
+
+class RouteTable:
+    """
+    Tabela de roteamento pré-compilada: (chat_id, top_msg_id) -> RouteDecision.
+    Substitui as sondagens por mensagem em TARGET_MAP / NOTIFY_ONLY / TOPIC_MAP.
+    A chave (chat_id, None) guarda a decisão padrão do chat (mensagem fora de tópico
+    ou top_msg_id desconhecido).
+    """
+    def __init__(self, target_map=None, notify_only=None, topic_map=None, default_target=None):
+        self.target_map: Dict[Tuple[Any, Optional[int]], Any] = dict(target_map or {})
+        self.notify_only: Set[Tuple[Any, Optional[int]]] = set(notify_only or ())
+        self.topic_map: Dict[Any, Set[int]] = normalize_topic_map(topic_map)
+        self.default_target = default_target
+        self._routes: Dict[Tuple[int, Optional[int]], RouteDecision] = {}
+        self._topics: Dict[int, Dict[int, Tuple[int, str]]] = {}   # chat_id -> top_msg_id -> (topic_id, title)
+        self._usernames: Dict[int, str] = {}                        # chat_id -> @username (regras por username)
+
+    @classmethod
+    def from_config(cls) -> "RouteTable":
+        return cls.from_values(vars(config))
+
+    @classmethod
+    def from_values(cls, values: Dict[str, Any]) -> "RouteTable":
+        """A partir de um dict de config.parse_routing (ou dos atributos do próprio config)."""
+        return cls(
+            target_map=values["TARGET_MAP"],
+            notify_only=values["NOTIFY_ONLY"],
+            topic_map=values["TOPIC_MAP"],
+            default_target=values["TARGET_CHAT"],
+        )
+
+    # ---------------- compilação ----------------
+
+    def _chat_keys(self, chat_id: int, username: Optional[str]):
+        keys = [chat_id, bare_id(chat_id)]
+        if username:
+            keys.append(username.lstrip("@").lower())
+        return keys
+
+    def _chat_rules(self, keys) -> Tuple[Dict[Optional[int], Any], Set[Optional[int]], Set[int]]:
+        """Regras que valem para um chat, resolvidas 1x: destino por sub-chave, notify-only e whitelist."""
+        targets: Dict[Optional[int], Any] = {}
+        for k in reversed(keys):                    # a 1ª chave (id marcado) prevalece
+            for (tk, sub), target in self.target_map.items():
+                if tk == k:
+                    targets[sub] = target
+        notify = {sub for (k, sub) in self.notify_only if k in keys}
+        whitelist: Set[int] = set()
+        for k in keys:
+            whitelist |= self.topic_map.get(k, set())
+        return targets, notify, whitelist
+
+    def _decide(self, rules, top_msg_id: Optional[int], topic_id: Optional[int],
+                topic_title: Optional[str]) -> RouteDecision:
+        targets, notify_subs, whitelist = rules
+        # TARGET: (chat, topic_id) -> (chat, top_msg_id) -> (chat, None) -> TARGET_CHAT
+        target = self.default_target
+        for sub in (topic_id, top_msg_id, None):
+            hit = targets.get(sub)
+            if hit is not None:
+                target = hit
+                break
+
+        notify = topic_id in notify_subs or None in notify_subs
+        allowed = topic_id is not None and topic_id in whitelist
+
+        return RouteDecision(allowed, target, notify, topic_id, topic_title)
+
+    def _entries(self, chat_id: int, username: Optional[str]) -> Dict[Tuple[int, Optional[int]], RouteDecision]:
+        topics = self._topics.get(chat_id, {})
+        keys = self._chat_keys(chat_id, username)
+        rules = self._chat_rules(keys)
+
+        entries: Dict[Tuple[int, Optional[int]], RouteDecision] = {
+            (chat_id, None): self._decide(rules, None, None, None),
+        }
+        for top, (tid, title) in topics.items():
+            entries[(chat_id, top)] = self._decide(rules, top, tid, title)
+        # regras TARGET_MAP por top_msg_id "cru" (sem tópico conhecido)
+        for sub in rules[0]:
+            if sub is not None and (chat_id, sub) not in entries:
+                entries[(chat_id, sub)] = self._decide(rules, sub, None, None)
+        return entries
+
+    def compile_chat(self, chat_id: int, username: Optional[str] = None,
+                     top_to_topic: Optional[Dict[int, Tuple[int, str]]] = None) -> None:
+        """(Re)compila as rotas de um chat e troca de uma vez (sem estado intermediário)."""
+        if top_to_topic is not None:
+            self._topics[chat_id] = dict(top_to_topic)
+        if username:
+            self._usernames[chat_id] = username.lstrip("@").lower()
+        username = self._usernames.get(chat_id)
+        entries = self._entries(chat_id, username)
+        routes = {key: d for key, d in self._routes.items() if key[0] != chat_id}
+        routes.update(entries)
+        self._routes = routes
+
+    def compile_like(self, old: "RouteTable",
+                     username_for: Optional[Callable[[int], Optional[str]]] = None) -> "RouteTable":
+        """
+        Hot reload: compila nesta tabela (nova, ainda fora de uso) todos os chats que a `old`
+        já conhecia, com os tópicos e usernames dela, numa passada só (username_for só cobre
+        chat que a `old` viu sem username). Quem troca a referência é o chamador.
+        """
+        self._topics = dict(old._topics)
+        self._usernames = dict(old._usernames)
+        routes: Dict[Tuple[int, Optional[int]], RouteDecision] = {}
+        for chat_id in {key[0] for key in old._routes} | set(old._topics):
+            username = self._usernames.get(chat_id)
+            if username is None and username_for is not None:
+                username = username_for(chat_id)
+                if username:
+                    self._usernames[chat_id] = username.lstrip("@").lower()
+            routes.update(self._entries(chat_id, username))
+        self._routes = routes
+        return self
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    # ---------------- lookup (hot path) ----------------
+
+    def lookup(self, chat_id: int, username: Optional[str], top_msg_id: Optional[int]) -> RouteDecision:
+        d = self._routes.get((chat_id, top_msg_id))
+        if d is None:
+            d = self._routes.get((chat_id, None))
+            if d is None:
+                # chat ainda não compilado (ex.: antes do prewarm) -> compila 1x
+                self.compile_chat(chat_id, username)
+                d = self._routes[(chat_id, None)]
+        return d
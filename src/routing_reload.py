@@ -0,0 +1,82 @@
+# routing_reload.py
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import config as config
+
+log = logging.getLogger("routing")
+
+
+class RoutingReloader:
+    """
+    Hot reload do roteamento (SOURCE_CHATS, TOPIC_MAP, TARGET_MAP, NOTIFY_ONLY, ...):
+      - observa o .env (e o ROUTING_FILE, se houver) por mtime/tamanho a cada interval_s;
+      - mudou -> relê e valida com config.parse_routing(strict=True);
+      - só chama apply(values) se as chaves de roteamento mudaram de fato;
+      - config inválida (ou apply que falha) é recusada com log: o roteamento em uso segue igual,
+        e o mesmo arquivo não é reavaliado até mudar de novo.
+    """
+    def __init__(self, apply: Callable[[dict], None], paths=None, interval_s: float = 2.0):
+        self.apply = apply
+        self.paths = [p for p in (paths if paths is not None else (config.ENV_FILE, config.ROUTING_FILE)) if p]
+        self.interval_s = interval_s
+        self.current = {k: getattr(config, k) for k in config.ROUTING_KEYS}
+        self._sig = self._signature()
+        self.last_error: Optional[str] = None
+        self.stats: Dict[str, int] = {"checks": 0, "reloads": 0, "rejected": 0, "unchanged": 0}
+
+    def _signature(self) -> Tuple:
+        sig = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                sig.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append((path, None, None))
+        return tuple(sig)
+
+    def check(self) -> bool:
+        """Uma verificação; True se um roteamento novo foi aplicado."""
+        self.stats["checks"] += 1
+        sig = self._signature()
+        if sig == self._sig:
+            return False
+        self._sig = sig
+        try:
+            values = config.parse_routing(config.read_routing_env(), strict=True)
+        except Exception as e:
+            return self._reject(f"config inválida: {e}")
+        if values == self.current:
+            self.stats["unchanged"] += 1
+            return False
+        try:
+            self.apply(values)
+        except Exception as e:
+            return self._reject(f"falha ao aplicar: {type(e).__name__}: {e}")
+        changed = sorted(k for k in values if values[k] != self.current[k])
+        self.current = values
+        self.last_error = None
+        self.stats["reloads"] += 1
+        log.info(f"[reload] roteamento recarregado ({', '.join(changed)})")
+        return True
+
+    def _reject(self, reason: str) -> bool:
+        self.stats["rejected"] += 1
+        self.last_error = reason
+        log.error(f"[reload] {reason} — mantendo o roteamento atual")
+        return False
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                self.check()
+            except Exception as e:
+                log.error(f"[reload] falha inesperada: {e}")
+
+    def collect(self):
+        """Coletor para metrics.add_collector."""
+        for k, v in self.stats.items():
+            yield f"routing_reload_{k}", {}, v
@@ -3,17 +3,24 @@ import logging
 import sys
 import getpass
 import os
+import base64
+import json
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, Tuple, Optional, Set
 
 from helpers import normalize_sources
-from telethon import TelegramClient, events
+from utils.utils_topic import TopicResolver, flood_aware, extract_top_msg_id
+from routing import RouteTable
+from metrics import metrics
+from telethon import TelegramClient, events, utils
 from telethon.errors import (
     PhoneNumberInvalidError, PhoneCodeInvalidError, PhoneCodeExpiredError,
     SessionPasswordNeededError, FloodWaitError,
 )
-from telethon.tl.types import Channel
-from telethon.tl.functions.channels import GetForumTopicsRequest
+from telethon.tl.types import Channel, MessageService, UpdateNewChannelMessage
+from telethon.extensions import BinaryReader
 
 import config as config
 
@@ -90,187 +97,224 @@ async def ensure_login():
 
 
 # =============================================================================
-# Fast topic mapping (pré-warm)
-#   - Por chat: topic_id -> top_msg_id  e  top_msg_id -> (topic_id, title)
-#   - ALLOWED_TOP_MSG_IDS: set para checagem instantânea
+# Cache de entities (LRU limitado): chat_id marcado -> Channel/Chat/User
+#   - evita event.get_chat() por mensagem nos sources
 # =============================================================================
-class FastTopicMap:
-    def __init__(self):
-        # chaves do chat: podem ser id (int) ou username (str)
-        self.topic_to_top: Dict[int | str, Dict[int, int]] = {}          # topic_id -> top_msg_id
-        self.top_to_topic: Dict[int | str, Dict[int, Tuple[int, str]]] = {}  # top_msg_id -> (topic_id, title)
-        self.allowed_top: Dict[int | str, Set[int]] = {}                 # set de top_msg_id permitidos
-
-    def _chat_key(self, chat_obj):
-        return getattr(chat_obj, "id", None) or getattr(chat_obj, "username", None)
-
-    async def preload_for_chat(self, chat_obj):
-        """Carrega todas as páginas de tópicos (até ~1000) e constrói os mapas."""
-        if not (isinstance(chat_obj, Channel) and bool(getattr(chat_obj, "forum", False))):
-            return
-        chat_key = self._chat_key(chat_obj)
-
-        topic_to_top: Dict[int, int] = {}
-        top_to_topic: Dict[int, Tuple[int, str]] = {}
-
-        offset_topic = 0
-        total = 0
-        for _ in range(5):  # 5 * 200 = 1000 tópicos
-            res = await client(GetForumTopicsRequest(
-                channel=chat_obj,
-                offset_date=None,
-                offset_id=0,
-                offset_topic=offset_topic,
-                limit=200
-            ))
-            topics = res.topics or []
-            if not topics:
-                break
-            for t in topics:
-                if getattr(t, "top_message", None) is None:
-                    continue
-                tid = int(t.id)
-                top = int(t.top_message)
-                title = t.title or f"topic#{tid}"
-                topic_to_top[tid] = top
-                top_to_topic[top] = (tid, title)
-                total += 1
-            if getattr(res, "count", None) and total >= int(res.count):
-                break
-            offset_topic = topics[-1].id if topics else 0
-
-        self.topic_to_top[chat_key] = topic_to_top
-        self.top_to_topic[chat_key] = top_to_topic
-        log.info(f"[topics-fast] pré-carregado chat={chat_key} itens={len(top_to_topic)}")
-
-        # constrói allowed_top para esse chat com base no TOPIC_MAP (se houver)
-        allowed_set: Set[int] = set()
-        tm = getattr(config, "TOPIC_MAP", None)
-        if tm:
-            # TOPIC_MAP pode ter chave como int ou str
-            for k in (chat_key, str(chat_key)):
-                topics_whitelist = tm.get(k) if isinstance(tm, dict) else None
-                if topics_whitelist:
-                    for topic_id in topics_whitelist:
-                        try:
-                            topic_id = int(topic_id)
-                        except Exception:
-                            continue
-                        top_msg_id = topic_to_top.get(topic_id)
-                        if top_msg_id:
-                            allowed_set.add(top_msg_id)
-        self.allowed_top[chat_key] = allowed_set
-        if allowed_set:
-            log.info(f"[topics-fast] allowed_top para chat={chat_key}: {len(allowed_set)} tópicos")
-
-    async def preload_for_sources(self, sources: Set[int | str]):
-        """Pré-carrega mapas para todos os sources configurados (ids e usernames)."""
-        for s in sources:
+class EntityCache:
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._items: "OrderedDict[int, object]" = OrderedDict()
+
+    def get(self, chat_id: int):
+        entity = self._items.get(chat_id)
+        if entity is not None:
+            self._items.move_to_end(chat_id)
+        return entity
+
+    def put(self, entity, chat_id: Optional[int] = None) -> int:
+        if chat_id is None:
+            chat_id = utils.get_peer_id(entity)
+        self._items[chat_id] = entity
+        self._items.move_to_end(chat_id)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return chat_id
+
+
+def _compile_routes(entity, top_to_topic) -> None:
+    # mapa de tópicos mudou -> recompila as rotas SÓ desse chat
+    route_table.compile_chat(utils.get_peer_id(entity), getattr(entity, "username", None), top_to_topic)
+
+
+# =============================================================================
+# Tópicos de fórum: resolver único (utils/utils_topic.TopicResolver)
+#   - pré-carregado no boot; atualizado por service actions, refresh delta periódico
+#     e miss no router (single-flight + cache negativo)
+# =============================================================================
+fastmap = TopicResolver(
+    client,
+    refresh_page_size=config.TOPIC_REFRESH_LIMIT,
+    max_chats=config.TOPIC_CACHE_CHATS,
+    negative_ttl_s=config.TOPIC_NEGATIVE_TTL_S,
+    on_change=_compile_routes,
+)
+route_table = RouteTable.from_config()
+entity_cache = EntityCache(config.ENTITY_CACHE_SIZE)
+# definidos pelo start_listening: sources atuais (o mesmo set que o router lê) e quem troca o filtro
+_sources: Set[int | str] = set()
+_update_sources = None
+_bg_tasks: Set[asyncio.Task] = set()  # referência forte às tasks em background (prewarm, refresh, reload)
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+
+async def topic_refresh_loop(interval_s: float) -> None:
+    """Refresh delta: 1 página com os tópicos mais ativos de cada fórum (pega tópicos novos)."""
+    while True:
+        await asyncio.sleep(interval_s)
+        for chat_key, entity in list(fastmap.entities.items()):
             try:
-                # s pode ser int (id) ou str (username sem @)
-                entity = await client.get_entity(s)
-                await self.preload_for_chat(entity)
+                changed = await fastmap.refresh(entity)
+                if changed:
+                    log.info(f"[topics-fast] refresh delta chat={chat_key} mudanças={changed}")
+                    save_snapshot()
+            except FloodWaitError as e:
+                log.warning(f"[topics-fast] FloodWait {e.seconds}s no refresh de {chat_key}")
+                await asyncio.sleep(e.seconds)
             except Exception as e:
-                log.error(f"[topics-fast] falha ao pré-carregar {s}: {e}")
+                log.error(f"[topics-fast] falha no refresh de {chat_key}: {e}")
+
+
+resolved_sources: Dict[int | str, int] = {}   # source do .env (id/username) -> id marcado
+
+
+async def prewarm_sources(sources: Set[int | str], on_resolved=None,
+                          concurrency: int = 8) -> Set[int]:
+    """
+    Resolve SOURCE_CHATS para ids numéricos (marcados, ex.: -100...) e pré-carrega os tópicos,
+    vários sources em paralelo (limitado por semáforo).
+      - on_resolved(source, chat_id) é chamado assim que CADA source resolve (já pode entrar no filtro);
+      - as rotas de cada fórum são compiladas quando o preload DELE termina
+        (quem termina primeiro já roteia, sem esperar o mais lento).
+    ids numéricos que não resolverem entram direto; usernames são descartados (com log).
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    ids: Set[int] = set()
+    progress = {"done": 0, "forums": 0, "failed": 0}
+    t0 = time.perf_counter()
+
+    async def _one(s):
+        async with sem:
+            t_src = time.perf_counter()
+            try:
+                try:
+                    entity = await flood_aware(lambda: client.get_entity(s), f"get_entity {s}")
+                except Exception as e:
+                    progress["failed"] += 1
+                    if isinstance(s, int):
+                        ids.add(s)
+                        if on_resolved:
+                            on_resolved(s, s)
+                    else:
+                        log.error(f"[boot] não consegui resolver source @{s}: {e}")
+                    return
+
+                chat_id = entity_cache.put(entity)
+                ids.add(chat_id)
+                resolved_sources[s] = chat_id
+                if on_resolved:
+                    on_resolved(s, chat_id)
+
+                if isinstance(entity, Channel) and getattr(entity, "forum", False):
+                    try:
+                        await fastmap.preload_for_chat(entity)
+                        progress["forums"] += 1
+                    except Exception as e:
+                        progress["failed"] += 1
+                        log.error(f"[topics-fast] falha ao pré-carregar {s}: {e}")
+            finally:
+                progress["done"] += 1
+                metrics.observe("prewarm_source", time.perf_counter() - t_src)
+                log.info(f"[prewarm] {progress['done']}/{len(sources)} sources prontos "
+                         f"(fóruns={progress['forums']} falhas={progress['failed']}) "
+                         f"em {time.perf_counter() - t0:.2f}s")
+
+    await asyncio.gather(*(_one(s) for s in sources))
+    return ids
 
-    def resolve_from_top(self, chat_obj, top_msg_id: Optional[int]) -> Tuple[Optional[int], Optional[str]]:
-        """Resolve (topic_id, title) a partir do top_msg_id usando o cache já carregado (sem I/O)."""
-        if not isinstance(top_msg_id, int):
-            return None, None
-        chat_key = self._chat_key(chat_obj)
-        m = self.top_to_topic.get(chat_key) or {}
-        info = m.get(top_msg_id)
-        return info if info else (None, None)
 
-    def is_top_allowed(self, chat_obj, top_msg_id: Optional[int]) -> bool:
-        """Checa instantaneamente se esse top_msg_id está whitelisted (sem I/O)."""
-        if not isinstance(top_msg_id, int):
-            return False
-        chat_key = self._chat_key(chat_obj)
-        allowed = self.allowed_top.get(chat_key) or set()
-        return top_msg_id in allowed
+# =============================================================================
+# Snapshot em disco (warm start): sources resolvidos + entities + tópicos
+#   - carregado de forma SÍNCRONA no boot: roteia certo desde o 1º update
+#   - o prewarm (rede) roda em background, reconcilia e regrava
+#   - entities serializadas no formato TL do próprio Telethon (bytes -> base64)
+#   (destinos não entram: a sessão do Telethon já persiste os peers usados no envio)
+# =============================================================================
+_SNAPSHOT_VERSION = 1
+
+
+def _snapshot_path() -> Optional[str]:
+    path = config.TOPIC_SNAPSHOT_FILE
+    if not path:
+        return None
+    return path if os.path.isabs(path) else str(_BASE_DIR / path)
 
 
-fastmap = FastTopicMap()
+def save_snapshot() -> None:
+    path = _snapshot_path()
+    if not path:
+        return
+    entities = {}
+    for chat_id in set(resolved_sources.values()):
+        entity = entity_cache.get(chat_id)
+        if entity is not None:
+            entities[str(chat_id)] = base64.b64encode(bytes(entity)).decode("ascii")
+    data = {
+        "v": _SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "sources": [[s, chat_id] for s, chat_id in resolved_sources.items()],
+        "entities": entities,
+        "topics": {str(k): [[tid, title] for tid, title in m.values()]
+                   for k, m in fastmap.top_to_topic.items()},
+    }
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+    except Exception as e:
+        log.error(f"[snapshot] falha ao salvar {path}: {e}")
 
 
-async def extract_top_msg_id(message) -> Optional[int]:
+def load_snapshot(sources: Set[int | str]) -> Optional[Set[int]]:
     """
-    Extrai o top_msg_id do evento/mensagem com fallbacks.
-    (Sem I/O; nada de refetch aqui)
+    Restaura entities/tópicos/rotas do disco (sem I/O de rede).
+    Retorna os ids dos sources se o snapshot cobrir TODOS os sources atuais; senão None.
     """
-    if message is None:
+    path = _snapshot_path()
+    if not path or not os.path.exists(path):
         return None
-
-    # 1) reply_to.* (mais comum)
-    r = getattr(message, "reply_to", None)
-    if r is not None:
-        v = getattr(r, "top_msg_id", None) or getattr(r, "reply_to_top_id", None)
-        if isinstance(v, int):
-            return v
-        if isinstance(v, str) and v.lstrip("-").isdigit():
-            return int(v)
-
-    # 2) campos diretos (em algumas builds)
-    for attr in ("top_msg_id", "reply_to_top_id"):
-        v = getattr(message, attr, None)
-        if isinstance(v, int):
-            return v
-        if isinstance(v, str) and v.lstrip("-").isdigit():
-            return int(v)
-
-    # 3) via to_dict()
+    t0 = time.perf_counter()
     try:
-        d = message.to_dict() or {}
-        rt = d.get("reply_to", {}) or {}
-        v = rt.get("top_msg_id", None) or rt.get("reply_to_top_id", None)
-        if isinstance(v, int):
-            return v
-        if isinstance(v, str) and v.lstrip("-").isdigit():
-            return int(v)
-    except Exception:
-        pass
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("v") != _SNAPSHOT_VERSION:
+            return None
+
+        for raw in data.get("entities", {}).values():
+            entity = BinaryReader(base64.b64decode(raw)).tgread_object()
+            entity_cache.put(entity)
+            if isinstance(entity, Channel) and getattr(entity, "forum", False):
+                fastmap.entities[entity.id] = entity
+        for chat_key, items in data.get("topics", {}).items():
+            fastmap.merge(int(chat_key), [(int(tid), title) for tid, title in items], replace=True)
+
+        snap_sources = {s: int(chat_id) for s, chat_id in data.get("sources", [])}
+    except Exception as e:
+        log.error(f"[snapshot] falha ao carregar {path}: {e}")
+        return None
 
-    # 4) raiz do tópico: o id da própria msg == top_msg_id — mas sem garantias aqui.
-    #    Para velocidade, não faremos heurística; se necessário, o fastmap já tem os "tops permitidos".
-    return None
+    log.info(f"[snapshot] carregado {path}: entities={len(data.get('entities', {}))} "
+             f"fóruns={len(data.get('topics', {}))} em {1000 * (time.perf_counter() - t0):.1f}ms")
+    if not all(s in snap_sources for s in sources):
+        return None
+    resolved_sources.update({s: snap_sources[s] for s in sources})
+    return {snap_sources[s] for s in sources}
 
 
 # =============================================================================
 # Listener
 # =============================================================================
-def start_listening(on_message):
+def build_router(on_message, sources: Set[int | str]):
     """
-    on_message: callable(texto:str, event) -> None | awaitable
-
-    Roteamento:
-      - PRÉ-CARREGA tópicos dos SOURCEs no boot (1x).
-      - Só passa ao handler se:
-          a) não há TOPIC_MAP (sem restrição), OU
-          b) top_msg_id ∈ ALLOWED_TOP_MSG_IDS para o chat.
-      - Destino é decidido por TARGET_MAP:
-          (chat, topic_id) -> (chat, top_msg_id) -> (chat, None) -> TARGET_CHAT.
-      - Injeta no event: _target_chat, _topic_id, _topic_title, _chat_title
+    Monta o handler de NewMessage (sem registrar no client).
+    Separado do start_listening para poder ser exercitado offline (bench/replay_bench.py).
     """
-    sources = normalize_sources(
-        getattr(config, "SOURCE_CHATS", None),
-        fallback_source=config.SOURCE_CHAT
-    )
-    log.info(f"[boot] sources={sources}")
-
-    # pré-carrega mapas para todos os sources (sem bloquear o router)
-    async def _prewarm():
-        try:
-            await ensure_login()  # garante sessão antes de get_entity
-            await fastmap.preload_for_sources(sources)
-        except Exception as e:
-            log.error(f"[prewarm] falha: {e}")
-
-    # dispara prewarm (não bloqueia)
-    asyncio.create_task(_prewarm())
-    log.info("🔊 Ouvindo novos eventos do Telegram...")
-
-    @client.on(events.NewMessage())
     async def router(event):
         # Descoberta
         if not sources:
@@ -282,60 +326,46 @@ def start_listening(on_message):
                 log.error(f"Falha ao obter chat: {e}")
             return
 
-        # Match do chat
+        # Chat (já filtrado pelo func= do NewMessage contra os ids vivos); entity vem do cache
         try:
             chat_id = event.chat_id
-            chat_obj = await event.get_chat()
+            chat_obj = entity_cache.get(chat_id)
+            if chat_obj is None:
+                with metrics.timer("get_chat"):
+                    chat_obj = await event.get_chat()
+                entity_cache.put(chat_obj)
             chat_username = getattr(chat_obj, "username", None)
             chat_username = chat_username.lstrip("@").lower() if chat_username else None
-            match = (chat_id in sources) or (chat_username and chat_username in sources)
-            if not match:
-                return
         except Exception as e:
-            log.error(f"Erro ao checar SOURCE_CHATS: {e}")
+            log.error(f"Erro ao obter chat de SOURCE_CHATS: {e}")
             return
 
         # top_msg_id (sem I/O)
         msg = getattr(event, "message", None)
-        top_msg_id = await extract_top_msg_id(msg)
-
-        # Se há TOPIC_MAP, só seguimos se top_msg_id estiver whitelisted (instantâneo)
-        tm = getattr(config, "TOPIC_MAP", None)
-        if tm:
-            # se o prewarm ainda não terminou, pode não ter allowed_top ainda:
-            if not fastmap.is_top_allowed(chat_obj, top_msg_id):
-                # nada de I/O aqui; simplesmente ignore até que o prewarm acabe
-                log.info(f"[router-skip] chat={chat_id} top_msg_id={top_msg_id} não permitido (ainda).")
-                return
-
-        # Resolve (topic_id, title) a partir do top_msg_id (sem I/O)
-        topic_id, topic_title = fastmap.resolve_from_top(chat_obj, top_msg_id)
-
-        # Resolve TARGET
-        target = config.TARGET_CHAT
-        try:
-            # 1) (chat, topic_id)
-            if (chat_id, topic_id) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_id, topic_id)]
-            elif chat_username and (chat_username, topic_id) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_username, topic_id)]
-            # 2) (chat, top_msg_id)
-            elif (chat_id, top_msg_id) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_id, top_msg_id)]
-            elif chat_username and (chat_username, top_msg_id) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_username, top_msg_id)]
-            # 3) (chat, None)
-            elif (chat_id, None) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_id, None)]
-            elif chat_username and (chat_username, None) in config.TARGET_MAP:
-                target = config.TARGET_MAP[(chat_username, None)]
-            # 4) fallback global
-        except Exception as e:
-            log.error(f"Erro ao resolver TARGET_MAP: {e}")
+        with metrics.timer("extract_top_msg_id"):
+            top_msg_id = extract_top_msg_id(msg)
+
+        # Decisão pré-compilada: 1 lookup resolve permissão, destino, notify-only e tópico
+        with metrics.timer("routing"):
+            route = route_table.lookup(chat_id, chat_username, top_msg_id)
+        if route.topic_id is None and top_msg_id is not None and TopicResolver.is_forum(chat_obj):
+            # top desconhecido em fórum: pode ser tópico novo (refresh único por chat + cache negativo)
+            with metrics.timer("topic_miss"):
+                topic_id, _ = await fastmap.topmsg_to_topic(chat_obj, top_msg_id)
+            if topic_id is not None:
+                route = route_table.lookup(chat_id, chat_username, top_msg_id)
+        if not route.allowed:
+            metrics.inc("skipped")
+            log.info(f"[router-skip] chat={chat_id} top_msg_id={top_msg_id} não permitido (ainda).")
+            return
+        target = route.target
+        topic_id, topic_title = route.topic_id, route.topic_title
 
         log.info(f"[router] chat={chat_id} user={chat_username} top_msg_id={top_msg_id} topic_id={topic_id} -> target={target}")
+        metrics.inc("routed")
 
         # Injeta dados para o on_message (se você quiser usar)
+        setattr(event, "_route", route)
         setattr(event, "_target_chat", target)
         setattr(event, "_topic_id", topic_id)
         setattr(event, "_topic_title", topic_title)
@@ -348,9 +378,144 @@ def start_listening(on_message):
             return
         await on_message(text, event)
 
+    return router
+
+
+def start_listening(on_message):
+    """
+    on_message: callable(texto:str, event) -> None | awaitable
+
+    Roteamento:
+      - Resolve SOURCE_CHATS para ids no boot (em paralelo); o handler é registrado UMA vez com
+        NewMessage(func=...) filtrando num set de ids vivo (reload/prewarm só mexem no set).
+      - Warm start pelo snapshot em disco (TOPIC_SNAPSHOT_FILE), se houver; o prewarm reconcilia depois.
+      - PRÉ-CARREGA tópicos dos SOURCEs no boot e mantém atualizado (service actions + refresh delta).
+      - Decisão por mensagem = 1 lookup na RouteTable (compilada no boot e após o prewarm):
+          a) só passa ao handler se o tópico estiver no TOPIC_MAP;
+          b) destino por TARGET_MAP: (chat, topic_id) -> (chat, top_msg_id) -> (chat, None) -> TARGET_CHAT;
+          c) flag NOTIFY_ONLY.
+      - Injeta no event: _route, _target_chat, _topic_id, _topic_title, _chat_title
+    """
+    global _update_sources
+    sources = _sources
+    sources.update(normalize_sources(
+        getattr(config, "SOURCE_CHATS", None),
+        fallback_source=config.SOURCE_CHAT
+    ))
+    log.info(f"[boot] sources={sources}")
+    router = build_router(on_message, sources)
+
+    live_ids: Set[int] = set()
+
+    def _register(source_ids: Set[int]):
+        # só troca o conteúdo do set: remover/readicionar o handler enquanto o router está em
+        # await faz a lib (que itera a lista viva de handlers) despachar o mesmo update de novo
+        live_ids.clear()
+        live_ids.update(source_ids)
+
+    def _ids_of(srcs) -> Set[int]:
+        return {resolved_sources.get(s, s) for s in srcs if s in resolved_sources or isinstance(s, int)}
+
+    def _on_resolved(source, chat_id: int):
+        if source not in sources:
+            # removido por um reload enquanto resolvia: não volta para o filtro
+            resolved_sources.pop(source, None)
+            return
+        # cada source entra no filtro assim que resolve (sem esperar os demais)
+        if chat_id not in live_ids:
+            _register(live_ids | {chat_id})
+
+    # resolve sources + pré-carrega tópicos em paralelo; registra o handler conforme resolvem (sem bloquear o boot)
+    async def _prewarm(snapshot_ids: Optional[Set[int]]):
+        try:
+            await ensure_login()  # garante sessão antes de get_entity
+            boot = set(sources)
+            source_ids = await prewarm_sources(boot, _on_resolved, config.PREWARM_CONCURRENCY)
+            # reload no meio do prewarm: removidos não voltam, adicionados (resolvidos à parte) ficam
+            source_ids = (source_ids & _ids_of(sources)) | _ids_of(sources - boot)
+            log.info(f"[boot] source_ids={source_ids}")
+            if source_ids != live_ids:
+                _register(source_ids)  # descarta ids antigos do snapshot
+            save_snapshot()
+            if config.TOPIC_REFRESH_S > 0:
+                _spawn(topic_refresh_loop(config.TOPIC_REFRESH_S))
+        except Exception as e:
+            log.error(f"[prewarm] falha: {e}")
+
+    async def _add_sources(added: Set[int | str]):
+        try:
+            await prewarm_sources(added, _on_resolved, config.PREWARM_CONCURRENCY)
+            save_snapshot()
+        except Exception as e:
+            log.error(f"[reload] falha ao resolver sources novos {added}: {e}")
+
+    def _update(new_sources: Set[int | str]) -> None:
+        # hot reload: tira do filtro os sources removidos e resolve os novos em background
+        added, removed = new_sources - sources, sources - new_sources
+        sources.difference_update(removed)
+        sources.update(added)
+        for s in removed:
+            resolved_sources.pop(s, None)
+        _register(_ids_of(sources))
+        if added:
+            _spawn(_add_sources(added))
+        log.info(f"[reload] sources: +{sorted(map(str, added))} -{sorted(map(str, removed))}")
+
+    _update_sources = _update
+
+    async def _on_channel_update(update):
+        msg = getattr(update, "message", None)
+        if isinstance(msg, MessageService) and fastmap.on_service_message(msg):
+            save_snapshot()
+
+    if sources:
+        # filtro no func= do próprio evento: updates de outros chats nem chegam ao router
+        client.add_event_handler(router, events.NewMessage(func=lambda e: e.chat_id in live_ids))
+        # warm start: com snapshot válido o handler já entra filtrado e as rotas já estão compiladas
+        snapshot_ids = load_snapshot(sources)
+        if snapshot_ids is not None:
+            _register(snapshot_ids)
+        # service actions (tópico criado/editado) mantêm o fastmap em dia sem restart
+        client.add_event_handler(_on_channel_update, events.Raw(UpdateNewChannelMessage))
+        # dispara prewarm (não bloqueia); reconcilia o snapshot com a rede
+        _spawn(_prewarm(snapshot_ids))
+    else:
+        client.add_event_handler(router, events.NewMessage())
+    log.info("🔊 Ouvindo novos eventos do Telegram...")
+
     return client
 
 
+def apply_routing(values: dict) -> None:
+    """
+    Hot reload (routing_reload.py): valores novos de config.parse_routing(strict=True).
+    Compila uma RouteTable NOVA com todos os chats/tópicos já conhecidos e só então troca a
+    referência (1 atribuição; o router passa a usar a nova na próxima mensagem). Qualquer erro
+    antes da troca sobe e a tabela em uso fica intacta. O TelegramClient não é tocado.
+    """
+    global route_table
+    new_sources = normalize_sources(values["SOURCE_CHATS"], fallback_source=values["SOURCE_CHAT"])
+    if _update_sources is not None and bool(new_sources) != bool(_sources):
+        raise ValueError("ligar/desligar o modo descoberta (SOURCE_CHATS vazio) exige restart")
+
+    def username_for(chat_id: int) -> Optional[str]:
+        entity = entity_cache.get(chat_id)
+        username = getattr(entity, "username", None) if entity is not None else None
+        return username.lstrip("@").lower() if username else None
+
+    t0 = time.perf_counter()
+    table = RouteTable.from_values(values).compile_like(route_table, username_for)
+
+    # daqui em diante nada falha: config, tabela e filtro de sources trocam juntos
+    for k, v in values.items():
+        setattr(config, k, v)
+    route_table = table
+    if _update_sources is not None and new_sources != _sources:
+        _update_sources(new_sources)
+    log.info(f"[reload] roteamento aplicado: {len(table)} rotas compiladas em "
+             f"{1000 * (time.perf_counter() - t0):.1f}ms")
+
+
 # =============================================================================
 # Loop
 # =============================================================================
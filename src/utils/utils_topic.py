@@ -1,97 +1,261 @@
-from typing import Tuple, Optional, Dict
-from telethon.tl.types import Channel
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple, Optional, Dict, List
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Channel, MessageActionTopicCreate, MessageActionTopicEdit
 from telethon.tl.functions.channels import GetForumTopicsRequest
 
+log = logging.getLogger("topics")
+
+
+async def flood_aware(factory, what: str, max_retries: int = 3):
+    """
+    Executa factory() (uma requisição); em FloodWait espera o tempo pedido + backoff
+    e tenta de novo a MESMA requisição (só ela espera; as demais seguem).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await factory()
+        except FloodWaitError as e:
+            if attempt >= max_retries:
+                raise
+            wait = e.seconds + min(2 ** attempt, 30)
+            log.warning(f"[flood] FloodWait {e.seconds}s em {what}; nova tentativa em {wait}s ({attempt + 1}/{max_retries})")
+            await asyncio.sleep(wait)
+
+
 class TopicResolver:
     """
-    Mantém cache por chat: { top_msg_id -> (topic_id, title) }.
-    Usa paginação e faz refresh quando necessário.
+    Cache ÚNICO de tópicos de fórum: chat_key -> { top_msg_id -> (topic_id, title) }.
+    (top_msg_id da thread == id do tópico == id da service message que o criou;
+     ForumTopic.top_message é a ÚLTIMA mensagem do tópico, não serve de chave)
+
+      - LRU entre chats (max_chats): memória limitada; chat evitado recarrega no próximo miss;
+      - miss: UM refresh em voo por chat (single-flight); eventos concorrentes esperam o mesmo;
+        chat já carregado -> só 1 página dos tópicos mais ativos; chat novo -> carga completa;
+      - cache negativo com TTL para ids que não são tópicos (não repete request a cada msg);
+      - on_change(entity, mapping) avisa quem compila em cima do mapa (ex.: RouteTable).
     """
-    def __init__(self, client, pages: int = 5, page_size: int = 200):
+    def __init__(self, client, pages: int = 5, page_size: int = 200, refresh_page_size: int = 50,
+                 max_chats: int = 256, negative_ttl_s: float = 300.0, max_negative: int = 4096,
+                 on_change: Optional[Callable[[Channel, Dict[int, Tuple[int, str]]], None]] = None):
         self.client = client
         self.pages = pages
         self.page_size = page_size
-        self.cache: Dict[int | str, Dict[int, Tuple[int, str]]] = {}  # chat_key -> map
+        self.refresh_page_size = refresh_page_size
+        self.max_chats = max_chats
+        self.negative_ttl_s = negative_ttl_s
+        self.max_negative = max_negative
+        self.on_change = on_change
+        # chave do chat: id "cru" do Channel (entity.id / PeerChannel.channel_id)
+        self.top_to_topic: "OrderedDict[int | str, Dict[int, Tuple[int, str]]]" = OrderedDict()
+        self.entities: Dict[int | str, Channel] = {}                          # fóruns carregados
+        self._negative: "OrderedDict[Tuple[int | str, int], float]" = OrderedDict()  # (chat, top) -> expira_em
+        self._inflight: Dict[int | str, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0,
+                                      "negative_hits": 0, "evictions": 0}
 
-    async def _ensure_cache(self, chat_obj, force: bool = False):
-        if not isinstance(chat_obj, Channel) or not getattr(chat_obj, "forum", False):
-            return
-        chat_key = getattr(chat_obj, "id", None) or getattr(chat_obj, "username", None)
-        if not force and chat_key in self.cache and self.cache[chat_key]:
-            return
+    @staticmethod
+    def _chat_key(chat_obj):
+        return getattr(chat_obj, "id", None) or getattr(chat_obj, "username", None)
+
+    @staticmethod
+    def is_forum(chat_obj) -> bool:
+        return isinstance(chat_obj, Channel) and bool(getattr(chat_obj, "forum", False))
+
+    # ---------------- mapa ----------------
+
+    def merge(self, chat_key, items: List[Tuple[int, str]], replace: bool = False) -> int:
+        """
+        Aplica [(topic_id, title), ...] no chat e avisa on_change.
+        Constrói um dict novo e troca de uma vez (quem lê nunca vê estado parcial).
+        Retorna quantos tópicos mudaram.
+        """
+        current = self.top_to_topic.get(chat_key, {})
+        new_map = {} if replace else dict(current)
+        for tid, title in items:
+            new_map[tid] = (tid, title or f"topic#{tid}")
+            self._negative.pop((chat_key, tid), None)
+        changed = sum(1 for k, v in new_map.items() if current.get(k) != v) + (
+            sum(1 for k in current if k not in new_map) if replace else 0)
+        if not changed and chat_key in self.top_to_topic:
+            self.top_to_topic.move_to_end(chat_key)
+            return 0
+
+        self.top_to_topic[chat_key] = new_map
+        self.top_to_topic.move_to_end(chat_key)
+        while len(self.top_to_topic) > self.max_chats:
+            old_key, _ = self.top_to_topic.popitem(last=False)
+            self.entities.pop(old_key, None)
+            self.stats["evictions"] += 1
+        entity = self.entities.get(chat_key)
+        if entity is not None and self.on_change is not None:
+            self.on_change(entity, new_map)
+        return changed
+
+    def get(self, chat_obj, top_msg_id: Optional[int]) -> Tuple[Optional[int], Optional[str]]:
+        """Resolve (topic_id, title) só pelo cache (sem I/O)."""
+        if not isinstance(top_msg_id, int):
+            return None, None
+        chat_key = self._chat_key(chat_obj)
+        m = self.top_to_topic.get(chat_key)
+        if m is None:
+            return None, None
+        self.top_to_topic.move_to_end(chat_key)
+        info = m.get(top_msg_id)
+        return info if info else (None, None)
+
+    # ---------------- rede ----------------
 
-        mapping: Dict[int, Tuple[int, str]] = {}
+    async def _fetch_topics(self, chat_obj, pages: int, limit: int) -> List[Tuple[int, str]]:
+        """Pagina GetForumTopicsRequest (ordem: atividade mais recente primeiro)."""
+        items = []
         offset_topic = 0
-        for _ in range(self.pages):  # até pages * page_size tópicos
-            res = await self.client(GetForumTopicsRequest(
+        for _ in range(pages):
+            res = await flood_aware(lambda: self.client(GetForumTopicsRequest(
                 channel=chat_obj,
                 offset_date=None,
                 offset_id=0,
                 offset_topic=offset_topic,
-                limit=self.page_size
-            ))
+                limit=limit
+            )), f"GetForumTopics chat={getattr(chat_obj, 'id', '?')}")
             topics = res.topics or []
             if not topics:
                 break
             for t in topics:
-                if getattr(t, "top_message", None) is not None:
-                    mapping[int(t.top_message)] = (int(t.id), t.title or f"topic#{t.id}")
+                title = getattr(t, "title", None)
+                if title is None:  # ForumTopicDeleted
+                    continue
+                items.append((int(t.id), title))
             # parar se já cobrimos o count informado
-            if getattr(res, "count", None) and len(mapping) >= int(res.count):
+            if getattr(res, "count", None) and len(items) >= int(res.count):
                 break
-            offset_topic = topics[-1].id if topics else 0
+            offset_topic = topics[-1].id
+        return items
 
-        if mapping:
-            self.cache[chat_key] = mapping
+    async def refresh(self, chat_obj, full: bool = False) -> int:
+        """
+        Atualiza o mapa do chat; chamadas concorrentes para o MESMO chat compartilham
+        a requisição em voo. Chat ainda não carregado (ou full=True) -> todas as páginas
+        (até pages * page_size tópicos, substitui o mapa); senão -> 1 página, só acrescenta.
+        """
+        if not self.is_forum(chat_obj):
+            return 0
+        chat_key = self._chat_key(chat_obj)
+        fut = self._inflight.get(chat_key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[chat_key] = fut
+        self.stats["refreshes"] += 1
+        try:
+            full = full or chat_key not in self.top_to_topic
+            self.entities[chat_key] = chat_obj
+            if full:
+                items = await self._fetch_topics(chat_obj, self.pages, self.page_size)
+            else:
+                items = await self._fetch_topics(chat_obj, 1, self.refresh_page_size)
+            changed = self.merge(chat_key, items, replace=full)
+            fut.set_result(changed)
+            return changed
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # evita "exception was never retrieved" se ninguém estiver esperando
+            raise
+        finally:
+            self._inflight.pop(chat_key, None)
+
+    async def preload_for_chat(self, chat_obj) -> None:
+        """Carga completa dos tópicos do fórum (boot/prewarm)."""
+        if not self.is_forum(chat_obj):
+            return
+        await self.refresh(chat_obj, full=True)
+        chat_key = self._chat_key(chat_obj)
+        log.info(f"[topics-fast] pré-carregado chat={chat_key} itens={len(self.top_to_topic.get(chat_key, {}))}")
 
     async def topmsg_to_topic(self, chat_obj, top_msg_id: Optional[int]) -> Tuple[Optional[int], Optional[str]]:
-        if not isinstance(top_msg_id, int):
+        """Cache -> cache negativo -> refresh single-flight -> (None, None) + cache negativo."""
+        if not isinstance(top_msg_id, int) or not self.is_forum(chat_obj):
             return None, None
-        chat_key = getattr(chat_obj, "id", None) or getattr(chat_obj, "username", None)
-        await self._ensure_cache(chat_obj, force=False)
-        m = self.cache.get(chat_key, {})
-        info = m.get(top_msg_id)
-        if info:
-            return info  # (topic_id, title)
-        # tenta refresh (pode ser tópico novo)
-        await self._ensure_cache(chat_obj, force=True)
-        m = self.cache.get(chat_key, {})
-        info = m.get(top_msg_id)
-        return info if info else (None, None)
+        info = self.get(chat_obj, top_msg_id)
+        if info[0] is not None:
+            self.stats["hits"] += 1
+            return info
+
+        chat_key = self._chat_key(chat_obj)
+        neg_key = (chat_key, top_msg_id)
+        now = time.monotonic()
+        expires_at = self._negative.get(neg_key)
+        if expires_at is not None:
+            if expires_at > now:
+                self.stats["negative_hits"] += 1
+                return None, None
+            del self._negative[neg_key]
+
+        self.stats["misses"] += 1
+        try:
+            await self.refresh(chat_obj)  # pode ser tópico novo
+        except Exception as e:
+            log.error(f"[topics-fast] falha no refresh de {chat_key}: {e}")
+            return None, None
+        info = self.get(chat_obj, top_msg_id)
+        if info[0] is None:
+            self._negative[neg_key] = now + self.negative_ttl_s
+            while len(self._negative) > self.max_negative:
+                self._negative.popitem(last=False)
+        return info
 
+    # ---------------- incremental (sem I/O) ----------------
 
-async def extract_top_msg_id(message) -> Optional[int]:
+    def on_service_message(self, msg) -> bool:
+        """Aplica MessageActionTopicCreate/Edit vindos do stream de updates."""
+        chat_key = getattr(getattr(msg, "peer_id", None), "channel_id", None)
+        if chat_key not in self.entities:
+            return False
+        action = getattr(msg, "action", None)
+        if isinstance(action, MessageActionTopicCreate):
+            # o id da service message É o id do tópico
+            changed = self.merge(chat_key, [(int(msg.id), action.title)])
+        elif isinstance(action, MessageActionTopicEdit) and action.title:
+            r = getattr(msg, "reply_to", None)
+            tid = getattr(r, "reply_to_top_id", None) or getattr(r, "reply_to_msg_id", None)
+            if not isinstance(tid, int):
+                return False
+            changed = self.merge(chat_key, [(tid, action.title)])
+        else:
+            return False
+        if changed:
+            log.info(f"[topics-fast] tópico atualizado via update chat={chat_key} action={type(action).__name__}")
+        return bool(changed)
+
+
+def extract_top_msg_id(message) -> Optional[int]:
     """
-    Extrai o top_msg_id do evento/mensagem com vários fallbacks.
+    top_msg_id (id da raiz do tópico) lendo só atributos (sem to_dict, sem I/O, sem alocar):
+      - resposta dentro do tópico:      reply_to.reply_to_top_id
+      - msg "solta" no tópico:          reply_to.forum_topic + reply_to_msg_id (o próprio top)
+      - builds/layers antigos:          reply_to.top_msg_id
+      - raiz do tópico (service msg):   MessageActionTopicCreate -> o próprio id
+    Mensagem fora de tópico / resposta comum / reply de story -> None.
     """
-    if message is None:
-        return None
-
-    # 1) reply_to.* (mais comum)
     r = getattr(message, "reply_to", None)
     if r is not None:
-        v = getattr(r, "top_msg_id", None) or getattr(r, "reply_to_top_id", None)
-        if isinstance(v, int):
+        v = getattr(r, "reply_to_top_id", None)
+        if v is not None:
             return v
-
-    # 2) campos diretos (em algumas builds)
-    for attr in ("top_msg_id", "reply_to_top_id"):
-        v = getattr(message, attr, None)
-        if isinstance(v, int):
+        v = getattr(r, "top_msg_id", None)
+        if v is not None:
             return v
-
-    # 3) via to_dict()
-    try:
-        d = message.to_dict() or {}
-        rt = d.get("reply_to", {}) or {}
-        v = rt.get("top_msg_id", None) or rt.get("reply_to_top_id", None)
-        if isinstance(v, int):
-            return v
-        if isinstance(v, str) and v.lstrip("-").isdigit():
-            return int(v)
-    except Exception:
-        pass
-
-    # 4) raiz do tópico: algumas vezes a raiz não traz reply_to;
-    #    pode ser necessário mapear pelo próprio id via cache (já coberto em topmsg_to_topic)
+        if getattr(r, "forum_topic", False):
+            return getattr(r, "reply_to_msg_id", None)
+        return None
+    if type(getattr(message, "action", None)) is MessageActionTopicCreate:
+        return message.id
     return None